@@ -1,4 +1,5 @@
 import streamlit as st
+import os
 import sys
 from pathlib import Path
 import time
@@ -7,7 +8,10 @@ import time
 sys.path.append(str(Path(__file__).parent))
 
 from src.dual_rag_system import DualRAGSystem
-from src.utils import extract_text_from_pdf, save_output
+from src.jobs import CANCELADO, EN_COLA, EN_CURSO, TERMINADO, JobManager, JobQueueFull
+from src.pdf_extraction import PdfTextCache, iter_pages
+from src.result_cache import ResultCache
+from src.utils import save_output
 
 # Configuración de página
 st.set_page_config(
@@ -76,6 +80,20 @@ with st.sidebar:
         help="Número de ejemplos relevantes a usar"
     )
     
+    use_cache = st.checkbox(
+        "Usar caché de resultados",
+        value=True,
+        help="Devolver al instante documentos ya simplificados"
+    )
+    
+    presupuesto_s = st.slider(
+        "Tiempo máximo (s)",
+        min_value=0,
+        max_value=120,
+        value=0,
+        help="Si el LLM no termina a tiempo se entrega la versión por reglas (0 = sin límite)"
+    )
+    
     st.markdown("---")
     st.header("📋 Reglas Aplicadas")
     
@@ -94,26 +112,89 @@ with st.sidebar:
     for regla in reglas:
         st.markdown(f"✓ {regla}")
 
-# Inicializar sistema (cachear)
+# Caché de resultados compartida por todas las sesiones
+@st.cache_resource
+def init_cache():
+    return ResultCache("data/cache/resultados.sqlite3")
+
+# Texto ya extraído de los PDFs subidos
+@st.cache_resource
+def init_pdf_cache():
+    return PdfTextCache("data/cache/pdf")
+
+# Trabajos de simplificación en segundo plano, compartidos por todas las sesiones
+# (como mucho 2 generaciones a la vez en este nodo)
+@st.cache_resource
+def init_jobs():
+    return JobManager(max_workers=2, jobs_dir="data/jobs")
+
+# Un solo sistema para todas las sesiones: CENDOJ y top_k se eligen en cada petición
 @st.cache_resource
-def init_system(use_cendoj_flag):
+def init_system():
     guia_path = Path("data/Guia_de_redaccion_judicial_clara.pdf")
     
     if not guia_path.exists():
         st.error(f"❌ No se encuentra la Guía en: {guia_path}")
         return None
     
-    with st.spinner("🚀 Inicializando Sistema RAG Dual..."):
-        return DualRAGSystem(
-            guia_path=str(guia_path),
-            use_cendoj=use_cendoj_flag
-        )
+    system = DualRAGSystem(
+        guia_path=str(guia_path),
+        use_cendoj=True,
+        index_dir="data/index/cendoj",
+        result_cache=init_cache()
+    )
+    # Índice, encoder y modelo se cargan mientras se pinta la interfaz
+    system.warmup(background=True)
+    return system
 
-rag_system = init_system(use_cendoj)
+rag_system = init_system()
 
 if rag_system is None:
     st.stop()
 
+jobs = init_jobs()
+
+# Estado del LLM para todas las sesiones: el sondeo de trabajos hace un rerun por segundo
+@st.cache_data(ttl=5)
+def llm_health():
+    return rag_system.llm.health()
+
+with st.sidebar:
+    st.markdown("---")
+    estado_llm = llm_health()
+    if estado_llm['cargado']:
+        st.success(f"🟢 LLM {estado_llm['modelo']} en memoria")
+    elif estado_llm['ok']:
+        st.warning(f"🟡 LLM {estado_llm['modelo']} cargándose")
+    else:
+        st.error("🔴 Ollama no disponible: se usarán reglas básicas")
+    if estado_llm['tokens']['peticiones']:
+        st.caption(
+            f"🧠 Prefill ahorrado: {estado_llm['tokens']['prefill_ahorrado'] / estado_llm['tokens']['peticiones']:.0f} "
+            f"tokens/petición (prefijo de reglas precalculado)"
+        )
+    if estado_llm['circuito'] != 'cerrado':
+        st.caption(f"⚡ Circuito del LLM {estado_llm['circuito']}: se responde con reglas")
+    
+    stats_cache = rag_system.result_cache.stats()
+    st.caption(
+        f"💾 Caché: {stats_cache['entradas']} resultados, "
+        f"{stats_cache['hit_rate']:.0%} aciertos ({stats_cache['hits']}/{stats_cache['hits'] + stats_cache['misses']})"
+    )
+    stats_emb = rag_system.embedding_cache.stats()
+    st.caption(
+        f"🧮 Embeddings: {stats_emb['entradas_memoria']} en memoria, "
+        f"{stats_emb['hit_rate']:.0%} aciertos"
+    )
+    stats_jobs = jobs.stats()
+    st.caption(
+        f"🧵 Trabajos: {stats_jobs['en_curso']} en curso, {stats_jobs['en_cola']} en cola "
+        f"(máx. {stats_jobs['max_workers']} a la vez)"
+    )
+    if st.button("🗑️ Vaciar caché"):
+        rag_system.result_cache.invalidate()
+        st.rerun()
+
 # Main area
 tab1, tab2, tab3 = st.tabs(["📄 Cargar Documento", "📊 Resultados", "ℹ️ Información"])
 
@@ -134,9 +215,15 @@ with tab1:
         with col2:
             st.info(f"**Tamaño:** {uploaded_file.size / 1024:.2f} KB")
         
-        # Extraer texto
-        if uploaded_file.name.endswith('.pdf'):
-            texto_original = extract_text_from_pdf(uploaded_file)
+        # Extraer texto (de un PDF, solo las primeras páginas para la vista previa)
+        es_pdf = uploaded_file.name.endswith('.pdf')
+        if es_pdf:
+            datos_pdf = uploaded_file.getvalue()
+            texto_original = ""
+            for pagina in iter_pages(datos_pdf, cache=init_pdf_cache()):
+                texto_original += pagina
+                if len(texto_original) >= 1000:
+                    break
         else:
             texto_original = uploaded_file.read().decode('utf-8')
         
@@ -144,23 +231,87 @@ with tab1:
         with st.expander("👁️ Vista previa del texto original"):
             st.text_area("", texto_original[:1000] + "...", height=200, disabled=True)
         
-        # Botón de simplificación
+        # Botón de simplificación: el trabajo corre en segundo plano y la
+        # página sigue respondiendo (recargas, cambios de pestaña...)
         if st.button("🔄 Simplificar Documento", type="primary", use_container_width=True):
-            with st.spinner("⏳ Procesando con IA..."):
-                start_time = time.time()
-                
-                # Simplificar
-                resultado = rag_system.simplificar(texto_original)
-                
-                end_time = time.time()
+            opciones = dict(
+                use_cache=use_cache,
+                deadline_s=presupuesto_s or None,
+                top_k=top_k,
+                use_cendoj=use_cendoj
+            )
+            if es_pdf:
+                def tarea(**callbacks):
+                    # Las primeras secciones se simplifican mientras se leen las siguientes páginas
+                    paginas = iter_pages(datos_pdf, workers=os.cpu_count(), cache=init_pdf_cache())
+                    return rag_system.simplificar_paginas(paginas, **opciones, **callbacks)
+            else:
+                texto_trabajo = texto_original
                 
-                # Guardar en session state
+                def tarea(**callbacks):
+                    return rag_system.simplificar(texto_trabajo, **opciones, **callbacks)
+            
+            try:
+                st.session_state['job_id'] = jobs.submit(tarea, nombre=uploaded_file.name)
+            except JobQueueFull as e:
+                st.error(f"⏳ {e}")
+    
+    # Trabajo de esta sesión: progreso, salida parcial y resultado
+    job = jobs.get(st.session_state['job_id']) if 'job_id' in st.session_state else None
+    if job:
+        st.markdown(f"### ✨ Texto Simplificado ({job['nombre']})")
+        panel_stream = st.empty()
+        
+        if job['estado'] in (EN_COLA, EN_CURSO):
+            if job['parcial']:
+                panel_stream.markdown(job['parcial'] + " ▌")
+            elif job['reglas']:
+                # Versión por reglas inmediata mientras llega la del LLM
+                panel_stream.markdown(job['reglas'] + "\n\n⏳ *Mejorando con IA...*")
+            elif job['estado'] == EN_COLA:
+                panel_stream.info("⏳ En cola, esperando un worker libre...")
+            else:
+                panel_stream.info("⏳ Procesando con IA...")
+            
+            st.caption(f"⚙️ {job['segundos']:.0f}s, {len(job['parcial'])} caracteres generados")
+            if st.button("⏹️ Cancelar"):
+                jobs.cancel(job['id'])
+            
+            time.sleep(1)
+            st.rerun()
+        
+        elif job['estado'] == TERMINADO:
+            resultado = job['resultado']
+            panel_stream.markdown(resultado['simplificado'])
+            
+            # Guardar en session state
+            if st.session_state.get('job_mostrado') != job['id']:
                 st.session_state['resultado'] = resultado
-                st.session_state['tiempo_procesamiento'] = end_time - start_time
-                st.session_state['texto_original'] = texto_original
-                
-                st.success(f"✅ Documento simplificado en {end_time - start_time:.2f}s")
-                st.info("👉 Ve a la pestaña **Resultados** para ver el documento simplificado")
+                st.session_state['tiempo_procesamiento'] = job['segundos']
+                st.session_state['texto_original'] = resultado['original']
+                st.session_state['job_mostrado'] = job['id']
+            
+            niveles = {
+                'cache': 'desde caché',
+                'llm': 'con IA',
+                'reglas': 'solo con reglas',
+                'mixto': 'con IA y reglas'
+            }
+            st.success(
+                f"✅ Documento simplificado {niveles[resultado['nivel']]} en {job['segundos']:.2f}s "
+                f"(primer token en {resultado['tiempos']['primer_token_s']:.2f}s)"
+            )
+            if resultado['motivo']:
+                st.warning(f"⚠️ Salida por reglas ({resultado['motivo']})")
+            st.info("👉 Ve a la pestaña **Resultados** para ver el documento simplificado")
+        
+        elif job['estado'] == CANCELADO:
+            if job['parcial']:
+                panel_stream.markdown(job['parcial'])
+            st.warning("⏹️ Simplificación cancelada")
+        
+        else:
+            st.error(f"❌ La simplificación no terminó ({job['estado']}): {job['error'] or 'servidor reiniciado'}")
 
 with tab2:
     if 'resultado' in st.session_state:
@@ -170,7 +321,7 @@ with tab2:
         st.header("📊 Resultados de la Simplificación")
         
         # Métricas
-        col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4, col5, col6 = st.columns(6)
         
         with col1:
             palabras_orig = len(texto_original.split())
@@ -192,6 +343,35 @@ with tab2:
                 f"{st.session_state['tiempo_procesamiento']:.2f}s"
             )
         
+        with col5:
+            st.metric(
+                "Primer token",
+                f"{resultado['tiempos']['primer_token_s']:.2f}s"
+            )
+        
+        with col6:
+            st.metric("Nivel", resultado['nivel'])
+
+        # Desglose del tiempo de esta petición por etapa del pipeline
+        traza = resultado.get('traza')
+        if traza:
+            with st.expander("⏱️ Tiempos por etapa"):
+                etapas = sorted(traza['etapas'].items(), key=lambda e: e[1]['segundos'], reverse=True)
+                st.table([
+                    {'Etapa': nombre, 'Llamadas': etapa['n'], 'Segundos': f"{etapa['segundos']:.3f}"}
+                    for nombre, etapa in etapas
+                ])
+                st.caption("Las etapas se solapan (recuperacion incluye encode y consultas; llm, "
+                           "prefill y decode) y las secciones en paralelo suman más que el total.")
+
+                decode = [t for t in traza['tramos'] if t['etapa'] == 'llm_decode']
+                if decode:
+                    generados = sum(t['tokens'] for t in decode)
+                    segundos = sum(t['segundos'] for t in decode)
+                    st.caption(f"🧠 {generados} tokens generados a {generados / segundos:.1f} tokens/s")
+                if traza['contadores']:
+                    st.caption(" · ".join(f"{nombre}: {n:g}" for nombre, n in sorted(traza['contadores'].items())))
+
         # Fuentes usadas
         st.markdown("---")
         st.subheader("📚 Fuentes Utilizadas")
@@ -0,0 +1,83 @@
+"""
+Benchmark del índice BM25: añadir y compilar, búsqueda, guardar y cargar
+
+Uso:
+    python -m benchmarks.bench_bm25 --docs 1000 10000 --queries 200
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from src.bm25 import BM25Index
+
+VOCABULARIO = (
+    "recurso apelación casación sentencia auto demanda demandante demandado parte costas "
+    "procedimiento juzgado tribunal audiencia constitución artículo ley derecho plazo "
+    "notificación resolución fallo estimación desestimación prueba testigo perito contrato "
+    "arrendamiento despido indemnización daños perjuicios responsabilidad nulidad"
+).split()
+
+
+def synthetic_documents(n: int, palabras: int = 120, seed: int = 0) -> list:
+    """Documentos con vocabulario jurídico y términos raros numerados"""
+    rnd = random.Random(seed)
+    return [
+        " ".join(rnd.choice(VOCABULARIO) if rnd.random() < 0.9 else f"término{rnd.randrange(5 * n)}"
+                 for _ in range(palabras))
+        for _ in range(n)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del índice BM25")
+    parser.add_argument('--docs', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    consultas = synthetic_documents(args.queries, palabras=8, seed=1)
+
+    for n in args.docs:
+        documentos = synthetic_documents(n)
+        ids = [f"doc{i}" for i in range(n)]
+        print(f"📏 {n} documentos, top-{args.k}")
+
+        index = BM25Index()
+        inicio = time.perf_counter()
+        for start in range(0, n, 1000):
+            index.add(ids[start:start + 1000], documentos[start:start + 1000])
+        t_add = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        index.search("recurso", args.k)
+        t_compile = time.perf_counter() - inicio
+
+        tiempos = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            index.search(consulta, args.k)
+            tiempos.append(time.perf_counter() - inicio)
+        tiempos.sort()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "bm25.npz"
+            inicio = time.perf_counter()
+            index.save(str(path))
+            t_save = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            BM25Index.load(str(path))
+            t_load = time.perf_counter() - inicio
+            tamano = path.stat().st_size / 1e6
+
+        print(f"   add {n / t_add:9.0f} docs/s   compilar {t_compile * 1000:7.1f} ms")
+        print(f"   búsqueda p50 {statistics.median(tiempos) * 1000:7.3f} ms   "
+              f"p95 {tiempos[int(len(tiempos) * 0.95) - 1] * 1000:7.3f} ms")
+        print(f"   guardar {t_save * 1000:7.1f} ms   cargar {t_load * 1000:7.1f} ms   {tamano:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark de backends del encoder: paridad del ONNX int8 frente al fp32
+(recall@k sobre los ejemplos de la Guía) y rendimiento en CPU
+
+Uso:
+    python -m src.encoders --output data/models/minilm-onnx-int8
+    python -m benchmarks.bench_encoders --k 5
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from src.encoders import BACKENDS, ONNX_MODEL_DIR, load_encoder
+from src.guia_artifact import default_artifact_path, load_artifact
+
+GUIA_PATH = "data/Guia_de_redaccion_judicial_clara.pdf"
+
+
+def guia_texts(artifact_path: str):
+    """Textos originales y simplificados de los ejemplos, y el índice del par de cada uno"""
+    textos, pares = [], []
+    for ejemplo in load_artifact(artifact_path):
+        if not ejemplo['original'] or not ejemplo['simplificado']:
+            continue
+        textos += [ejemplo['original'], ejemplo['simplificado']]
+        pares += [len(textos) - 1, len(textos) - 2]
+    return textos, np.array(pares)
+
+
+def cosine_matrix(vectores: np.ndarray) -> np.ndarray:
+    """Similitud coseno de todos contra todos, sin la diagonal"""
+    normalizados = vectores / np.linalg.norm(vectores, axis=1, keepdims=True)
+    similitud = normalizados @ normalizados.T
+    np.fill_diagonal(similitud, -np.inf)
+    return similitud
+
+
+def top_k(similitud: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-similitud, axis=1)[:, :k]
+
+
+def parity(referencia: np.ndarray, candidato: np.ndarray, k: int) -> dict:
+    """recall@k del candidato tomando como verdad los vecinos del fp32"""
+    vecinos_ref = top_k(cosine_matrix(referencia), k)
+    vecinos_cand = top_k(cosine_matrix(candidato), k)
+    recall = np.mean([
+        len(set(a) & set(b)) / k for a, b in zip(vecinos_ref, vecinos_cand)
+    ])
+
+    coseno = np.sum(referencia * candidato, axis=1) / (
+        np.linalg.norm(referencia, axis=1) * np.linalg.norm(candidato, axis=1)
+    )
+    return {'recall': float(recall), 'coseno_medio': float(coseno.mean()),
+            'coseno_min': float(coseno.min())}
+
+
+def pair_accuracy(vectores: np.ndarray, pares: np.ndarray) -> float:
+    """Fracción de textos cuyo vecino más cercano es su par original/simplificado"""
+    return float(np.mean(top_k(cosine_matrix(vectores), 1)[:, 0] == pares))
+
+
+def throughput(encoder, textos, batch_size: int, repeticiones: int) -> dict:
+    """Textos/s en lote (mejor repetición) y latencia de una consulta suelta"""
+    encoder.encode(textos[:batch_size], batch_size=batch_size)  # calentamiento
+
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        encoder.encode(textos, batch_size=batch_size)
+        mejor = min(mejor, time.perf_counter() - inicio)
+
+    latencias = []
+    for texto in textos[:50]:
+        inicio = time.perf_counter()
+        encoder.encode(texto)
+        latencias.append(time.perf_counter() - inicio)
+
+    return {'textos_s': len(textos) / mejor, 'consulta_ms': statistics.median(latencias) * 1000}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de backends del encoder")
+    parser.add_argument('--artifact', default=str(default_artifact_path(GUIA_PATH)),
+                        help="Artefacto de ejemplos de la Guía")
+    parser.add_argument('--model-dir', default=ONNX_MODEL_DIR, help="Modelo ONNX int8 exportado")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    textos, pares = guia_texts(args.artifact)
+    print(f"📚 {len(textos)} textos de ejemplos de la Guía")
+
+    vectores = {}
+    for backend in args.backends:
+        inicio = time.perf_counter()
+        encoder = load_encoder(backend, model_dir=args.model_dir)
+        carga = time.perf_counter() - inicio
+
+        vectores[backend] = np.asarray(encoder.encode(textos, batch_size=args.batch_size),
+                                       dtype=np.float32)
+        rendimiento = throughput(encoder, textos, args.batch_size, args.repeat)
+
+        print(f"⚙️ {backend} (carga {carga:.1f}s)")
+        print(f"   lote:     {rendimiento['textos_s']:8.1f} textos/s")
+        print(f"   consulta: {rendimiento['consulta_ms']:8.1f} ms (mediana)")
+        print(f"   par original/simplificado como vecino 1: {pair_accuracy(vectores[backend], pares):.1%}")
+
+    if 'torch' in vectores and 'onnx-int8' in vectores:
+        resultado = parity(vectores['torch'], vectores['onnx-int8'], args.k)
+        print("🎯 onnx-int8 frente a torch fp32")
+        print(f"   recall@{args.k}:    {resultado['recall']:.3f}")
+        print(f"   coseno medio: {resultado['coseno_medio']:.4f} (mínimo {resultado['coseno_min']:.4f})")
+
+
+if __name__ == '__main__':
+    main()
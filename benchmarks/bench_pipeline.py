@@ -0,0 +1,332 @@
+"""
+Benchmark por etapas del pipeline con sentencias sintéticas y un LLM
+simulado (FakeLLM sin esperas): reglas, ejemplos de la Guía, secciones,
+recuperación, prompt y simplificación completa, con percentiles y pico de
+memoria (tracemalloc) de cada una. Los resultados se guardan como línea
+base y compare falla si una etapa empeora más de la tolerancia.
+
+Uso:
+    python -m benchmarks.bench_pipeline run --sizes 2000 8000 32000 --save benchmarks/baselines/main.json
+    python -m benchmarks.bench_pipeline compare benchmarks/baselines/main.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.encoders import BACKENDS, DEFAULT_BACKEND
+
+GUIA_PATH = "data/Guia_de_redaccion_judicial_clara.pdf"
+
+# Estructura de doc_prueba (src3/main.py)
+CABECERA = """JUZGADO DE PRIMERA INSTANCIA Nº {juzgado} DE {ciudad}
+Calle Génova {numero} , Planta {planta}ª - 28004
+NIG: 28.079.00.2-{anio}/{nig}
+Procedimiento: Procedimiento Ordinario {procedimiento}/{anio}
+Materia: {materia}
+Demandante: D./Dña. {demandante} PROCURADOR D./Dña. {procurador} Demandado: {demandado}
+SENTENCIA Nº {sentencia}/{anio}
+En {ciudad_titulo}, a {dia} de {mes} de {anio}, {magistrado}, Magistrado/a Juez del Juzgado de Primera
+Instancia nº {juzgado} de {ciudad_titulo}, ha visto los presentes autos que se siguen en este Juzgado bajo el
+nº de procedimiento {procedimiento}/{anio}, a instancias de {demandante}, frente a {demandado}.
+"""
+
+ORDINALES = ["PRIMERO", "SEGUNDO", "TERCERO", "CUARTO", "QUINTO", "SEXTO", "SÉPTIMO",
+             "OCTAVO", "NOVENO", "DÉCIMO", "UNDÉCIMO", "DUODÉCIMO"]
+
+FRASES = [
+    "Por turno de reparto correspondió a este Juzgado demanda de juicio ordinario presentada por "
+    "el/a citado/a procurador/a en la representación referida.",
+    "Admitida a trámite la demanda se dio traslado a la entidad demandada, que contestó en tiempo y forma.",
+    "Citadas las partes, se celebró Audiencia Previa el día señalado al efecto, proponiéndose como "
+    "única prueba la documental, quedando los autos conclusos para sentencia.",
+    "En la tramitación del presente procedimiento se han observado las prescripciones legales.",
+    "Por la parte actora se ejercita acción de declaración de nulidad del sistema de amortización "
+    "revolving y, subsidiariamente, de la condición que recoge el interés remuneratorio.",
+    "De conformidad con lo dispuesto en el artículo 1.303 del Código Civil, declarada la nulidad de "
+    "una obligación, los contratantes deben restituirse recíprocamente las cosas que hubiesen sido "
+    "materia del contrato.",
+    "A tenor de lo establecido en la Ley de 23 de julio de 1908, será nulo todo contrato de préstamo "
+    "en que se estipule un interés notablemente superior al normal del dinero.",
+    "La parte demandada se opone a la pretensión, alegando la transparencia de la cláusula y la "
+    "validez del consentimiento prestado.",
+    "Visto el contenido de las actuaciones, procede estimar íntegramente la demanda interpuesta, "
+    "con expresa imposición de costas a la parte demandada.",
+    "En fecha 12/03/2024 se dictó diligencia de ordenación por la que se tenía por contestada la demanda.",
+]
+
+MATERIAS = ["Resto de acciones individuales sobre condiciones generales de la contratación",
+            "Reclamación de cantidad", "Nulidad de contrato por usura"]
+CIUDADES = ["MADRID", "BARCELONA", "VALENCIA", "SEVILLA"]
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+         "septiembre", "octubre", "noviembre", "diciembre"]
+
+DEFAULT_SIZES = [2000, 8000, 32000]
+
+# Diferencias por debajo de estos umbrales son ruido y no cuentan como regresión
+MIN_DELTA_MS = 0.5
+MIN_DELTA_KB = 64
+
+
+def synthetic_sentencia(n_chars: int, seed: int = 0) -> str:
+    """
+    Sentencia sintética de unos n_chars caracteres con la estructura de
+    doc_prueba: cabecera, ANTECEDENTES DE HECHO, FUNDAMENTOS DE DERECHO
+    con ordinales y FALLO.
+    """
+    rnd = random.Random(seed)
+    ciudad = rnd.choice(CIUDADES)
+    anio = rnd.randint(2020, 2025)
+    texto = CABECERA.format(
+        juzgado=rnd.randint(1, 110), ciudad=ciudad, ciudad_titulo=ciudad.title(),
+        numero=rnd.randint(1, 90), planta=rnd.randint(1, 6), anio=anio,
+        nig=rnd.randint(10000, 99999), procedimiento=rnd.randint(100, 3000),
+        materia=rnd.choice(MATERIAS), demandante=f"Demandante {rnd.randint(1, 999)}",
+        procurador=f"Procurador {rnd.randint(1, 999)}", demandado="WIZINK BANK, S.A.",
+        sentencia=rnd.randint(1, 999), dia=rnd.randint(1, 28), mes=rnd.choice(MESES),
+        magistrado=f"Magistrado {rnd.randint(1, 99)}"
+    )
+
+    # Antecedentes cortos; el resto del tamaño va a los fundamentos
+    partes = [texto, "ANTECEDENTES DE HECHO\n"]
+    for ordinal in ORDINALES[:3]:
+        partes.append(f"{ordinal}-\n. {rnd.choice(FRASES)}\n\n")
+    partes.append("FUNDAMENTOS DE DERECHO\n")
+
+    tamano = sum(len(p) for p in partes)
+    fundamento = 0
+    while tamano < n_chars * 0.9:
+        ordinal = ORDINALES[fundamento % len(ORDINALES)]
+        parrafos = [" ".join(rnd.choice(FRASES) for _ in range(rnd.randint(2, 4)))
+                    for _ in range(rnd.randint(1, 3))]
+        parte = f"{ordinal}-\n. " + "\n\n".join(parrafos) + "\n\n"
+        partes.append(parte)
+        tamano += len(parte)
+        fundamento += 1
+
+    partes.append("FALLO\nQue debo estimar y estimo la demanda, con imposición de costas a la demandada.\n")
+    return "".join(partes)
+
+
+def percentiles(tiempos: List[float]) -> Dict:
+    """Estadísticos en ms (percentiles por rango más cercano)"""
+    ordenados = sorted(tiempos)
+
+    def p(q: float) -> float:
+        return ordenados[max(int(round(q * len(ordenados))) - 1, 0)] * 1000
+
+    return {'n': len(ordenados), 'media_ms': statistics.fmean(ordenados) * 1000,
+            'min_ms': ordenados[0] * 1000, 'p50_ms': p(0.50), 'p95_ms': p(0.95), 'p99_ms': p(0.99)}
+
+
+def measure(fn: Callable, repeticiones: int, calentamiento: int = 1,
+            preparar: Optional[Callable] = None) -> Dict:
+    """
+    Tiempos de repeticiones llamadas y, en una llamada aparte, el pico de
+    memoria. preparar se ejecuta antes de cada llamada, fuera de los tiempos.
+    """
+    preparar = preparar or (lambda: None)
+    for _ in range(calentamiento):
+        preparar()
+        fn()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        preparar()
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+
+    # tracemalloc ralentiza: la memoria se mide fuera de los tiempos
+    preparar()
+    tracemalloc.start()
+    try:
+        fn()
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {**percentiles(tiempos), 'pico_kb': pico / 1024}
+
+
+def build_system(args):
+    from src.dual_rag_system import DualRAGSystem
+    from src.llm_handler import FakeLLM
+
+    # LLM determinista y sin esperas: se mide el pipeline, no el modelo
+    system = DualRAGSystem(
+        guia_path=args.guia,
+        use_cendoj=True,
+        index_dir=None,
+        llm=FakeLLM(first_token_s=0.0, token_s=0.0),
+        encoder_backend=args.encoder_backend
+    )
+    system.warmup()
+    return system
+
+
+def run(args) -> Dict:
+    """Medir cada etapa para cada tamaño de documento"""
+    from src.guia_artifact import parse_ejemplos
+    from src.long_document import split_sections
+    from src.pdf_extraction import iter_pages
+
+    system = build_system(args)
+    resultados = {}
+
+    def guardar(etapa: str, n_chars: int, medida: Dict):
+        resultados[f"{etapa}@{n_chars}"] = medida
+        print(f"   {etapa:22s} p50 {medida['p50_ms']:9.2f} ms   p95 {medida['p95_ms']:9.2f} ms   "
+              f"p99 {medida['p99_ms']:9.2f} ms   pico {medida['pico_kb']:9.0f} KB")
+
+    paginas_guia = list(iter_pages(args.guia))
+    print(f"📚 Guía: {len(paginas_guia)} páginas")
+    guardar('ejemplos_guia', 0, measure(lambda: parse_ejemplos(paginas_guia), args.repeat))
+
+    for n_chars in args.sizes:
+        doc = synthetic_sentencia(n_chars, seed=args.seed)
+        print(f"📏 Sentencia sintética de {len(doc)} caracteres")
+
+        guardar('reglas', n_chars, measure(lambda: system.rules.apply_all_rules(doc), args.repeat))
+        guardar('secciones', n_chars, measure(lambda: split_sections(doc), args.repeat))
+        # Sin la caché de embeddings cada repetición sería un acierto y no
+        # mediría el encoder: se vacía antes de cada llamada y el camino
+        # cacheado se mide aparte
+        sin_cache = system.embedding_cache.clear
+        guardar('recuperacion', n_chars,
+                measure(lambda: system.retrieve_hybrid(doc), args.repeat, preparar=sin_cache))
+        guardar('recuperacion_cache', n_chars, measure(lambda: system.retrieve_hybrid(doc), args.repeat))
+
+        results = system.retrieve_hybrid(doc)
+        guardar('prompt', n_chars, measure(lambda: system._compose_prompt(doc, results), args.repeat))
+
+        # De extremo a extremo, con el desglose interno de la traza (src.instrumentation)
+        etapas: Dict[str, List[float]] = {}
+
+        def simplificar():
+            resultado = system.simplificar(doc, use_cache=False)
+            for nombre, etapa in resultado['traza']['etapas'].items():
+                etapas.setdefault(nombre, []).append(etapa['segundos'])
+
+        guardar('extremo_a_extremo', n_chars, measure(simplificar, args.repeat, preparar=sin_cache))
+        for nombre, tiempos in sorted(etapas.items()):
+            print(f"      {nombre:19s} p50 {percentiles(tiempos)['p50_ms']:9.2f} ms (suma por documento)")
+
+    return {
+        'meta': {
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'maquina': platform.machine(),
+            'sizes': args.sizes,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'encoder_backend': args.encoder_backend
+        },
+        'resultados': resultados
+    }
+
+
+def compare(base: Dict, actual: Dict, tolerancia: float, tolerancia_memoria: float) -> List[str]:
+    """Etapas cuyo p50 o pico de memoria empeoran más de la tolerancia"""
+    regresiones = []
+    print(f"{'etapa':32s} {'base p50':>10s} {'actual p50':>11s} {'cambio':>8s} {'pico KB':>18s}")
+
+    for clave, medida_base in sorted(base['resultados'].items()):
+        medida = actual['resultados'].get(clave)
+        if medida is None:
+            print(f"{clave:32s} (no medida)")
+            continue
+
+        cambio = medida['p50_ms'] / medida_base['p50_ms'] - 1 if medida_base['p50_ms'] else 0.0
+        cambio_memoria = medida['pico_kb'] / medida_base['pico_kb'] - 1 if medida_base['pico_kb'] else 0.0
+        lenta = cambio > tolerancia and medida['p50_ms'] - medida_base['p50_ms'] > MIN_DELTA_MS
+        pesada = cambio_memoria > tolerancia_memoria and medida['pico_kb'] - medida_base['pico_kb'] > MIN_DELTA_KB
+
+        marca = "❌" if lenta or pesada else "✅"
+        print(f"{clave:32s} {medida_base['p50_ms']:10.2f} {medida['p50_ms']:11.2f} {cambio:+8.1%} "
+              f"{medida_base['pico_kb']:8.0f}→{medida['pico_kb']:<8.0f} {marca}")
+        if lenta:
+            regresiones.append(f"{clave}: p50 {cambio:+.1%}")
+        if pesada:
+            regresiones.append(f"{clave}: memoria {cambio_memoria:+.1%}")
+
+    return regresiones
+
+
+def save(datos: Dict, path: str):
+    destino = Path(path)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    destino.write_text(json.dumps(datos, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"💾 Resultados guardados en {destino}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark por etapas del pipeline")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    medir = argparse.ArgumentParser(add_help=False)
+    medir.add_argument('--guia', default=GUIA_PATH)
+    medir.add_argument('--encoder-backend', choices=BACKENDS, default=None,
+                       help=f"Encoder de embeddings (por defecto {DEFAULT_BACKEND} o el de la línea base)")
+    medir.add_argument('--repeat', type=int, default=None, help="Repeticiones por etapa (20)")
+    medir.add_argument('--seed', type=int, default=None, help="Semilla del corpus sintético (0)")
+
+    p_run = sub.add_parser('run', parents=[medir], help="Medir y, con --save, guardar como línea base")
+    p_run.add_argument('--sizes', type=int, nargs='+', default=None,
+                       help=f"Tamaños de sentencia en caracteres ({' '.join(map(str, DEFAULT_SIZES))})")
+    p_run.add_argument('--save', default=None, help="Fichero JSON de resultados")
+
+    p_cmp = sub.add_parser('compare', parents=[medir],
+                           help="Medir con la configuración de una línea base y comparar")
+    p_cmp.add_argument('baseline', help="Línea base guardada con run --save")
+    p_cmp.add_argument('--current', default=None,
+                       help="Comparar con estos resultados guardados en lugar de medir")
+    p_cmp.add_argument('--tolerance', type=float, default=0.2, help="Empeoramiento admitido del p50")
+    p_cmp.add_argument('--memory-tolerance', type=float, default=0.2,
+                       help="Empeoramiento admitido del pico de memoria")
+    p_cmp.add_argument('--save', default=None, help="Guardar también los resultados actuales")
+    args = parser.parse_args(argv)
+
+    if args.comando == 'run':
+        args.sizes = args.sizes or DEFAULT_SIZES
+        args.repeat = args.repeat or 20
+        args.seed = args.seed if args.seed is not None else 0
+        args.encoder_backend = args.encoder_backend or DEFAULT_BACKEND
+        datos = run(args)
+        if args.save:
+            save(datos, args.save)
+        return 0
+
+    base = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    if args.current:
+        actual = json.loads(Path(args.current).read_text(encoding='utf-8'))
+    else:
+        # Misma configuración que la línea base salvo lo que se indique
+        meta = base['meta']
+        args.sizes = meta['sizes']
+        args.repeat = args.repeat or meta['repeat']
+        args.seed = args.seed if args.seed is not None else meta['seed']
+        args.encoder_backend = args.encoder_backend or meta['encoder_backend']
+        actual = run(args)
+        if args.save:
+            save(actual, args.save)
+
+    regresiones = compare(base, actual, args.tolerance, args.memory_tolerance)
+    if regresiones:
+        print(f"❌ {len(regresiones)} regresiones respecto a {args.baseline}:")
+        for regresion in regresiones:
+            print(f"   {regresion}")
+        return 1
+
+    print(f"✅ Sin regresiones respecto a {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
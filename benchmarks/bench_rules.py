@@ -0,0 +1,109 @@
+"""
+Benchmark de SimplificationRules: una pasada compilada frente a regla a regla
+
+Uso:
+    python -m benchmarks.bench_rules --terms 5000 --mb 1
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from src.simplification_rules import SimplificationRules
+
+FRAGMENTOS = [
+    "VISTO el contenido de las actuaciones, ",
+    "de conformidad con lo establecido en el artículo 25.3, ",
+    "a tenor de lo dispuesto en la Ley, ",
+    "el Excelentísimo Señor Presidente ",
+    "si hubiere lugar a ello ",
+    "en fecha 12/03/2024 se dictó resolución. ",
+    "1) presentar el escrito, 2) comparecer ",
+    "FALLO\n",
+    "La parte demandada se opone a la pretensión. ",
+]
+
+# Términos que se solapan o se encadenan entre reglas: el resultado debe
+# seguir el orden de las reglas, no la coincidencia más larga
+FRAGMENTOS_SOLAPADOS = [
+    "en virtud de conformidad con lo anterior, ",
+    "a tenor de conformidad con la Ley, ",
+    "el Ilustrísimo Excelentísimo Señor Magistrado ",
+    "de conformidad CONSIDERANDO lo expuesto, ",
+    "de  conformidad   con lo pedido, ",
+    "Excelentísimo   Señor Fiscal ",
+]
+
+
+def synthetic_glossary(n: int) -> str:
+    """Glosario con n términos inventados"""
+    lineas = ["[terminologia]"]
+    lineas += [f"término jurídico {i} => término claro {i}" for i in range(n)]
+    lineas += [f"jurídico {i} aplicable => de aplicación {i}" for i in range(0, n, 10)]
+    lineas += ["[verbos]"]
+    lineas += [f"verbare{i} => verbo{i}" for i in range(n // 10)]
+    return "\n".join(lineas)
+
+
+def synthetic_text(mb: float, n_terms: int, seed: int = 0) -> str:
+    """Texto judicial sintético con términos del glosario intercalados"""
+    rnd = random.Random(seed)
+    partes, tamano = [], 0
+    while tamano < mb * 1024 * 1024:
+        if n_terms and rnd.random() < 0.2:
+            parte = f"el término jurídico {rnd.randrange(n_terms)} aplicable, "
+        elif rnd.random() < 0.25:
+            parte = rnd.choice(FRAGMENTOS_SOLAPADOS)
+        else:
+            parte = rnd.choice(FRAGMENTOS)
+        partes.append(parte)
+        tamano += len(parte.encode('utf-8'))
+    return "".join(partes)
+
+
+def measure(fn, texto: str, repeticiones: int) -> float:
+    """MB/s de la mejor repetición"""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn(texto)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return len(texto.encode('utf-8')) / (1024 * 1024) / mejor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de reglas de simplificación")
+    parser.add_argument('--terms', type=int, default=5000, help="Términos del glosario sintético")
+    parser.add_argument('--mb', type=float, default=1.0, help="Tamaño del texto en MB")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        glosario = Path(tmp) / "glosario.txt"
+        glosario.write_text(synthetic_glossary(args.terms), encoding='utf-8')
+
+        for nombre, reglas in (
+            ("reglas por defecto", SimplificationRules()),
+            (f"glosario de {args.terms} términos", SimplificationRules(str(glosario))),
+        ):
+            n_terms = args.terms if reglas.glosario_terminos else 0
+            texto = synthetic_text(args.mb, n_terms)
+
+            inicio = time.perf_counter()
+            reglas._compile()
+            compilacion = time.perf_counter() - inicio
+
+            secuencial = measure(reglas.apply_all_rules_sequential, texto, args.repeat)
+            una_pasada = measure(reglas.apply_all_rules, texto, args.repeat)
+            iguales = reglas.apply_all_rules(texto) == reglas.apply_all_rules_sequential(texto)
+
+            print(f"📏 {nombre} ({len(texto) / 1e6:.2f} MB, compilación {compilacion * 1000:.0f} ms)")
+            print(f"   regla a regla: {secuencial:8.2f} MB/s")
+            print(f"   una pasada:    {una_pasada:8.2f} MB/s  (x{una_pasada / secuencial:.1f})")
+            print(f"   mismo resultado: {'sí' if iguales else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
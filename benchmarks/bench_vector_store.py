@@ -0,0 +1,105 @@
+"""
+Benchmark de almacenes de vectores: NumpyVectorStore (exacto, float32 y
+float16 mapeados) frente a una colección de Chroma (HNSW)
+
+Uso:
+    python -m benchmarks.bench_vector_store --sizes 50 500 5000 --queries 200
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from src.vector_store import NumpyVectorStore
+
+DIM = 384
+
+
+def synthetic_vectors(n: int, dim: int = DIM, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def fill(store, vectores: np.ndarray):
+    n = len(vectores)
+    for start in range(0, n, 5000):
+        end = min(start + 5000, n)
+        store.upsert(
+            embeddings=vectores[start:end].tolist(),
+            documents=[f"documento {i}" for i in range(start, end)],
+            metadatas=[{'n': i} for i in range(start, end)],
+            ids=[f"id{i}" for i in range(start, end)]
+        )
+    if hasattr(store, 'flush'):
+        store.flush()
+
+
+def latencies(store, consultas: np.ndarray, k: int) -> dict:
+    """Mediana y p95 en ms de una consulta de un vector, y ids devueltos"""
+    tiempos, ids = [], []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        resultado = store.query(query_embeddings=[consulta.tolist()], n_results=k)
+        tiempos.append(time.perf_counter() - inicio)
+        ids.append(resultado['ids'][0])
+
+    tiempos.sort()
+    return {
+        'p50_ms': statistics.median(tiempos) * 1000,
+        'p95_ms': tiempos[int(len(tiempos) * 0.95) - 1] * 1000,
+        'ids': ids
+    }
+
+
+def recall(exactos, aproximados, k: int) -> float:
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(exactos, aproximados)]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de almacenes de vectores")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    try:
+        import chromadb
+    except ImportError:
+        chromadb = None
+        print("⚠️ chromadb no está instalado: solo se mide NumpyVectorStore")
+
+    consultas = synthetic_vectors(args.queries, seed=1)
+
+    for n in args.sizes:
+        vectores = synthetic_vectors(n)
+        print(f"📏 {n} vectores de {DIM} dimensiones, top-{args.k}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            stores = {}
+            for dtype in ('float32', 'float16'):
+                fill(NumpyVectorStore(f"bench_{dtype}", path=f"{tmp}/{dtype}", dtype=dtype), vectores)
+                # Reabierto desde disco: matriz mapeada, como en los workers
+                stores[f"numpy {dtype} (mmap)"] = NumpyVectorStore(f"bench_{dtype}", path=f"{tmp}/{dtype}")
+
+            if chromadb is not None:
+                cliente = chromadb.PersistentClient(path=f"{tmp}/chroma")
+                coleccion = cliente.get_or_create_collection(
+                    name="bench", metadata={"hnsw:space": "cosine"}
+                )
+                fill(coleccion, vectores)
+                stores["chroma (hnsw)"] = coleccion
+
+            exactos = None
+            for nombre, store in stores.items():
+                resultado = latencies(store, consultas, args.k)
+                if exactos is None:
+                    exactos = resultado['ids']
+                print(f"   {nombre:22s} p50 {resultado['p50_ms']:7.3f} ms   "
+                      f"p95 {resultado['p95_ms']:7.3f} ms   "
+                      f"recall@{args.k} {recall(exactos, resultado['ids'], args.k):.3f}")
+
+
+if __name__ == '__main__':
+    main()
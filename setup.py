@@ -16,5 +16,17 @@ setup(
         "Operating System :: OS Independent",
     ],
     python_requires='>=3.9',
-    install_requires=open("requirements.txt").read().splitlines(),
+    install_requires=[
+        linea for linea in open("requirements.txt").read().splitlines()
+        if linea.strip() and not linea.startswith("#")
+    ],
+    extras_require={
+        "onnx": ["onnxruntime>=1.16", "tokenizers>=0.15"],
+        "server": ["uvicorn>=0.23"],
+    },
+    entry_points={
+        "console_scripts": [
+            "justicia-clara=src.cli:main",
+        ],
+    },
 )
@@ -0,0 +1,247 @@
+"""
+Índice léxico BM25 en memoria
+Índice invertido con normalización para español, complemento de la
+búsqueda densa en retrieve_hybrid
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Subir al cambiar la normalización o el formato guardado
+BM25_VERSION = 1
+
+K1 = 1.2
+B = 0.75
+
+# Las consultas largas (una sentencia entera) se quedan con sus términos más raros
+MAX_QUERY_TERMS = 64
+
+TOKEN_RE = re.compile(r'[a-zñ0-9]+')
+ACENTOS = str.maketrans('áàäâéèëêíìïîóòöôúùüû', 'aaaaeeeeiiiioooouuuu')
+
+STOPWORDS = frozenset(
+    "a al ante bajo con contra de del desde durante e el en entre hacia hasta la las le les lo los "
+    "mediante ni o para por que se segun sin sobre su sus tras u un una unas unos y ya es son".split()
+)
+
+
+def _stem(token: str) -> str:
+    """Stemming ligero: sin plural ni vocal final (partes, parte → part; leyes → ley)"""
+    if len(token) > 4 and token.endswith('es') and token[-3] not in 'aeiou':
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def normalize(texto: str) -> List[str]:
+    """Términos del texto: minúsculas, sin tildes ni palabras vacías, con stemming ligero"""
+    return [
+        _stem(token)
+        for token in TOKEN_RE.findall(texto.lower().translate(ACENTOS))
+        if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Índice invertido BM25. Los documentos se añaden por lotes (add) y se
+    compilan al buscar o guardar en arrays CSR (término → documentos) con
+    el peso BM25 de cada aparición ya calculado, de modo que una búsqueda
+    es una suma dispersa por término de la consulta.
+    """
+
+    def __init__(self, k1: float = K1, b: float = B):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self._posicion: Dict[str, int] = {}
+        self._doc_len: List[int] = []
+        self._vivos: List[bool] = []
+
+        # Postings compilados y pendientes de compilar
+        self._terms: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.int32)
+        self._nuevos: Dict[str, List[Tuple[int, int]]] = {}
+        self._borrados = False
+
+        # (terms, offsets, docs, pesos, idf, ids) listo para buscar
+        self._compilado = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(self._vivos)
+
+    def add(self, ids: Iterable[str], documents: Iterable[str]):
+        """Añadir (o sustituir, si el id ya existe) documentos"""
+        with self._lock:
+            for doc_id, documento in zip(ids, documents):
+                anterior = self._posicion.get(doc_id)
+                if anterior is not None:
+                    self._vivos[anterior] = False
+                    self._borrados = True
+
+                n = len(self.ids)
+                self.ids.append(doc_id)
+                self._posicion[doc_id] = n
+                terminos = normalize(documento)
+                self._doc_len.append(len(terminos))
+                self._vivos.append(True)
+                for termino, tf in Counter(terminos).items():
+                    self._nuevos.setdefault(termino, []).append((n, tf))
+
+            self._compilado = None
+
+    def delete(self, ids: Iterable[str]):
+        """Quitar documentos (los ids que no están se ignoran)"""
+        with self._lock:
+            for doc_id in ids:
+                fila = self._posicion.pop(doc_id, None)
+                if fila is not None:
+                    self._vivos[fila] = False
+                    self._borrados = True
+
+            self._compilado = None
+
+    def _compile(self):
+        """Unir los postings pendientes a los arrays y precalcular los pesos"""
+        if self._nuevos or self._borrados:
+            self._merge()
+
+        n_docs = len(self.ids)
+        doc_len = np.asarray(self._doc_len, dtype=np.float32)
+        media = float(doc_len.mean()) if n_docs else 0.0
+
+        df = np.diff(self._offsets).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        tf = self._tfs.astype(np.float32)
+        norma = self.k1 * (1 - self.b + self.b * doc_len[self._docs] / (media or 1.0))
+        pesos = np.repeat(idf, np.diff(self._offsets)) * tf * (self.k1 + 1) / (tf + norma)
+
+        self._compilado = (self._terms, self._offsets, self._docs, pesos, idf, list(self.ids))
+
+    def _merge(self):
+        """Rehacer los arrays CSR con los documentos nuevos, sin los sustituidos"""
+        vivos = np.asarray(self._vivos, dtype=bool)
+        nuevo_indice = np.cumsum(vivos) - 1
+
+        terms, offsets, docs, tfs = {}, [0], [], []
+        for termino in set(self._terms) | set(self._nuevos):
+            partes_docs, partes_tfs = [], []
+            fila = self._terms.get(termino)
+            if fila is not None:
+                inicio, fin = self._offsets[fila], self._offsets[fila + 1]
+                partes_docs.append(self._docs[inicio:fin])
+                partes_tfs.append(self._tfs[inicio:fin])
+            if termino in self._nuevos:
+                pares = np.asarray(self._nuevos[termino], dtype=np.int32)
+                partes_docs.append(pares[:, 0])
+                partes_tfs.append(pares[:, 1])
+
+            d = np.concatenate(partes_docs)
+            t = np.concatenate(partes_tfs)
+            mascara = vivos[d]
+            if not mascara.any():
+                continue
+
+            terms[termino] = len(terms)
+            docs.append(nuevo_indice[d[mascara]].astype(np.int32))
+            tfs.append(t[mascara].astype(np.int32))
+            offsets.append(offsets[-1] + int(mascara.sum()))
+
+        self.ids = [doc_id for doc_id, vivo in zip(self.ids, self._vivos) if vivo]
+        self._posicion = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._doc_len = [n for n, vivo in zip(self._doc_len, self._vivos) if vivo]
+        self._vivos = [True] * len(self.ids)
+
+        self._terms = terms
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._docs = np.concatenate(docs) if docs else np.zeros(0, dtype=np.int32)
+        self._tfs = np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.int32)
+        self._nuevos = {}
+        self._borrados = False
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Los n_results documentos con mayor puntuación BM25: [(id, puntuación)]"""
+        compilado = self._compilado
+        if compilado is None:
+            with self._lock:
+                if self._compilado is None:
+                    self._compile()
+                compilado = self._compilado
+        terms, offsets, docs, pesos, idf, ids = compilado
+
+        filas = [terms[t] for t in set(normalize(query)) if t in terms]
+        if not filas or not ids:
+            return []
+        if len(filas) > MAX_QUERY_TERMS:
+            filas = sorted(filas, key=lambda f: idf[f], reverse=True)[:MAX_QUERY_TERMS]
+
+        puntuaciones = np.zeros(len(ids), dtype=np.float32)
+        for fila in filas:
+            inicio, fin = offsets[fila], offsets[fila + 1]
+            # Cada documento aparece una vez por término: la suma indexada es segura
+            puntuaciones[docs[inicio:fin]] += pesos[inicio:fin]
+
+        candidatos = np.flatnonzero(puntuaciones)
+        if len(candidatos) > n_results:
+            candidatos = candidatos[np.argpartition(-puntuaciones[candidatos], n_results - 1)[:n_results]]
+        candidatos = candidatos[np.argsort(-puntuaciones[candidatos], kind='stable')]
+
+        return [(ids[i], float(puntuaciones[i])) for i in candidatos]
+
+    def save(self, path: str):
+        """Guardar el índice (escritura atómica)"""
+        with self._lock:
+            if self._nuevos or self._borrados:
+                self._compile()
+            terminos = sorted(self._terms, key=self._terms.get)
+            destino = Path(path)
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            tmp = destino.with_suffix('.tmp')
+            with open(tmp, 'wb') as f:
+                np.savez(
+                    f,
+                    version=np.array(BM25_VERSION),
+                    params=np.array([self.k1, self.b]),
+                    ids=np.array(self.ids, dtype=str),
+                    doc_len=np.asarray(self._doc_len, dtype=np.int32),
+                    terms=np.array(terminos, dtype=str),
+                    offsets=self._offsets,
+                    docs=self._docs,
+                    tfs=self._tfs
+                )
+            os.replace(tmp, destino)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Índice guardado, o None si no existe o es de otra versión"""
+        try:
+            with np.load(path, allow_pickle=False) as datos:
+                if int(datos['version']) != BM25_VERSION:
+                    return None
+                k1, b = (float(x) for x in datos['params'])
+                index = cls(k1=k1, b=b)
+                index.ids = datos['ids'].tolist()
+                index._doc_len = datos['doc_len'].tolist()
+                index._terms = {t: i for i, t in enumerate(datos['terms'].tolist())}
+                index._offsets = datos['offsets']
+                index._docs = datos['docs']
+                index._tfs = datos['tfs']
+        except (OSError, ValueError, KeyError):
+            return None
+
+        index._posicion = {doc_id: i for i, doc_id in enumerate(index.ids)}
+        index._vivos = [True] * len(index.ids)
+        return index
@@ -0,0 +1,361 @@
+"""
+Ingesta masiva de sentencias CENDOJ
+Carga un directorio local de PDFs/TXTs en la colección rag_cendoj_sentencias
+
+Uso:
+    python -m src.cendoj_ingest data/cendoj --index-dir data/index/cendoj
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from src.encoders import BACKENDS, DEFAULT_BACKEND
+
+EXTENSIONES = ('.pdf', '.txt')
+
+# Trozos de sentencia indexados (caracteres)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# Ficheros por lote: cada lote se embebe y se inserta de una vez
+FILES_PER_BATCH = 64
+
+# Lotes entre checkpoints: guardar el índice BM25 recompila todo el
+# vocabulario, así que se guarda junto al checkpoint cada tantos lotes
+BATCHES_PER_CHECKPOINT = 16
+
+# Chunks por documento que se comprueban en cada consulta de chunks obsoletos
+STALE_PROBE = 16
+
+MESES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+         'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+ORGANO_RE = re.compile(
+    r'^\s*((?:JUZGADO|TRIBUNAL|AUDIENCIA|SALA)\b.*?)\s*$',
+    re.IGNORECASE | re.MULTILINE
+)
+PROCEDIMIENTO_RE = re.compile(r'^\s*Procedimiento:\s*(.+?)\s*$', re.IGNORECASE | re.MULTILINE)
+FECHA_LARGA_RE = re.compile(
+    r'\b(\d{1,2})\s+de\s+(' + '|'.join(MESES) + r')\s+de\s+(\d{4})\b',
+    re.IGNORECASE
+)
+FECHA_CORTA_RE = re.compile(r'\b(\d{1,2})/(\d{1,2})/(\d{4})\b')
+
+
+def iter_ficheros(source_dir: str) -> Iterator[Path]:
+    """Recorrer el directorio sin cargar la lista completa en memoria"""
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(EXTENSIONES):
+                yield Path(root) / name
+
+
+def extraer_texto(path: str) -> Dict:
+    """Extraer texto de un fichero (se ejecuta en el pool de procesos)"""
+    try:
+        if path.lower().endswith('.pdf'):
+            from src.pdf_extraction import extract_text
+
+            # Ya se reparte por ficheros: cada PDF se lee en serie dentro del worker
+            texto = extract_text(path)
+        else:
+            texto = Path(path).read_text(encoding='utf-8', errors='replace')
+        return {'path': path, 'texto': texto, 'error': None}
+    except Exception as e:
+        return {'path': path, 'texto': "", 'error': str(e)}
+
+
+def extraer_metadatos(texto: str) -> Dict:
+    """Órgano, fecha (ISO) y procedimiento de la cabecera de la sentencia"""
+    cabecera = texto[:3000]
+
+    organo = ORGANO_RE.search(cabecera)
+    procedimiento = PROCEDIMIENTO_RE.search(cabecera)
+
+    fecha = ""
+    m = FECHA_LARGA_RE.search(cabecera)
+    if m:
+        dia, mes, anio = m.groups()
+        fecha = f"{anio}-{MESES.index(mes.lower()) + 1:02d}-{int(dia):02d}"
+    else:
+        m = FECHA_CORTA_RE.search(cabecera)
+        if m:
+            dia, mes, anio = m.groups()
+            fecha = f"{anio}-{int(mes):02d}-{int(dia):02d}"
+
+    # Chroma no admite None en metadatos
+    return {
+        'organo': organo.group(1) if organo else "",
+        'fecha': fecha,
+        'procedimiento': procedimiento.group(1) if procedimiento else ""
+    }
+
+
+def chunk_texto(texto: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Trocear respetando espacios para no cortar palabras"""
+    texto = re.sub(r'\s+', ' ', texto).strip()
+    chunks = []
+    start = 0
+
+    while start < len(texto):
+        end = min(start + size, len(texto))
+        if end < len(texto):
+            corte = texto.rfind(' ', start + size // 2, end)
+            if corte != -1:
+                end = corte
+        chunks.append(texto[start:end].strip())
+        if end >= len(texto):
+            break
+        start = max(end - overlap, start + 1)
+
+    return [c for c in chunks if c]
+
+
+class Checkpoint:
+    """
+    Ficheros ya ingeridos, guardado de forma atómica. Los que fallaron
+    (error de extracción o sin texto) se guardan aparte con el motivo y se
+    reintentan en la siguiente ejecución. generacion identifica
+    la colección a la que pertenecen (DualRAGSystem.cendoj_generation): si
+    la colección se ha vuelto a crear, el checkpoint no vale y se empieza de
+    cero.
+    """
+
+    def __init__(self, path: Path, generacion: Optional[str] = None):
+        self.path = Path(path)
+        self.generacion = generacion
+        self.procesados: Dict[str, str] = {}
+        self.fallidos: Dict[str, str] = {}
+
+        if self.path.exists():
+            try:
+                datos = json.loads(self.path.read_text(encoding='utf-8'))
+                procesados = datos['procesados']
+            except (OSError, ValueError, KeyError):
+                print(f"⚠️ Checkpoint ilegible, se empieza de cero: {self.path}")
+            else:
+                if datos.get('generacion') == generacion:
+                    self.procesados = procesados
+                    self.fallidos = datos.get('fallidos', {})
+                else:
+                    print(f"⚠️ Checkpoint de otra colección CENDOJ, se empieza de cero: {self.path}")
+
+    @staticmethod
+    def firma(path: Path) -> str:
+        """Tamaño + mtime: si cambia, el fichero se vuelve a ingerir"""
+        st = path.stat()
+        return f"{st.st_size}:{st.st_mtime_ns}"
+
+    def pendiente(self, path: Path) -> bool:
+        return self.procesados.get(str(path)) != self.firma(path)
+
+    def marcar(self, paths: List[Path]):
+        for path in paths:
+            self.procesados[str(path)] = self.firma(path)
+            self.fallidos.pop(str(path), None)
+
+    def fallar(self, path: Path, motivo: str):
+        """Fichero no ingerido: queda pendiente para la próxima ejecución"""
+        self.procesados.pop(str(path), None)
+        self.fallidos[str(path)] = motivo
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'generacion': self.generacion, 'procesados': self.procesados,
+                                   'fallidos': self.fallidos}), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+
+def _doc_id(path: Path) -> str:
+    return hashlib.sha1(str(path).encode('utf-8')).hexdigest()[:16]
+
+
+def _chunk_id(doc_id: str, n: int) -> str:
+    return f"cendoj_{doc_id}_{n}"
+
+
+def chunks_obsoletos(collection, n_chunks: Dict[str, int]) -> List[str]:
+    """
+    Ids de chunks guardados de cada documento a partir de los que tiene
+    ahora (doc_id → número de chunks): si un fichero modificado da menos
+    chunks, los de la ingesta anterior con n mayor se quedarían en el
+    índice. Los chunks de un documento son consecutivos desde 0, así que
+    se consultan por ventanas hasta la primera que no está completa.
+    """
+    obsoletos = []
+    pendientes = dict(n_chunks)
+    while pendientes:
+        ventanas = {doc_id: [_chunk_id(doc_id, n) for n in range(desde, desde + STALE_PROBE)]
+                    for doc_id, desde in pendientes.items()}
+        guardados = set(collection.get(ids=[i for ids in ventanas.values() for i in ids],
+                                       include=[])['ids'])
+
+        siguientes = {}
+        for doc_id, ids in ventanas.items():
+            encontrados = [i for i in ids if i in guardados]
+            obsoletos.extend(encontrados)
+            if len(encontrados) == STALE_PROBE:
+                siguientes[doc_id] = pendientes[doc_id] + STALE_PROBE
+        pendientes = siguientes
+
+    return obsoletos
+
+
+def ingest_cendoj(system, source_dir: str, checkpoint_path: Optional[str] = None,
+                  workers: Optional[int] = None, files_per_batch: int = FILES_PER_BATCH,
+                  batches_per_checkpoint: int = BATCHES_PER_CHECKPOINT) -> Dict:
+    """
+    Ingerir un directorio de sentencias en system.rag_cendoj.
+    Reanuda desde el checkpoint si la ejecución anterior se interrumpió; el
+    índice BM25 y el checkpoint se guardan juntos cada
+    batches_per_checkpoint lotes y al terminar, de modo que un fichero
+    marcado como ingerido está también en el índice léxico guardado.
+    """
+    if checkpoint_path is None:
+        from src.dual_rag_system import CENDOJ_CHECKPOINT_FILE
+
+        base = system.index_dir or Path(source_dir)
+        checkpoint_path = base / CENDOJ_CHECKPOINT_FILE
+
+    checkpoint = Checkpoint(checkpoint_path, generacion=system.cendoj_generation)
+    system._drop_cendoj_mock()
+
+    stats = {
+        'ficheros': 0, 'omitidos': 0, 'errores': 0, 'chunks': 0, 'obsoletos': 0, 'lotes': 0,
+        'extraccion_s': 0.0, 'chunking_s': 0.0, 'encode_s': 0.0, 'upsert_s': 0.0
+    }
+
+    def procesar_lote(pool, lote: List[Path]):
+        t0 = time.perf_counter()
+        extraidos = list(pool.map(extraer_texto, [str(p) for p in lote], chunksize=4))
+        stats['extraccion_s'] += time.perf_counter() - t0
+
+        t1 = time.perf_counter()
+        ids, documents, metadatas = [], [], []
+        n_chunks, ingeridos = {}, []
+        for item in extraidos:
+            path = Path(item['path'])
+            chunks = [] if item['error'] else chunk_texto(item['texto'])
+            if not chunks:
+                # Sin marcar: se reintenta al reanudar (y un fichero que
+                # hoy no se lee no borra lo que se ingirió antes)
+                motivo = item['error'] or "sin texto"
+                print(f"⚠️ {item['path']}: {motivo}")
+                checkpoint.fallar(path, motivo)
+                stats['errores'] += 1
+                continue
+
+            metadata = extraer_metadatos(item['texto'])
+            metadata['fuente'] = path.name
+            doc_id = _doc_id(path)
+            ingeridos.append(path)
+
+            for n, chunk in enumerate(chunks):
+                ids.append(_chunk_id(doc_id, n))
+                documents.append(chunk)
+                metadatas.append(metadata)
+            n_chunks[doc_id] = len(chunks)
+        stats['chunking_s'] += time.perf_counter() - t1
+
+        obsoletos = chunks_obsoletos(system.rag_cendoj, n_chunks)
+        system._delete_rows(system.rag_cendoj, obsoletos)
+        stats['obsoletos'] += len(obsoletos)
+
+        indexado = system._bulk_index(system.rag_cendoj, ids, documents, metadatas,
+                                      save=False)
+        stats['encode_s'] += indexado.get('encode_s', 0.0)
+        stats['upsert_s'] += indexado.get('upsert_s', 0.0)
+        stats['chunks'] += len(documents)
+        stats['ficheros'] += len(ingeridos)
+
+        checkpoint.marcar(ingeridos)
+        stats['lotes'] += 1
+        if stats['lotes'] % batches_per_checkpoint == 0:
+            guardar()
+
+        print(f"   📦 {stats['ficheros']} ficheros, {stats['chunks']} chunks")
+
+    def guardar():
+        system._save_collection(system.rag_cendoj.name)
+        checkpoint.save()
+
+    print(f"⚖️ Ingestando CENDOJ desde {source_dir}...")
+    t_inicio = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        lote = []
+        for path in iter_ficheros(source_dir):
+            if not checkpoint.pendiente(path):
+                stats['omitidos'] += 1
+                continue
+            lote.append(path)
+            if len(lote) >= files_per_batch:
+                procesar_lote(pool, lote)
+                lote = []
+        if lote:
+            procesar_lote(pool, lote)
+    if stats['lotes'] % batches_per_checkpoint:
+        guardar()
+
+    stats['total_s'] = time.perf_counter() - t_inicio
+
+    def rate(n, secs):
+        return n / secs if secs else 0.0
+
+    stats['throughput'] = {
+        'extraccion_ficheros_por_s': rate(stats['ficheros'], stats['extraccion_s']),
+        'chunking_ficheros_por_s': rate(stats['ficheros'], stats['chunking_s']),
+        'encode_chunks_por_s': rate(stats['chunks'], stats['encode_s']),
+        'upsert_chunks_por_s': rate(stats['chunks'], stats['upsert_s']),
+        'total_ficheros_por_s': rate(stats['ficheros'], stats['total_s'])
+    }
+
+    print(f"✅ {stats['ficheros']} ficheros ({stats['chunks']} chunks) en {stats['total_s']:.1f}s, "
+          f"{stats['omitidos']} ya ingeridos, {stats['errores']} con error")
+    for etapa, valor in stats['throughput'].items():
+        print(f"   {etapa}: {valor:.1f}")
+
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ingesta masiva de sentencias CENDOJ")
+    parser.add_argument('source_dir', help="Directorio con PDFs/TXTs de sentencias")
+    parser.add_argument('--guia', default="data/Guia_de_redaccion_judicial_clara.pdf")
+    parser.add_argument('--index-dir', default="data/index/cendoj")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Fichero de checkpoint (por defecto, dentro de --index-dir)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch', type=int, default=FILES_PER_BATCH,
+                        help="Ficheros por lote")
+    parser.add_argument('--checkpoint-every', type=int, default=BATCHES_PER_CHECKPOINT,
+                        help="Lotes entre checkpoints (y guardados del índice BM25)")
+    parser.add_argument('--encoder-backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Encoder de embeddings: torch (fp32) u onnx-int8 (sin torch)")
+    args = parser.parse_args(argv)
+
+    from src.dual_rag_system import DualRAGSystem
+
+    system = DualRAGSystem(guia_path=args.guia, use_cendoj=True, index_dir=args.index_dir,
+                           encoder_backend=args.encoder_backend)
+    ingest_cendoj(
+        system,
+        args.source_dir,
+        checkpoint_path=args.checkpoint,
+        workers=args.workers,
+        files_per_batch=args.batch,
+        batches_per_checkpoint=args.checkpoint_every
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+CLI de Justicia Clara: simplificación por lotes de directorios de documentos
+
+Uso:
+    justicia-clara sentencias/ --output salida/ --workers 2
+    justicia-clara "sentencias/2024-*.pdf" --output salida/ --resume
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+from src.encoders import BACKENDS, DEFAULT_BACKEND
+
+EXTENSIONES = ('.pdf', '.txt')
+RESULTS_FILE = "resultados.jsonl"
+
+# Sistema RAG de cada proceso worker (se carga una sola vez por worker)
+_SYSTEM = None
+
+
+def iter_inputs(entradas: List[str]) -> Iterator[Path]:
+    """Expandir directorios y globs a la lista de documentos"""
+    vistos = set()
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = sorted(Path(entrada).rglob('*'))
+        else:
+            candidatos = sorted(Path(p) for p in glob.glob(entrada, recursive=True))
+
+        for path in candidatos:
+            if path.is_file() and path.suffix.lower() in EXTENSIONES and path not in vistos:
+                vistos.add(path)
+                yield path
+
+
+def output_names(paths: List[Path]) -> Dict[str, str]:
+    """
+    Nombre de salida de cada documento: su ruta relativa a la raíz común de
+    las entradas, con la extensión original (in/a/s.txt y in/b/s.pdf dan
+    a/s.txt.simplificado.txt y b/s.pdf.simplificado.txt), así que dos
+    entradas distintas nunca escriben el mismo fichero.
+    """
+    if not paths:
+        return {}
+    absolutas = [p.resolve() for p in paths]
+    raiz = Path(os.path.commonpath([p.parent for p in absolutas]))
+    return {str(p): str(a.relative_to(raiz).with_name(f"{a.name}.simplificado.txt"))
+            for p, a in zip(paths, absolutas)}
+
+
+def read_document(path: Path) -> str:
+    """Texto de un PDF o TXT"""
+    if path.suffix.lower() == '.pdf':
+        from src.utils import extract_text_from_pdf
+
+        return extract_text_from_pdf(str(path))
+    return path.read_text(encoding='utf-8', errors='replace')
+
+
+def _init_worker(config: Dict):
+    """Cargar DualRAGSystem (encoder, índice y cliente LLM) una vez por worker"""
+    global _SYSTEM
+    from src.dual_rag_system import DualRAGSystem
+    from src.llm_handler import LLMHandler
+    from src.result_cache import ResultCache
+
+    _SYSTEM = DualRAGSystem(
+        guia_path=config['guia'],
+        use_cendoj=config['use_cendoj'],
+        index_dir=config['index_dir'],
+        llm=None if config['rules_only'] else LLMHandler(model=config['model']),
+        result_cache=ResultCache(config['cache']) if config['cache'] else None,
+        encoder_backend=config['encoder_backend']
+    )
+    if not config['rules_only']:
+        _SYSTEM.warmup()
+
+
+def _procesar(path_str: str, config: Dict, nombre: Optional[str] = None) -> Dict:
+    """Simplificar un documento en el worker; nombre es su fichero de salida (output_names)"""
+    path = Path(path_str)
+    registro = {'input': path_str, 'status': 'ok'}
+    inicio = time.perf_counter()
+
+    try:
+        texto = read_document(path)
+        extraccion_s = time.perf_counter() - inicio
+
+        if config['rules_only']:
+            resultado = _SYSTEM.simplificar_reglas(texto)
+        else:
+            resultado = _SYSTEM.simplificar(texto, long_mode=config['long_mode'],
+                                            deadline_s=config['deadline'])
+
+        if config['output_files']:
+            destino = Path(config['output']) / (nombre or f"{path.name}.simplificado.txt")
+            from src.utils import save_output
+
+            save_output(resultado['simplificado'], destino)
+            registro['output'] = str(destino)
+
+        registro.update({
+            'simplificado': resultado['simplificado'],
+            'fuentes': resultado['fuentes'],
+            'resultados_rag': resultado['resultados_rag'],
+            'tiempos': {
+                'extraccion_s': extraccion_s,
+                **resultado['tiempos'],
+                'total_s': time.perf_counter() - inicio
+            },
+            'cache': resultado.get('cache', False),
+            'nivel': resultado.get('nivel'),
+            'tokens': resultado.get('tokens')
+        })
+    except Exception as e:
+        registro.update({
+            'status': 'error',
+            'error': str(e),
+            'tiempos': {'total_s': time.perf_counter() - inicio}
+        })
+
+    return registro
+
+
+def load_done(results_path: Path) -> Set[str]:
+    """Documentos ya procesados con éxito en una ejecución anterior"""
+    hechos = set()
+    if not results_path.exists():
+        return hechos
+
+    with open(results_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                registro = json.loads(line)
+            except ValueError:
+                # Última línea cortada si el proceso se interrumpió
+                continue
+            if registro.get('status') == 'ok':
+                hechos.add(registro['input'])
+    return hechos
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='justicia-clara',
+        description="Simplificar por lotes documentos judiciales (PDF/TXT) con el RAG Dual"
+    )
+    parser.add_argument('inputs', nargs='+', help="Directorios, ficheros o globs de entrada")
+    parser.add_argument('-o', '--output', default="salida", help="Directorio de salida")
+    parser.add_argument('--format', choices=['jsonl', 'files', 'both'], default='both',
+                        help="Texto simplificado en el JSONL, en un .txt por documento o en ambos")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="Procesos worker (cada uno carga el modelo una vez)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Saltar los documentos ya presentes en resultados.jsonl")
+    parser.add_argument('--guia', default="data/Guia_de_redaccion_judicial_clara.pdf")
+    parser.add_argument('--index-dir', default=None,
+                        help="Índice persistente (por defecto data/index/cendoj o data/index/guia)")
+    parser.add_argument('--no-cendoj', action='store_true', help="No usar contexto CENDOJ")
+    parser.add_argument('--model', default="llama2", help="Modelo de Ollama")
+    parser.add_argument('--cache', default="data/cache/resultados.sqlite3",
+                        help="Caché de resultados compartida por los workers")
+    parser.add_argument('--no-cache', action='store_true', help="No usar la caché de resultados")
+    parser.add_argument('--long-mode', choices=['auto', 'on', 'off'], default='auto',
+                        help="Simplificación por secciones de documentos largos")
+    parser.add_argument('--deadline', type=float, default=None,
+                        help="Segundos máximos por documento; al agotarse se usa la salida por reglas")
+    parser.add_argument('--rules-only', action='store_true',
+                        help="Aplicar solo las reglas, sin índice ni LLM (arranque inmediato)")
+    parser.add_argument('--encoder-backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Encoder de embeddings: torch (fp32) u onnx-int8 (sin torch)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    results_path = output / RESULTS_FILE
+
+    config = {
+        'guia': args.guia,
+        'use_cendoj': not args.no_cendoj,
+        'index_dir': args.index_dir or f"data/index/{'guia' if args.no_cendoj else 'cendoj'}",
+        'model': args.model,
+        'cache': None if args.no_cache else args.cache,
+        'output': str(output),
+        'output_files': args.format in ('files', 'both'),
+        'long_mode': {'auto': None, 'on': True, 'off': False}[args.long_mode],
+        'deadline': args.deadline,
+        'rules_only': args.rules_only,
+        'encoder_backend': args.encoder_backend
+    }
+
+    hechos = load_done(results_path) if args.resume else set()
+    entradas = list(iter_inputs(args.inputs))
+    # Con todas las entradas (no solo las pendientes) para que --resume mantenga los nombres
+    nombres = output_names(entradas)
+    pendientes = [str(p) for p in entradas if str(p) not in hechos]
+
+    print(f"📄 {len(pendientes)} documentos pendientes ({len(hechos)} ya procesados)")
+    if not pendientes:
+        return 0
+
+    # Construir/validar el índice una vez antes de lanzar los workers
+    if not args.rules_only:
+        from src.dual_rag_system import DualRAGSystem
+
+        DualRAGSystem(
+            guia_path=config['guia'],
+            use_cendoj=config['use_cendoj'],
+            index_dir=config['index_dir'],
+            encoder_backend=config['encoder_backend']
+        ).warmup(encoder=False, llm=False)
+
+    modo = 'a' if args.resume else 'w'
+    ok = errores = 0
+    inicio = time.perf_counter()
+
+    with open(results_path, modo, encoding='utf-8') as salida, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                initargs=(config,)) as pool:
+        futuros = [pool.submit(_procesar, path, config, nombres[path]) for path in pendientes]
+
+        for futuro in as_completed(futuros):
+            registro = futuro.result()
+
+            if registro['status'] == 'ok':
+                ok += 1
+                print(f"✅ {registro['input']} ({registro['tiempos']['total_s']:.1f}s, {registro['nivel']})")
+            else:
+                errores += 1
+                print(f"⚠️ {registro['input']}: {registro['error']}")
+
+            # El JSONL es también el registro que usa --resume
+            if args.format == 'files':
+                registro.pop('simplificado', None)
+            salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            salida.flush()
+
+    total = time.perf_counter() - inicio
+    print(f"🏁 {ok} simplificados, {errores} con error en {total:.1f}s "
+          f"({(ok + errores) / total if total else 0:.2f} docs/s)")
+
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -3,14 +3,87 @@ Sistema RAG Dual para Justicia Clara
 Combina Guía Oficial + CENDOJ
 """
 
-from sentence_transformers import SentenceTransformer
-import chromadb
-from typing import Dict, List, Optional
-import PyPDF2
-import re
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-# Al inicializar (solo una vez):
-REGLAS_SIMPLIFICADAS = Path("data/guia/reglas_simplificadas.txt").read_text(encoding="utf-8")
+
+import numpy as np
+
+from src.bm25 import BM25Index
+from src.embedding_cache import EmbeddingCache
+from src.encoders import (DEFAULT_BACKEND, ONNX_MODEL_DIR, BatchingEncoder,
+                          encoder_id, load_encoder)
+from src.instrumentation import bind, record, span, timed, traced
+from src.guia_artifact import (ARTIFACT_VERSION, artifact_vigente, build_artifact,
+                               default_artifact_path, load_artifact)
+from src.long_document import PASSAGE_CHARS, iter_sections, join_sections, query_passages, split_sections
+from src.pdf_extraction import PdfTextCache
+from src.simplification_rules import SimplificationRules
+from src.utils import file_sha256
+from src.vector_store import STORES, NumpyVectorStore
+
+# sentence_transformers (torch) u onnxruntime y chromadb se importan al primer uso
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# Reglas resumidas que se incluyen en el prompt (se leen al primer uso)
+REGLAS_PATH = Path(__file__).resolve().parent.parent / "data" / "reglas_simplificacion.txt"
+_reglas_simplificadas = None  # (mtime_ns, texto)
+
+# Subir al cambiar el formato de los documentos indexados
+EXTRACTION_VERSION = 2
+
+MANIFEST_FILE = "manifest.json"
+CENDOJ_MANIFEST_FILE = "cendoj_manifest.json"
+CENDOJ_CHECKPOINT_FILE = "cendoj_checkpoint.json"
+EMBEDDING_CACHE_FILE = "embeddings.sqlite3"
+BM25_FILE = "bm25_{}.npz"
+
+# Textos por llamada a encoder.encode y filas por llamada a collection.upsert
+EMBED_BATCH_SIZE = 64
+UPSERT_BATCH_SIZE = 5000
+
+# A partir de este tamaño simplificar() trabaja por secciones
+LONG_DOC_CHARS = 6000
+LONG_DOC_WORKERS = 4
+
+# Consulta multivector: 'single' (un vector), 'passages' (uno por pasaje) o
+# 'auto' (pasajes si el texto no cabe en un solo vector)
+QUERY_MODES = ('auto', 'single', 'passages')
+# Fusión de los resultados de cada pasaje: 'max' (mejor similitud) o 'rrf'
+QUERY_FUSIONS = ('max', 'rrf')
+RRF_K = 60
+
+# Resultados por defecto de cada colección
+GUIA_TOP_K = 3
+CENDOJ_TOP_K = 2
+
+# Candidatos de cada búsqueda (densa y léxica) antes de la fusión híbrida
+HYBRID_CANDIDATES = 20
+
+COLECCION_GUIA = "rag_guia_simplificacion"
+COLECCION_CENDOJ = "rag_cendoj_sentencias"
+
+
+def load_reglas_simplificadas() -> str:
+    """
+    Texto de REGLAS_PATH. Se vuelve a leer solo si el fichero cambia; con él
+    cambian prompt_prefix (se recalcula su contexto en el LLM) y
+    prompt_version (nuevas claves de caché).
+    """
+    global _reglas_simplificadas
+    mtime = REGLAS_PATH.stat().st_mtime_ns
+    if _reglas_simplificadas is None or _reglas_simplificadas[0] != mtime:
+        _reglas_simplificadas = (mtime, REGLAS_PATH.read_text(encoding="utf-8"))
+    return _reglas_simplificadas[1]
 
 
 class DualRAGSystem:
@@ -20,121 +93,483 @@ class DualRAGSystem:
     - RAG 2: CENDOJ (sentencias reales)
     """
     
-    def __init__(self, guia_path: str, use_cendoj: bool = True):
+    def __init__(self, guia_path: str, use_cendoj: bool = True,
+                 index_dir: Optional[str] = None,
+                 embed_batch_size: int = EMBED_BATCH_SIZE,
+                 llm=None, warmup_llm: bool = False,
+                 result_cache=None, embedding_cache=None,
+                 latency_budget_s: Optional[float] = None,
+                 guia_artifact: Optional[str] = None,
+                 encoder_backend: str = DEFAULT_BACKEND,
+                 encoder_model_dir: str = ONNX_MODEL_DIR,
+                 query_mode: str = 'auto', query_fusion: str = 'max',
+                 dense_weight: float = 1.0, lexical_weight: float = 1.0,
+                 guia_store: str = 'numpy', cendoj_store: str = 'chroma',
+                 store_dtype: str = 'float32',
+                 query_batch_ms: Optional[float] = None):
+        """
+        Crear el sistema es inmediato: índice (chromadb), encoder
+        (sentence_transformers) y cliente LLM se cargan al primer uso, o
+        antes con warmup().
+        
+        Si se indica index_dir, las colecciones se guardan en disco junto a
+        un manifest (hash de la Guía, encoder y versión de extracción). Si el
+        manifest coincide, se abre el índice sin extraer ni embeber nada.
+        La colección CENDOJ tiene su propio manifest (encoder y almacén): la
+        ingesta masiva (src.cendoj_ingest) solo se pierde si cambia cómo se
+        embebe o se guarda, no con la Guía.
+        
+        use_cendoj es solo el valor por defecto de cada petición: las dos
+        colecciones se abren siempre y no forman parte del manifest, así que
+        cambiarlo no toca el índice en disco.
+        
+        El cliente LLM se crea una vez y se comparte entre peticiones. Crear
+        el sistema no carga nada: quien lo arranca (app.py, servidor, CLI)
+        llama a warmup(); con warmup_llm=True el modelo se carga además en
+        segundo plano al crearlo.
+        
+        result_cache (ResultCache) evita repetir la generación de documentos
+        ya simplificados con el mismo modelo, prompt y ejemplos.
+        
+        embedding_cache (EmbeddingCache) se usa en consultas e indexación; por
+        defecto va en memoria, y también en disco dentro de index_dir.
+        
+        latency_budget_s es el plazo por defecto de cada simplificación: al
+        vencer se cancela el LLM y se devuelve la salida de reglas.
+        
+        guia_artifact es el JSON de ejemplos de la Guía (por defecto junto al
+        PDF, ver src.guia_artifact).
+        
+        encoder_backend elige el encoder: 'torch' (SentenceTransformer fp32)
+        u 'onnx-int8' (modelo exportado en encoder_model_dir, sin torch; ver
+        src.encoders). Cada backend tiene su propio índice y caché de
+        embeddings.
+        
+        query_mode y query_fusion controlan cómo se consulta el índice con
+        textos largos (ver retrieve_hybrid).
+        
+        Cada colección tiene además un índice léxico BM25 (src.bm25), que se
+        guarda junto a ella en index_dir. dense_weight y lexical_weight son
+        los pesos de cada búsqueda en la fusión RRF; con lexical_weight=0 la
+        búsqueda es solo densa.
+        
+        guia_store y cendoj_store eligen el almacén de vectores de cada
+        colección: 'chroma' (HNSW) o 'numpy' (búsqueda exacta sobre una
+        matriz mapeada en memoria, ver src.vector_store), en float32 o
+        float16 según store_dtype. La Guía, con unas decenas de ejemplos, va
+        por defecto en NumPy.
+        
+        Con query_batch_ms, las consultas que llegan a la vez desde varios
+        hilos se embeben en un solo lote si coinciden en esa ventana (ver
+        BatchingEncoder); pensado para el servicio HTTP.
+        """
+        self.guia_path = guia_path
+        self.use_cendoj = use_cendoj
+        self.index_dir = Path(index_dir) if index_dir else None
+        self.embed_batch_size = embed_batch_size
+        self.result_cache = result_cache
+        self.latency_budget_s = latency_budget_s
+        self.guia_artifact = Path(guia_artifact) if guia_artifact else default_artifact_path(guia_path)
+        self.encoder_backend = encoder_backend
+        self.encoder_model_dir = encoder_model_dir
+        self.encoder_id = encoder_id(encoder_backend)
+        if query_mode not in QUERY_MODES or query_fusion not in QUERY_FUSIONS:
+            raise ValueError(f"query_mode debe ser {QUERY_MODES} y query_fusion {QUERY_FUSIONS}")
+        self.query_mode = query_mode
+        self.query_fusion = query_fusion
+        self.dense_weight = dense_weight
+        self.lexical_weight = lexical_weight
+        if guia_store not in STORES or cendoj_store not in STORES:
+            raise ValueError(f"Almacén de vectores desconocido (opciones: {', '.join(STORES)})")
+        self.stores = {COLECCION_GUIA: guia_store, COLECCION_CENDOJ: cendoj_store}
+        self.store_dtype = store_dtype
+        self.query_batch_ms = query_batch_ms
+        self.rules = SimplificationRules()
+        
+        if embedding_cache is None:
+            disk_path = str(self.index_dir / EMBEDDING_CACHE_FILE) if self.index_dir else None
+            embedding_cache = EmbeddingCache(self.encoder_id, disk_path=disk_path)
+        self.embedding_cache = embedding_cache
+        
+        # Encoder, índice y cliente LLM se cargan al primer uso (o con warmup)
+        self._encoder = None
+        self._client = None
+        self._rag_guia = None
+        self._rag_cendoj = None
+        self._lexico: Dict[str, BM25Index] = {}
+        self._cendoj_manifest: Optional[Dict] = None
+        self._index_listo = False
+        self._llm = llm
+        self._lock = threading.RLock()
+        
+        if warmup_llm:
+            threading.Thread(target=lambda: self.llm.warmup(prefix=self.prompt_prefix),
+                             daemon=True).start()
+    
+    def warmup(self, background: bool = False, encoder: bool = True,
+               llm: bool = True) -> Optional[threading.Thread]:
+        """
+        Cargar por adelantado el índice y, opcionalmente, el encoder y el
+        modelo del LLM (con el contexto de prompt_prefix ya calculado). Con
+        background=True se hace en un hilo y se devuelve el hilo; las
+        peticiones que lleguen antes esperan a lo que necesiten.
+        """
+        if background:
+            hilo = threading.Thread(target=self.warmup,
+                                    kwargs={'encoder': encoder, 'llm': llm}, daemon=True)
+            hilo.start()
+            return hilo
+        
+        self._ensure_index()
+        if encoder:
+            self.encoder
+        if llm:
+            self.llm.warmup(prefix=self.prompt_prefix)
+        return None
+    
+    @property
+    def encoder(self) -> "SentenceTransformer":
+        """Encoder de embeddings, cargado solo cuando hace falta"""
+        if self._encoder is None:
+            with self._lock:
+                if self._encoder is None:
+                    encoder = load_encoder(self.encoder_backend,
+                                           model_dir=self.encoder_model_dir)
+                    if self.query_batch_ms is not None:
+                        encoder = BatchingEncoder(encoder, max_wait_ms=self.query_batch_ms)
+                    self._encoder = encoder
+        return self._encoder
+    
+    @property
+    def llm(self):
+        """Cliente LLM compartido"""
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    from src.llm_handler import LLMHandler
+                    
+                    self._llm = LLMHandler()
+        return self._llm
+    
+    @property
+    def client(self):
+        self._ensure_index()
+        return self._client
+    
+    @property
+    def rag_guia(self):
+        """Colección de ejemplos de la Guía"""
+        self._ensure_index()
+        return self._rag_guia
+    
+    @property
+    def rag_cendoj(self):
+        """Colección de sentencias CENDOJ"""
+        self._ensure_index()
+        return self._rag_cendoj
+    
+    def _ensure_index(self):
+        """Abrir o construir el índice la primera vez que se necesita"""
+        if self._index_listo:
+            return
+        with self._lock:
+            if not self._index_listo:
+                self._load_index()
+                self._index_listo = True
+    
+    def _load_index(self):
+        """Abrir el índice persistente si su manifest coincide, o construirlo"""
         print("🚀 Inicializando Sistema RAG Dual...")
         
-        # Modelo de embeddings
-        self.encoder = SentenceTransformer(
-            'paraphrase-multilingual-MiniLM-L12-v2'
-        )
+        if self.index_dir:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
         
-        # ChromaDB client
-        self.client = chromadb.Client()
+        # ChromaDB client (solo si alguna colección lo usa)
+        if 'chroma' in self.stores.values():
+            import chromadb
+            
+            if self.index_dir:
+                self._client = chromadb.PersistentClient(path=str(self.index_dir))
+            else:
+                self._client = chromadb.Client()
         
-        # RAG 1: Guía
-        self.rag_guia = self.client.get_or_create_collection(
-            name="rag_guia_simplificacion",
-            metadata={"hnsw:space": "cosine"}
+        # Cada colección tiene su ciclo de vida: la Guía se reconstruye con
+        # su PDF; CENDOJ (ingesta masiva) solo si cambia cómo se embebe
+        manifest = self._build_manifest(self.guia_path)
+        guia_vigente = self._manifest_vigente(manifest)
+        cendoj = self._cendoj_manifest_vigente()
+        
+        if guia_vigente:
+            print(f"⚡ Índice persistente de la Guía vigente en {self.index_dir}")
+        else:
+            self._reset_collection(COLECCION_GUIA)
+        if cendoj is not None:
+            print("⚡ Colección CENDOJ vigente")
+        else:
+            self._reset_collection(COLECCION_CENDOJ)
+        
+        self._open_collections()
+        self._open_lexico()
+        
+        if not guia_vigente:
+            self._index_guia(self.guia_path)
+            self._write_manifest(manifest)
+        
+        if cendoj is None:
+            # Colección nueva: el mock sirve hasta la primera ingesta real
+            cendoj = {**self._cendoj_identity(), 'generacion': uuid.uuid4().hex,
+                      'mock': self._index_cendoj_mock()}
+            self._write_cendoj_manifest(cendoj)
+        self._cendoj_manifest = cendoj
+        
+        print("✅ Sistema RAG Dual listo")
+    
+    def _encode(self, texts, batch_size: Optional[int] = None):
+        """encoder.encode a través de la caché de embeddings"""
+        return self.embedding_cache.encode(
+            self.encoder, texts, batch_size=batch_size or self.embed_batch_size
         )
+    
+    def _open_collections(self):
+        """Abrir (o crear) las colecciones de ambos RAGs"""
+        # RAG 1: Guía
+        self._rag_guia = self._open_collection(COLECCION_GUIA)
         
         # RAG 2: CENDOJ
-        self.rag_cendoj = self.client.get_or_create_collection(
-            name="rag_cendoj_sentencias",
+        self._rag_cendoj = self._open_collection(COLECCION_CENDOJ)
+    
+    def _open_collection(self, nombre: str):
+        """Colección de Chroma o NumpyVectorStore, según self.stores"""
+        if self.stores[nombre] == 'numpy':
+            path = str(self.index_dir / nombre) if self.index_dir else None
+            return NumpyVectorStore(nombre, path=path, dtype=self.store_dtype)
+        
+        return self._client.get_or_create_collection(
+            name=nombre,
             metadata={"hnsw:space": "cosine"}
         )
+    
+    def _lexico_path(self, nombre: str) -> Optional[Path]:
+        return self.index_dir / BM25_FILE.format(nombre) if self.index_dir else None
+    
+    def _save_collection(self, nombre: str):
+        """
+        Guardar la colección NumPy y su índice BM25 (si el índice es
+        persistente); Chroma ya persiste cada escritura.
+        """
+        collection = {COLECCION_GUIA: self._rag_guia, COLECCION_CENDOJ: self._rag_cendoj}.get(nombre)
+        if isinstance(collection, NumpyVectorStore):
+            collection.flush()
+        lexico = self._lexico.get(nombre)
+        path = self._lexico_path(nombre)
+        if lexico is not None and path:
+            lexico.save(str(path))
+    
+    def _delete_rows(self, collection, ids: List[str]):
+        """Quitar filas de la colección y de su índice léxico"""
+        if not ids:
+            return
+        collection.delete(ids=ids)
+        lexico = self._lexico.get(collection.name)
+        if lexico is not None:
+            lexico.delete(ids)
+    
+    def _open_lexico(self):
+        """
+        Cargar los índices BM25 guardados; si faltan o son de otra versión,
+        se reconstruyen con los documentos de su colección.
+        """
+        for nombre, collection in ((COLECCION_GUIA, self._rag_guia),
+                                   (COLECCION_CENDOJ, self._rag_cendoj)):
+            path = self._lexico_path(nombre)
+            lexico = BM25Index.load(str(path)) if path and path.exists() else None
+            if lexico is None:
+                print(f"🔤 Reconstruyendo índice léxico de {nombre}...")
+                guardado = collection.get(include=['documents'])
+                lexico = BM25Index()
+                lexico.add(guardado['ids'], guardado['documents'])
+                if path:
+                    lexico.save(str(path))
+            self._lexico[nombre] = lexico
+    
+    def _build_manifest(self, guia_path: str) -> Dict:
+        """Manifest que identifica el contenido del índice"""
+        if not self.index_dir:
+            return {}
         
-        # Cargar datos
-        self._index_guia(guia_path)
+        return {
+            'guia_sha256': file_sha256(guia_path) if Path(guia_path).exists() else None,
+            'encoder': self.encoder_id,
+            'extraction_version': EXTRACTION_VERSION,
+            'artifact_version': ARTIFACT_VERSION,
+            'stores': {COLECCION_GUIA: self.stores[COLECCION_GUIA], 'dtype': self.store_dtype}
+        }
+    
+    def _manifest_vigente(self, manifest: Dict) -> bool:
+        """Comprobar si el índice en disco corresponde al manifest"""
+        if not self.index_dir:
+            return False
         
-        if use_cendoj:
-            self._index_cendoj_mock()  # Mock por ahora
+        manifest_path = self.index_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            return False
         
-        print("✅ Sistema RAG Dual listo")
+        try:
+            guardado = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        
+        # Los manifest anteriores incluían use_cendoj, que ahora es una opción por petición
+        guardado.pop('cendoj', None)
+        return guardado == manifest
+    
+    def _cendoj_identity(self) -> Dict:
+        """Lo que hace inservible la colección CENDOJ si cambia: cómo se embebe y se guarda"""
+        return {
+            'encoder': self.encoder_id,
+            'store': self.stores[COLECCION_CENDOJ],
+            'dtype': self.store_dtype
+        }
+    
+    def _cendoj_manifest_vigente(self) -> Optional[Dict]:
+        """
+        Manifest de la colección CENDOJ en disco si corresponde a la
+        configuración actual (con su generación y los ids del mock), o None.
+        """
+        if not self.index_dir:
+            return None
+        
+        identidad = self._cendoj_identity()
+        try:
+            guardado = json.loads((self.index_dir / CENDOJ_MANIFEST_FILE).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            guardado = self._adopt_legacy_cendoj(identidad)
+        except (OSError, ValueError):
+            return None
+        
+        if guardado is None or any(guardado.get(k) != v for k, v in identidad.items()):
+            return None
+        return guardado
+    
+    def _adopt_legacy_cendoj(self, identidad: Dict) -> Optional[Dict]:
+        """
+        Los índices anteriores tenían un único manifest para las dos
+        colecciones: si el encoder y el almacén coinciden, la ingesta CENDOJ
+        se conserva con un manifest propio.
+        """
+        try:
+            anterior = json.loads((self.index_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        
+        stores = anterior.get('stores', {})
+        if (anterior.get('encoder') != identidad['encoder']
+                or stores.get(COLECCION_CENDOJ) != identidad['store']
+                or stores.get('dtype') != identidad['dtype']):
+            return None
+        
+        # Ids del mock que se indexaba con cada reconstrucción
+        manifest = {**identidad, 'generacion': None, 'mock': ["cendoj_0", "cendoj_1"]}
+        self._write_cendoj_manifest(manifest)
+        return manifest
+    
+    def _write_cendoj_manifest(self, manifest: Dict):
+        if not self.index_dir:
+            return
+        
+        tmp = self.index_dir / (CENDOJ_MANIFEST_FILE + ".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, self.index_dir / CENDOJ_MANIFEST_FILE)
+    
+    @property
+    def cendoj_generation(self) -> Optional[str]:
+        """
+        Identificador de la colección CENDOJ actual: cambia cada vez que se
+        crea de nuevo, y el checkpoint de la ingesta lo guarda para no
+        reanudar sobre una colección distinta (None en índices anteriores).
+        """
+        self._ensure_index()
+        return self._cendoj_manifest['generacion']
     
+    def _drop_cendoj_mock(self):
+        """Quitar el mock de CENDOJ antes de la primera ingesta real"""
+        self._ensure_index()
+        with self._lock:
+            mock = self._cendoj_manifest.get('mock')
+            if not mock:
+                return
+            self._delete_rows(self._rag_cendoj, mock)
+            self._save_collection(COLECCION_CENDOJ)
+            self._cendoj_manifest = {**self._cendoj_manifest, 'mock': []}
+            self._write_cendoj_manifest(self._cendoj_manifest)
+    
+    def _reset_collection(self, nombre: str):
+        """Borrar una colección obsoleta con su manifest e índice léxico"""
+        if not self.index_dir:
+            return
+        
+        # Sin manifest la colección queda inválida hasta terminar de indexar
+        if nombre == COLECCION_GUIA:
+            (self.index_dir / MANIFEST_FILE).unlink(missing_ok=True)
+        else:
+            (self.index_dir / CENDOJ_MANIFEST_FILE).unlink(missing_ok=True)
+            # La ingesta se pierde con la colección: hay que repetirla (un
+            # checkpoint en otra ruta se invalida por la generación)
+            (self.index_dir / CENDOJ_CHECKPOINT_FILE).unlink(missing_ok=True)
+        
+        if self._client is not None:
+            try:
+                self._client.delete_collection(nombre)
+            except Exception:
+                pass
+        NumpyVectorStore.drop(str(self.index_dir / nombre))
+        self._lexico_path(nombre).unlink(missing_ok=True)
+    
+    def _write_manifest(self, manifest: Dict):
+        """Guardar el manifest tras indexar"""
+        if not self.index_dir:
+            return
+        
+        (self.index_dir / MANIFEST_FILE).write_text(
+            json.dumps(manifest, indent=2), encoding="utf-8"
+        )
+    
+    @timed('indexado_guia')
     def _index_guia(self, guia_path: str):
         """Indexar ejemplos de la Guía"""
         print("📚 Indexando Guía Oficial...")
         
-        ejemplos = self._extract_ejemplos_guia(guia_path)
+        ejemplos = self._load_ejemplos_guia(guia_path)
         
-        for i, ejemplo in enumerate(ejemplos):
-            embedding = self.encoder.encode(ejemplo['original'])
-            
-            self.rag_guia.add(
-                embeddings=[embedding.tolist()],
-                documents=[ejemplo['original']],
-                metadatas=[{
-                    'simplificado': ejemplo['simplificado'],
-                    'regla': ejemplo['regla']
-                }],
-                ids=[f"guia_{i}"]
-            )
+        self._bulk_index(
+            self._rag_guia,
+            ids=[ej['id'] for ej in ejemplos],
+            documents=[ej['original'] for ej in ejemplos],
+            metadatas=[{
+                'simplificado': ej['simplificado'],
+                'regla': ej['regla'],
+                'pagina': ej['pagina']
+            } for ej in ejemplos]
+        )
         
         print(f"✅ {len(ejemplos)} ejemplos indexados")
     
-    def _extract_ejemplos_guia(self, pdf_path: str) -> List[Dict]:
-        """Extraer ejemplos de la Guía"""
-        try:
-            with open(pdf_path, 'rb') as f:
-                pdf = PyPDF2.PdfReader(f)
-                texto = ""
-                for page in pdf.pages:
-                    texto += page.extract_text()
-            
-            # Pattern para ejemplos
-            pattern = r'Versión no recomendada:?\s*(.*?)\s*Versión alternativa:?\s*(.*?)(?=Versión|$)'
-            matches = re.findall(pattern, texto, re.DOTALL | re.IGNORECASE)
-            
-            ejemplos = []
-            for i, (orig, simp) in enumerate(matches):
-                ejemplos.append({
-                    'id': f'guia_{i}',
-                    'original': orig.strip()[:500],
-                    'simplificado': simp.strip()[:500],
-                    'regla': self._inferir_regla(orig, simp)
-                })
-            
-            return ejemplos
+    def _load_ejemplos_guia(self, guia_path: str) -> List[Dict]:
+        """
+        Ejemplos de la Guía desde el artefacto precompilado
+        (python -m src.guia_artifact). Si falta o no corresponde a la Guía,
+        se compila ahora; los errores no se ocultan.
+        """
+        if not artifact_vigente(self.guia_artifact, guia_path):
+            print(f"⚙️ Artefacto de ejemplos ausente u obsoleto, compilando {self.guia_artifact}...")
+            cache = PdfTextCache(str(self.index_dir / "pdf")) if self.index_dir else None
+            build_artifact(guia_path, str(self.guia_artifact), cache=cache)
         
-        except Exception as e:
-            print(f"⚠️ Error extrayendo Guía: {e}")
-            return self._get_mock_ejemplos()
+        return load_artifact(self.guia_artifact)
     
-    def _get_mock_ejemplos(self) -> List[Dict]:
-        """Ejemplos mock si falla la extracción"""
-        return [
-            {
-                'id': 'mock_1',
-                'original': 'VISTO el contenido de las actuaciones',
-                'simplificado': 'Visto el contenido de las actuaciones',
-                'regla': 'mayusculas'
-            },
-            {
-                'id': 'mock_2',
-                'original': 'de conformidad con lo establecido en el artículo 25.3',
-                'simplificado': 'según el artículo 25.3',
-                'regla': 'terminologia'
-            },
-            {
-                'id': 'mock_3',
-                'original': 'el demandante procede a solicitar',
-                'simplificado': 'el demandante solicita',
-                'regla': 'oraciones_cortas'
-            }
-        ]
-    
-    def _inferir_regla(self, orig: str, simp: str) -> str:
-        """Inferir regla aplicada"""
-        if orig.isupper() and not simp.isupper():
-            return 'mayusculas'
-        elif 'conformidad' in orig.lower():
-            return 'terminologia'
-        elif len(orig.split()) > len(simp.split()) * 1.3:
-            return 'oraciones_cortas'
-        return 'general'
-    
-    def _index_cendoj_mock(self):
-        """Indexar mock de CENDOJ"""
+    @timed('indexado_cendoj')
+    def _index_cendoj_mock(self) -> List[str]:
+        """Indexar mock de CENDOJ (devuelve sus ids)"""
         print("⚖️ Indexando mock CENDOJ...")
         
         ejemplos_mock = [
@@ -156,110 +591,760 @@ class DualRAGSystem:
             }
         ]
         
-        for i, ej in enumerate(ejemplos_mock):
-            embedding = self.encoder.encode(ej['texto'])
-            
-            self.rag_cendoj.add(
-                embeddings=[embedding.tolist()],
-                documents=[ej['texto']],
-                metadatas=ej['metadata'],
-                ids=[f"cendoj_{i}"]
-            )
+        ids = [f"cendoj_mock_{i}" for i in range(len(ejemplos_mock))]
+        self._bulk_index(
+            self._rag_cendoj,
+            ids=ids,
+            documents=[ej['texto'] for ej in ejemplos_mock],
+            metadatas=[ej['metadata'] for ej in ejemplos_mock]
+        )
         
         print(f"✅ {len(ejemplos_mock)} contextos CENDOJ indexados")
+        return ids
     
-    def retrieve_hybrid(self, query: str, top_k: int = 5) -> Dict:
-        """Búsqueda híbrida en ambos RAGs"""
-        query_embedding = self.encoder.encode(query)
+    def _bulk_index(self, collection, ids: List[str], documents: List[str],
+                    metadatas: List[Dict], batch_size: Optional[int] = None,
+                    save: bool = True) -> Dict:
+        """
+        Embeber todos los textos por lotes y hacer upsert en bloques grandes;
+        el índice léxico de la colección se actualiza a la vez. Guardar
+        reescribe la colección y recompila todo el vocabulario: en una
+        ingesta por lotes se pasa save=False y se guarda con _save_collection
+        cada cierto tiempo.
+        Devuelve filas, segundos y filas/s de cada fase.
+        """
+        if not documents:
+            return {'filas': 0, 'segundos': 0.0, 'filas_por_s': 0.0}
         
-        # Buscar en Guía
-        res_guia = self.rag_guia.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=min(top_k, 3)
-        )
+        batch_size = batch_size or self.embed_batch_size
+        
+        t0 = time.perf_counter()
+        embeddings = self._encode(documents, batch_size=batch_size)
+        t_encode = time.perf_counter() - t0
+        
+        # Chroma limita las filas por llamada
+        max_batch = min(UPSERT_BATCH_SIZE, getattr(self._client, 'max_batch_size', UPSERT_BATCH_SIZE))
+        
+        t1 = time.perf_counter()
+        for start in range(0, len(documents), max_batch):
+            end = start + max_batch
+            collection.upsert(
+                embeddings=embeddings[start:end].tolist(),
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+                ids=ids[start:end]
+            )
+        t_upsert = time.perf_counter() - t1
+        
+        t2 = time.perf_counter()
+        lexico = self._lexico.get(collection.name)
+        if lexico is not None:
+            lexico.add(ids, documents)
+        if save:
+            self._save_collection(collection.name)
+        t_lexico = time.perf_counter() - t2
         
-        # Buscar en CENDOJ
-        res_cendoj = self.rag_cendoj.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=min(top_k, 2)
+        record('indexado_encode', t_encode, t0, filas=len(documents))
+        record('indexado_upsert', t_upsert, t1, filas=len(documents))
+        record('indexado_lexico', t_lexico, t2, filas=len(documents))
+        
+        total = t_encode + t_upsert + t_lexico
+        stats = {
+            'filas': len(documents),
+            'segundos': total,
+            'filas_por_s': len(documents) / total if total else 0.0,
+            'encode_s': t_encode,
+            'upsert_s': t_upsert,
+            'lexico_s': t_lexico,
+            'encode_filas_por_s': len(documents) / t_encode if t_encode else 0.0,
+            'upsert_filas_por_s': len(documents) / t_upsert if t_upsert else 0.0
+        }
+        print(
+            f"   ⏱️ {stats['filas']} filas en {total:.2f}s "
+            f"({stats['filas_por_s']:.0f} filas/s; "
+            f"encode {stats['encode_filas_por_s']:.0f}/s, "
+            f"upsert {stats['upsert_filas_por_s']:.0f}/s)"
         )
+        return stats
+    
+    def retrieve_hybrid(self, query: str, top_k: Optional[int] = None, mode: Optional[str] = None,
+                        fusion: Optional[str] = None, use_cendoj: Optional[bool] = None,
+                        cendoj_k: int = CENDOJ_TOP_K) -> Dict:
+        """
+        Búsqueda híbrida en ambos RAGs: densa (embeddings) y léxica (BM25),
+        unidas por RRF con dense_weight y lexical_weight.
+        
+        El encoder solo ve los primeros ~128 tokens de cada texto. Con
+        textos largos (mode 'passages', o 'auto' por encima de
+        PASSAGE_CHARS) la consulta se divide en pasajes que se embeben en un
+        solo lote y se lanzan juntos en una única query por colección; los
+        resultados se fusionan por id (fusion 'max' o 'rrf'). BM25 usa el
+        texto completo.
+        
+        top_k es el número de ejemplos de la Guía (GUIA_TOP_K por defecto) y
+        cendoj_k el de contextos CENDOJ; use_cendoj decide por petición si se
+        consulta CENDOJ (por defecto, self.use_cendoj).
+        """
+        top_k = top_k or GUIA_TOP_K
+        use_cendoj = self.use_cendoj if use_cendoj is None else use_cendoj
+        with span('recuperacion'):
+            query_embeddings, fusion = self._query_embeddings(query, mode, fusion)
+            
+            return {
+                # Buscar en Guía
+                'guia': self._search(self.rag_guia, query, query_embeddings, top_k, fusion),
+                # Buscar en CENDOJ
+                'cendoj': (self._search(self.rag_cendoj, query, query_embeddings, cendoj_k, fusion)
+                           if use_cendoj else [])
+            }
+    
+    async def aretrieve_hybrid(self, query: str, top_k: Optional[int] = None,
+                               mode: Optional[str] = None, fusion: Optional[str] = None,
+                               use_cendoj: Optional[bool] = None,
+                               cendoj_k: int = CENDOJ_TOP_K) -> Dict:
+        """
+        Versión asíncrona de retrieve_hybrid: el encoder, la carga del índice
+        y Chroma (bloqueantes) van a un executor y las dos colecciones se
+        consultan a la vez.
+        """
+        top_k = top_k or GUIA_TOP_K
+        use_cendoj = self.use_cendoj if use_cendoj is None else use_cendoj
+        loop = asyncio.get_running_loop()
+        
+        with span('recuperacion'):
+            # En frío, rag_guia/rag_cendoj construyen o cargan el índice: se
+            # prepara en el executor (a la vez que el encoder) y no en el bucle
+            (query_embeddings, fusion), _ = await asyncio.gather(
+                loop.run_in_executor(None, bind(self._query_embeddings), query, mode, fusion),
+                loop.run_in_executor(None, bind(self._ensure_index))
+            )
+            
+            busquedas = [loop.run_in_executor(None, bind(self._search), self.rag_guia, query,
+                                              query_embeddings, top_k, fusion)]
+            if use_cendoj:
+                busquedas.append(loop.run_in_executor(None, bind(self._search), self.rag_cendoj,
+                                                      query, query_embeddings, cendoj_k, fusion))
+            resultados = await asyncio.gather(*busquedas)
         
         return {
-            'guia': self._format_results(res_guia),
-            'cendoj': self._format_results(res_cendoj)
+            'guia': resultados[0],
+            'cendoj': resultados[1] if use_cendoj else []
         }
     
-    def _format_results(self, results) -> List[Dict]:
-        """Formatear resultados"""
-        formatted = []
+    def _search(self, collection, query: str, query_embeddings, n_results: int,
+                fusion: str) -> List[Dict]:
+        """Búsqueda densa y léxica en una colección, unida por RRF"""
+        lexico = self._lexico.get(collection.name) if self.lexical_weight else None
+        if lexico is None:
+            with span('consulta_densa', coleccion=collection.name):
+                return self._fuse_results(self._query(collection, query_embeddings, n_results),
+                                          n_results, fusion)
         
-        if not results['ids'] or len(results['ids'][0]) == 0:
-            return formatted
+        candidatos = max(n_results, HYBRID_CANDIDATES)
+        with span('consulta_densa', coleccion=collection.name):
+            densos = self._fuse_results(self._query(collection, query_embeddings, candidatos),
+                                        candidatos, fusion)
+        with span('consulta_lexica', coleccion=collection.name):
+            lexicos = lexico.search(query, candidatos)
         
-        for i in range(len(results['ids'][0])):
-            formatted.append({
-                'documento': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'similarity': 1 - results['distances'][0][i]
-            })
+        return self._hybrid_fusion(collection, densos, lexicos, query_embeddings, n_results)
+    
+    def _hybrid_fusion(self, collection, densos: List[Dict], lexicos: List[Tuple[str, float]],
+                       query_embeddings, n_results: int) -> List[Dict]:
+        """
+        RRF ponderado de las dos listas. Los documentos que solo encontró
+        BM25 se leen de la colección para tener su texto, metadatos y
+        similitud con la consulta.
+        """
+        puntuaciones = {}
+        for posicion, resultado in enumerate(densos):
+            puntuaciones[resultado['id']] = self.dense_weight / (RRF_K + posicion + 1)
+        for posicion, (doc_id, _) in enumerate(lexicos):
+            puntuaciones[doc_id] = puntuaciones.get(doc_id, 0.0) + self.lexical_weight / (RRF_K + posicion + 1)
         
-        return formatted
+        mejores = sorted(puntuaciones, key=puntuaciones.get, reverse=True)[:n_results]
         
-    def build_prompt(self, user_text: str) -> tuple:
-        results = self.retrieve_hybrid(user_text)
+        por_id = {r['id']: r for r in densos}
+        faltan = [doc_id for doc_id in mejores if doc_id not in por_id]
+        if faltan:
+            extra = collection.get(ids=faltan, include=['documents', 'metadatas', 'embeddings'])
+            embeddings = np.asarray(extra['embeddings'], dtype=np.float32)
+            consulta = np.asarray(query_embeddings, dtype=np.float32)
+            similitudes = (embeddings @ consulta.T) / (
+                np.linalg.norm(embeddings, axis=1, keepdims=True) * np.linalg.norm(consulta, axis=1)
+            )
+            for i, doc_id in enumerate(extra['ids']):
+                por_id[doc_id] = {
+                    'id': doc_id,
+                    'documento': extra['documents'][i],
+                    'metadata': extra['metadatas'][i],
+                    'similarity': float(similitudes[i].max())
+                }
         
-        prompt = f"""Eres experto en simplificar documentos judiciales.
-
+        return [
+            {**por_id[doc_id], 'score': puntuaciones[doc_id]}
+            for doc_id in mejores if doc_id in por_id
+        ]
+    
+    def _query_embeddings(self, query: str, mode: Optional[str],
+                          fusion: Optional[str]) -> Tuple:
+        """Embeddings de la consulta (uno o uno por pasaje) y fusión a aplicar"""
+        mode = mode or self.query_mode
+        fusion = fusion or self.query_fusion
+        if mode not in QUERY_MODES or fusion not in QUERY_FUSIONS:
+            raise ValueError(f"mode debe ser {QUERY_MODES} y fusion {QUERY_FUSIONS}")
+        
+        pasajes = [query]
+        if mode == 'passages' or (mode == 'auto' and len(query) > PASSAGE_CHARS):
+            pasajes = query_passages(query) or [query]
+        
+        with span('encode', textos=len(pasajes)):
+            return self._encode(pasajes), fusion
+    
+    def _query(self, collection, query_embeddings, n_results: int):
+        """Consulta de una colección con los embeddings ya calculados (una fila por vector)"""
+        return collection.query(
+            query_embeddings=query_embeddings.tolist(),
+            n_results=n_results
+        )
+    
+    def _fuse_results(self, results, n_results: int, fusion: str) -> List[Dict]:
+        """
+        Unir los resultados de todos los vectores de consulta por id.
+        'max' ordena por la mejor similitud de cada documento; 'rrf' suma
+        1 / (RRF_K + posición) en cada lista, y premia los documentos que
+        aparecen para muchos pasajes. Con un solo vector ambas conservan el
+        orden de Chroma.
+        """
+        fusionados = {}
+        
+        for fila in range(len(results['ids'] or [])):
+            for posicion, doc_id in enumerate(results['ids'][fila]):
+                similitud = 1 - results['distances'][fila][posicion]
+                puntuacion = similitud if fusion == 'max' else 1 / (RRF_K + posicion + 1)
+                
+                actual = fusionados.get(doc_id)
+                if actual is None:
+                    fusionados[doc_id] = {
+                        'id': doc_id,
+                        'documento': results['documents'][fila][posicion],
+                        'metadata': results['metadatas'][fila][posicion],
+                        'similarity': similitud,
+                        'score': puntuacion
+                    }
+                    continue
+                
+                actual['similarity'] = max(actual['similarity'], similitud)
+                actual['score'] = (max(actual['score'], puntuacion) if fusion == 'max'
+                                   else actual['score'] + puntuacion)
+        
+        ordenados = sorted(fusionados.values(), key=lambda r: r['score'], reverse=True)
+        return ordenados[:n_results]
+    
+    def build_prompt(self, user_text: str, **busqueda) -> tuple:
+        results = self.retrieve_hybrid(user_text, **busqueda)
+        return self._compose_prompt(user_text, results), results
+    
+    async def abuild_prompt(self, user_text: str, **busqueda) -> tuple:
+        results = await self.aretrieve_hybrid(user_text, **busqueda)
+        return self._compose_prompt(user_text, results), results
+    
+    def _build_suffix(self, user_text: str, **busqueda) -> tuple:
+        """Parte variable del prompt (sin prompt_prefix) y resultados RAG"""
+        results = self.retrieve_hybrid(user_text, **busqueda)
+        return self._prompt_suffix(user_text, results), results
+    
+    async def _abuild_suffix(self, user_text: str, **busqueda) -> tuple:
+        results = await self.aretrieve_hybrid(user_text, **busqueda)
+        return self._prompt_suffix(user_text, results), results
+    
+    def _compose_prompt(self, user_text: str, results: Dict) -> str:
+        return self.prompt_prefix + self._prompt_suffix(user_text, results)
+    
+    @property
+    def prompt_prefix(self) -> str:
+        """
+        Parte fija del prompt (rol, reglas e instrucciones), idéntica en
+        todas las peticiones: el LLM reutiliza su contexto precalculado.
+        """
+        return f"""Eres experto en simplificar documentos judiciales.
+    
     ════════════ Reglas resumidas oficiales ════════════
-
-        {REGLAS_SIMPLIFICADAS}
-
-    ════════════ Ejemplos de la Guía Oficial ════════════
-
+        
+        {load_reglas_simplificadas()}
+    
+    INSTRUCCIONES:
+    1. Aplica las reglas oficiales mostradas arriba
+    2. Sigue los patrones de los ejemplos de la Guía
+    3. Mantén el significado jurídico exacto
+    4. Usa lenguaje claro y accesible
+    
+    """
+    
+    @timed('prompt')
+    def _prompt_suffix(self, user_text: str, results: Dict) -> str:
+        """Parte variable del prompt: ejemplos, contextos y texto"""
+        return self._render_suffix(user_text, results)
+    
+    @staticmethod
+    def _render_suffix(user_text: str, results: Dict) -> str:
+        """Plantilla de _prompt_suffix, sin instrumentar (prompt_version la usa en cada clave de caché)"""
+        prompt = f"""════════════ Ejemplos de la Guía Oficial ════════════
+    
     """
         for i, ej in enumerate(results['guia'], 1):
             prompt += f"""Ejemplo {i}:
     ❌ Original: {ej['documento']}
     ✅ Simplificado: {ej['metadata'].get('simplificado', 'N/A')}
-
+    
     """
-
+        
         prompt += f"""
     ════════════ Contextos de Sentencias CENDOJ ════════════
-
+    
     """
         for i, ctx in enumerate(results['cendoj'], 1):
             prompt += f"""Contexto {i}: {ctx['documento'][:200]}...
-
+    
     """
-
+        
         prompt += f"""
     ════════════ TEXTO A SIMPLIFICAR ════════════
-
+        
         {user_text}
-
-    INSTRUCCIONES:
-    1. Aplica las reglas oficiales mostradas arriba
-    2. Sigue los patrones de los ejemplos
-    3. Mantén el significado jurídico exacto
-    4. Usa lenguaje claro y accesible
-
+    
     VERSIÓN SIMPLIFICADA:
     """
-
-        return prompt, results
-
-    def simplificar(self, texto: str) -> Dict:
-        """Simplificar documento"""
-        from src.llm_handler import LLMHandler
+        
+        return prompt
+    
+    @traced
+    def simplificar(self, texto: str, long_mode: Optional[bool] = None,
+                    max_workers: int = LONG_DOC_WORKERS,
+                    on_token: Optional[Callable[[str], None]] = None,
+                    use_cache: bool = True,
+                    deadline_s: Optional[float] = None,
+                    on_rules: Optional[Callable[[str], None]] = None,
+                    top_k: Optional[int] = None,
+                    use_cendoj: Optional[bool] = None) -> Dict:
+        """
+        Simplificar documento.
+        Los documentos largos (o con long_mode=True) se simplifican por secciones.
+        Si se pasa on_token, recibe cada fragmento de texto según se genera.
+        Con use_cache=False se ignora la caché de resultados.
+        
+        La salida de reglas se calcula antes que nada (on_rules la recibe al
+        momento). deadline_s (o latency_budget_s) limita la espera al LLM; el
+        campo 'nivel' indica qué produjo la respuesta: cache, llm o reglas.
+        
+        top_k y use_cendoj se aplican a la recuperación de esta petición
+        (ver retrieve_hybrid).
+        
+        resultado['traza'] tiene los tiempos por etapa (encoder, consultas,
+        prompt, prefill y decode del LLM...) y los contadores de la petición
+        (tokens, aciertos de caché); ver src.instrumentation.
+        """
+        if long_mode is None:
+            long_mode = len(texto) > LONG_DOC_CHARS
+        if long_mode:
+            return self.simplificar_largo(texto, max_workers=max_workers, on_token=on_token,
+                                          use_cache=use_cache, deadline_s=deadline_s,
+                                          on_rules=on_rules, top_k=top_k, use_cendoj=use_cendoj)
+        
+        inicio = time.perf_counter()
+        deadline = self._deadline(inicio, deadline_s)
+        
+        # Salida determinista disponible desde el principio
+        reglas = self.rules.apply_all_rules(texto)
+        if on_rules:
+            on_rules(reglas)
         
         # Construir prompt
-        prompt, results = self.build_prompt(texto)
+        prompt, results = self._build_suffix(texto, top_k=top_k, use_cendoj=use_cendoj)
         
         # Generar con LLM
-        llm = LLMHandler()
-        simplificado = llm.generate(prompt)
+        stats = {}
+        inicio_llm = time.perf_counter()
+        simplificado = self._generate_cached(texto, prompt, results, stats, on_token, use_cache,
+                                             deadline=deadline, fallback_output=reglas)
+        
+        primer_token_s = inicio_llm - inicio + stats.get('primer_token_s', 0.0)
+        resultado = self._resultado(texto, simplificado, results, inicio, primer_token_s)
+        resultado.update(self._nivel(stats))
+        resultado['tokens'] = self._tokens(stats)
+        resultado['simplificado_reglas'] = reglas
+        return resultado
+    
+    @traced
+    def simplificar_reglas(self, texto: str) -> Dict:
+        """Solo reglas: sin índice, encoder ni LLM"""
+        inicio = time.perf_counter()
+        reglas = self.rules.apply_all_rules(texto)
+        
+        resultado = self._resultado(texto, reglas, {'guia': [], 'cendoj': []}, inicio, None)
+        resultado.update({'nivel': 'reglas', 'cache': False, 'motivo': 'solo_reglas',
+                          'simplificado_reglas': reglas, 'tokens': self._tokens({})})
+        return resultado
+    
+    @traced
+    async def asimplificar(self, texto: str, long_mode: Optional[bool] = None,
+                           max_workers: int = LONG_DOC_WORKERS,
+                           on_token: Optional[Callable[[str], None]] = None,
+                           use_cache: bool = True,
+                           deadline_s: Optional[float] = None,
+                           on_rules: Optional[Callable[[str], None]] = None,
+                           top_k: Optional[int] = None,
+                           use_cendoj: Optional[bool] = None) -> Dict:
+        """
+        Versión asíncrona de simplificar: recuperación concurrente y cliente
+        asíncrono de Ollama, sin bloquear el event loop.
+        """
+        if long_mode is None:
+            long_mode = len(texto) > LONG_DOC_CHARS
+        if long_mode:
+            return await self.asimplificar_largo(texto, max_workers=max_workers, on_token=on_token,
+                                                 use_cache=use_cache, deadline_s=deadline_s,
+                                                 on_rules=on_rules, top_k=top_k,
+                                                 use_cendoj=use_cendoj)
         
+        inicio = time.perf_counter()
+        deadline = self._deadline(inicio, deadline_s)
+        
+        reglas = self.rules.apply_all_rules(texto)
+        if on_rules:
+            on_rules(reglas)
+        
+        prompt, results = await self._abuild_suffix(texto, top_k=top_k, use_cendoj=use_cendoj)
+        
+        stats = {}
+        inicio_llm = time.perf_counter()
+        simplificado = await self._agenerate_cached(texto, prompt, results, stats, on_token, use_cache,
+                                                    deadline=deadline, fallback_output=reglas)
+        
+        primer_token_s = inicio_llm - inicio + stats.get('primer_token_s', 0.0)
+        resultado = self._resultado(texto, simplificado, results, inicio, primer_token_s)
+        resultado.update(self._nivel(stats))
+        resultado['tokens'] = self._tokens(stats)
+        resultado['simplificado_reglas'] = reglas
+        return resultado
+    
+    def _deadline(self, inicio: float, deadline_s: Optional[float]) -> Optional[float]:
+        """Instante (perf_counter) en que vence el plazo de la petición"""
+        presupuesto = deadline_s if deadline_s is not None else self.latency_budget_s
+        return inicio + presupuesto if presupuesto else None
+    
+    @staticmethod
+    def _nivel(stats: Dict) -> Dict:
+        """Qué produjo la respuesta y, si fueron las reglas, por qué"""
+        if stats.get('cache'):
+            return {'nivel': 'cache', 'cache': True, 'motivo': None}
+        if stats.get('fallback'):
+            return {'nivel': 'reglas', 'cache': False, 'motivo': stats.get('motivo')}
+        return {'nivel': 'llm', 'cache': False, 'motivo': None}
+    
+    @staticmethod
+    def _tokens(stats: Dict) -> Dict:
+        """Tokens de prompt evaluados, prefill ahorrado por el prefijo precalculado y tokens generados"""
+        return {'prompt': stats.get('prompt_tokens', 0),
+                'prefill_ahorrado': stats.get('prefill_ahorrado', 0),
+                'completion': stats.get('completion_tokens', 0)}
+    
+    @property
+    def prompt_version(self) -> str:
+        """Hash de la plantilla del prompt con las reglas incluidas"""
+        plantilla = self.prompt_prefix + self._render_suffix("", {'guia': [], 'cendoj': []})
+        return hashlib.sha256(plantilla.encode('utf-8')).hexdigest()[:16]
+    
+    def _cache_key(self, texto: str, results: Dict) -> str:
+        ids = [item.get('id', '') for fuente in ('guia', 'cendoj') for item in results[fuente]]
+        return self.result_cache.make_key(texto, self.llm.model, self.prompt_version, ids)
+    
+    def _generate_cached(self, texto: str, prompt: str, results: Dict, stats: Dict,
+                         on_token: Optional[Callable[[str], None]] = None,
+                         use_cache: bool = True, deadline: Optional[float] = None,
+                         fallback_output: Optional[str] = None) -> str:
+        """Generar con LLM pasando antes por la caché de resultados"""
+        clave = None
+        if self.result_cache is not None and use_cache:
+            clave = self._cache_key(texto, results)
+            guardado = self.result_cache.get(clave)
+            if guardado is not None:
+                stats['cache'] = True
+                if on_token:
+                    on_token(guardado['simplificado'])
+                return guardado['simplificado']
+        
+        partes = []
+        for token in self.llm.generate_stream(prompt, stats=stats, deadline=deadline,
+                                              fallback_output=fallback_output,
+                                              prefix=self.prompt_prefix):
+            partes.append(token)
+            if on_token:
+                on_token(token)
+        
+        return self._finish_generation(clave, "".join(partes), stats, fallback_output)
+    
+    async def _agenerate_cached(self, texto: str, prompt: str, results: Dict, stats: Dict,
+                                on_token: Optional[Callable[[str], None]] = None,
+                                use_cache: bool = True, deadline: Optional[float] = None,
+                                fallback_output: Optional[str] = None) -> str:
+        """Versión asíncrona de _generate_cached"""
+        clave = None
+        if self.result_cache is not None and use_cache:
+            clave = self._cache_key(texto, results)
+            guardado = self.result_cache.get(clave)
+            if guardado is not None:
+                stats['cache'] = True
+                if on_token:
+                    on_token(guardado['simplificado'])
+                return guardado['simplificado']
+        
+        partes = []
+        async for token in self.llm.agenerate_stream(prompt, stats=stats, deadline=deadline,
+                                                     fallback_output=fallback_output,
+                                                     prefix=self.prompt_prefix):
+            partes.append(token)
+            if on_token:
+                on_token(token)
+        
+        return self._finish_generation(clave, "".join(partes), stats, fallback_output)
+    
+    def _finish_generation(self, clave: Optional[str], simplificado: str, stats: Dict,
+                           fallback_output: Optional[str]) -> str:
+        """Guardar en caché las respuestas completas; las cortadas pasan a reglas"""
+        if stats.get('incompleto') and fallback_output is not None:
+            stats['fallback'] = True
+            return fallback_output
+        
+        if clave and not stats.get('fallback') and not stats.get('incompleto'):
+            self.result_cache.put(clave, {'simplificado': simplificado})
+        
+        return simplificado
+    
+    @traced
+    def simplificar_largo(self, texto: str, max_workers: int = LONG_DOC_WORKERS,
+                          on_token: Optional[Callable[[str], None]] = None,
+                          use_cache: bool = True,
+                          deadline_s: Optional[float] = None,
+                          on_rules: Optional[Callable[[str], None]] = None,
+                          top_k: Optional[int] = None,
+                          use_cendoj: Optional[bool] = None) -> Dict:
+        """
+        Map-reduce por secciones: cada sección recupera sus ejemplos y se
+        simplifica en paralelo (como mucho max_workers llamadas al LLM a la
+        vez); el resultado se une en el orden original. Para que Ollama
+        atienda las llamadas en paralelo hay que arrancarlo con
+        OLLAMA_NUM_PARALLEL >= max_workers.
+        Con on_token, cada sección se emite en orden al terminar. La caché
+        de resultados y el fallback a reglas trabajan por sección; el plazo
+        es común a todo el documento.
+        """
+        inicio = time.perf_counter()
+        deadline = self._deadline(inicio, deadline_s)
+        
+        reglas = self.rules.apply_all_rules(texto)
+        if on_rules:
+            on_rules(reglas)
+        
+        secciones = split_sections(texto)
+        print(f"✂️ Documento largo: {len(secciones)} secciones, {max_workers} en paralelo")
+        
+        simplificadas, primer_token_s = self._simplificar_secciones(
+            secciones, inicio, deadline, max_workers, on_token, use_cache,
+            {'top_k': top_k, 'use_cendoj': use_cendoj}
+        )
+        return self._resultado_largo(texto, simplificadas, inicio, primer_token_s, reglas)
+    
+    @traced
+    def simplificar_paginas(self, paginas: Iterable[str], max_workers: int = LONG_DOC_WORKERS,
+                            on_token: Optional[Callable[[str], None]] = None,
+                            use_cache: bool = True,
+                            deadline_s: Optional[float] = None,
+                            on_rules: Optional[Callable[[str], None]] = None,
+                            top_k: Optional[int] = None,
+                            use_cendoj: Optional[bool] = None) -> Dict:
+        """
+        Simplificar un documento que llega por páginas (pdf_extraction.iter_pages).
+        Si supera LONG_DOC_CHARS, cada sección se simplifica en cuanto está
+        completa, mientras se siguen leyendo las páginas siguientes; on_rules
+        se llama al terminar la lectura. Si no, equivale a simplificar().
+        """
+        inicio = time.perf_counter()
+        paginas = iter(paginas)
+        leidas = []
+        
+        for pagina in paginas:
+            leidas.append(pagina)
+            if sum(len(p) for p in leidas) > LONG_DOC_CHARS:
+                break
+        else:
+            return self.simplificar("".join(leidas), long_mode=False, on_token=on_token,
+                                    use_cache=use_cache, deadline_s=deadline_s, on_rules=on_rules,
+                                    top_k=top_k, use_cendoj=use_cendoj)
+        
+        deadline = self._deadline(inicio, deadline_s)
+        
+        def leer():
+            yield from leidas
+            for pagina in paginas:
+                leidas.append(pagina)
+                yield pagina
+        
+        print(f"✂️ Documento largo por páginas: {max_workers} secciones en paralelo")
+        
+        reglas = []
+        
+        def secciones():
+            yield from iter_sections(leer())
+            # Lectura terminada: ya hay texto completo para la salida de reglas
+            reglas.append(self.rules.apply_all_rules("".join(leidas)))
+            if on_rules:
+                on_rules(reglas[0])
+        
+        simplificadas, primer_token_s = self._simplificar_secciones(
+            secciones(), inicio, deadline, max_workers, on_token, use_cache,
+            {'top_k': top_k, 'use_cendoj': use_cendoj}
+        )
+        return self._resultado_largo("".join(leidas), simplificadas, inicio, primer_token_s,
+                                     reglas[0])
+    
+    def _simplificar_secciones(self, secciones: Iterable[Dict], inicio: float,
+                               deadline: Optional[float], max_workers: int,
+                               on_token: Optional[Callable[[str], None]],
+                               use_cache: bool,
+                               busqueda: Dict) -> Tuple[List[Dict], Optional[float]]:
+        """
+        Simplificar las secciones en paralelo según van llegando del iterable;
+        se emiten en el orden original en cuanto están terminadas. busqueda
+        son las opciones de retrieve_hybrid de la petición.
+        """
+        primer_token_s = None
+        simplificadas = []
+        pendientes = deque()
+        
+        def emitir(esperar: bool):
+            nonlocal primer_token_s
+            while pendientes and (esperar or pendientes[0].done()):
+                sec = pendientes.popleft().result()
+                if primer_token_s is None:
+                    primer_token_s = time.perf_counter() - inicio
+                self._emitir_seccion(sec, simplificadas, on_token)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            try:
+                for seccion in secciones:
+                    pendientes.append(pool.submit(bind(self._simplificar_seccion), seccion,
+                                                  deadline, use_cache, busqueda))
+                    emitir(esperar=False)
+                emitir(esperar=True)
+            except BaseException:
+                # Cancelado desde on_token (p. ej. un trabajo de src.jobs): no
+                # esperar a las secciones que aún no han empezado
+                for futuro in pendientes:
+                    futuro.cancel()
+                raise
+        
+        return simplificadas, primer_token_s
+    
+    def _simplificar_seccion(self, seccion: Dict, deadline: Optional[float],
+                             use_cache: bool, busqueda: Dict) -> Dict:
+        """Recuperar ejemplos y simplificar una sección"""
+        inicio = time.perf_counter()
+        
+        if not seccion['texto'].strip():
+            return self._seccion_vacia(seccion)
+        
+        reglas_seccion = self.rules.apply_all_rules(seccion['texto'])
+        prompt, results = self._build_suffix(seccion['texto'], **busqueda)
+        stats = {}
+        simplificado = self._generate_cached(seccion['texto'], prompt, results, stats,
+                                             use_cache=use_cache, deadline=deadline,
+                                             fallback_output=reglas_seccion)
+        return {
+            **seccion,
+            **self._nivel(stats),
+            'tokens': self._tokens(stats),
+            'simplificado': simplificado,
+            'resultados_rag': results,
+            'segundos': time.perf_counter() - inicio
+        }
+    
+    @traced
+    async def asimplificar_largo(self, texto: str, max_workers: int = LONG_DOC_WORKERS,
+                                 on_token: Optional[Callable[[str], None]] = None,
+                                 use_cache: bool = True,
+                                 deadline_s: Optional[float] = None,
+                                 on_rules: Optional[Callable[[str], None]] = None,
+                                 top_k: Optional[int] = None,
+                                 use_cendoj: Optional[bool] = None) -> Dict:
+        """Versión asíncrona de simplificar_largo (semáforo en lugar de pool)"""
+        inicio = time.perf_counter()
+        deadline = self._deadline(inicio, deadline_s)
+        primer_token_s = None
+        
+        reglas = self.rules.apply_all_rules(texto)
+        if on_rules:
+            on_rules(reglas)
+        
+        secciones = split_sections(texto)
+        semaforo = asyncio.Semaphore(max_workers)
+        
+        async def simplificar_seccion(seccion: Dict) -> Dict:
+            async with semaforo:
+                inicio = time.perf_counter()
+                
+                if not seccion['texto'].strip():
+                    return self._seccion_vacia(seccion)
+                
+                reglas_seccion = self.rules.apply_all_rules(seccion['texto'])
+                prompt, results = await self._abuild_suffix(seccion['texto'], top_k=top_k,
+                                                            use_cendoj=use_cendoj)
+                stats = {}
+                simplificado = await self._agenerate_cached(seccion['texto'], prompt, results, stats,
+                                                            use_cache=use_cache, deadline=deadline,
+                                                            fallback_output=reglas_seccion)
+                return {
+                    **seccion,
+                    **self._nivel(stats),
+                    'tokens': self._tokens(stats),
+                    'simplificado': simplificado,
+                    'resultados_rag': results,
+                    'segundos': time.perf_counter() - inicio
+                }
+        
+        tareas = [asyncio.ensure_future(simplificar_seccion(sec)) for sec in secciones]
+        
+        simplificadas = []
+        try:
+            for tarea in tareas:
+                sec = await tarea
+                if primer_token_s is None:
+                    primer_token_s = time.perf_counter() - inicio
+                self._emitir_seccion(sec, simplificadas, on_token)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+        
+        return self._resultado_largo(texto, simplificadas, inicio, primer_token_s, reglas)
+    
+    @staticmethod
+    def _seccion_vacia(seccion: Dict) -> Dict:
+        """Sección sin cuerpo (solo título): no pasa por el LLM"""
+        return {**seccion, 'simplificado': '', 'resultados_rag': {'guia': [], 'cendoj': []},
+                'segundos': 0.0, 'nivel': None, 'cache': False, 'motivo': None,
+                'tokens': DualRAGSystem._tokens({})}
+    
+    def _emitir_seccion(self, sec: Dict, simplificadas: List[Dict],
+                        on_token: Optional[Callable[[str], None]]):
+        """Añadir una sección terminada y emitirla en orden"""
+        if on_token:
+            bloque = join_sections([{'titulo': sec['titulo'], 'texto': sec['simplificado']}])
+            on_token(bloque if not simplificadas else "\n\n" + bloque)
+        simplificadas.append(sec)
+    
+    def _resultado(self, texto: str, simplificado: str, results: Dict,
+                   inicio: float, primer_token_s: Optional[float]) -> Dict:
+        """Diccionario de respuesta de simplificar"""
         return {
             'original': texto,
             'simplificado': simplificado,
@@ -267,5 +1352,53 @@ class DualRAGSystem:
                 'ejemplos_guia': len(results['guia']),
                 'contextos_cendoj': len(results['cendoj'])
             },
-            'resultados_rag': results
+            'resultados_rag': results,
+            'tiempos': {
+                'primer_token_s': primer_token_s or 0.0,
+                'total_s': time.perf_counter() - inicio
+            }
+        }
+    
+    def _resultado_largo(self, texto: str, simplificadas: List[Dict],
+                         inicio: float, primer_token_s: Optional[float], reglas: str) -> Dict:
+        """Unir las secciones y sus fuentes en la respuesta de simplificar"""
+        simplificado = join_sections([
+            {'titulo': sec['titulo'], 'texto': sec['simplificado']}
+            for sec in simplificadas
+        ])
+        
+        # Fuentes sin duplicados entre secciones
+        results = {'guia': [], 'cendoj': []}
+        for fuente in results:
+            vistos = set()
+            for sec in simplificadas:
+                for item in sec['resultados_rag'][fuente]:
+                    if item['documento'] not in vistos:
+                        vistos.add(item['documento'])
+                        results[fuente].append(item)
+        
+        resultado = self._resultado(texto, simplificado, results, inicio, primer_token_s)
+        resultado['secciones'] = [
+            {
+                'titulo': sec['titulo'],
+                'original': sec['texto'],
+                'simplificado': sec['simplificado'],
+                'segundos': sec['segundos'],
+                'nivel': sec['nivel'],
+                'motivo': sec['motivo']
+            }
+            for sec in simplificadas
+        ]
+        
+        # Nivel del documento: el de todas sus secciones o 'mixto'
+        niveles = {sec['nivel'] for sec in simplificadas if sec['nivel']}
+        resultado['nivel'] = niveles.pop() if len(niveles) == 1 else ('mixto' if niveles else 'reglas')
+        resultado['cache'] = resultado['nivel'] == 'cache'
+        motivos = {sec['motivo'] for sec in simplificadas if sec['motivo']}
+        resultado['motivo'] = ", ".join(sorted(motivos)) or None
+        resultado['simplificado_reglas'] = reglas
+        resultado['tokens'] = {
+            clave: sum(sec['tokens'][clave] for sec in simplificadas)
+            for clave in ('prompt', 'prefill_ahorrado', 'completion')
         }
+        return resultado
@@ -0,0 +1,160 @@
+"""
+Caché de embeddings
+LRU en memoria acotada por bytes, con almacén opcional en disco (SQLite)
+"""
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from src.instrumentation import count
+
+# Memoria máxima por defecto (~40k embeddings de 384 float32)
+MAX_BYTES = 64 * 1024 * 1024
+
+
+class EmbeddingCache:
+    """
+    Embeddings por hash de (encoder, texto). Se usa como envoltorio de
+    encoder.encode tanto en consultas como al indexar, de modo que un texto
+    ya visto no se vuelve a embeber.
+    """
+
+    def __init__(self, encoder_name: str, max_bytes: int = MAX_BYTES,
+                 disk_path: Optional[str] = None):
+        self.encoder_name = encoder_name
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._memoria: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._conn = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(disk_path, check_same_thread=False, timeout=30)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "clave TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _key(self, texto: str) -> str:
+        return hashlib.sha256(f"{self.encoder_name}\x1f{texto}".encode('utf-8')).hexdigest()
+
+    def _remember(self, clave: str, vector: np.ndarray):
+        """Guardar en memoria expulsando los menos usados"""
+        if clave in self._memoria:
+            self._memoria.move_to_end(clave)
+            return
+
+        self._memoria[clave] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes and self._memoria:
+            _, expulsado = self._memoria.popitem(last=False)
+            self._bytes -= expulsado.nbytes
+
+    def _lookup(self, claves: List[str]) -> Dict[str, np.ndarray]:
+        encontrados = {}
+        faltan = []
+
+        with self._lock:
+            for clave in claves:
+                vector = self._memoria.get(clave)
+                if vector is not None:
+                    self._memoria.move_to_end(clave)
+                    encontrados[clave] = vector
+                else:
+                    faltan.append(clave)
+
+            if self._conn is not None and faltan:
+                # Consultas por bloques para no pasar el límite de parámetros de SQLite
+                for start in range(0, len(faltan), 500):
+                    bloque = faltan[start:start + 500]
+                    marcas = ",".join("?" * len(bloque))
+                    for clave, dim, blob in self._conn.execute(
+                        f"SELECT clave, dim, vector FROM embeddings WHERE clave IN ({marcas})", bloque
+                    ):
+                        vector = np.frombuffer(blob, dtype=np.float32).reshape(dim)
+                        encontrados[clave] = vector
+                        self._remember(clave, vector)
+
+        return encontrados
+
+    def _store(self, nuevos: Dict[str, np.ndarray]):
+        with self._lock:
+            for clave, vector in nuevos.items():
+                self._remember(clave, vector)
+
+            if self._conn is not None and nuevos:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (clave, dim, vector) VALUES (?, ?, ?)",
+                    [(clave, vector.shape[0], vector.tobytes()) for clave, vector in nuevos.items()]
+                )
+                self._conn.commit()
+
+    def encode(self, encoder, texts: Union[str, List[str]], batch_size: int = 32) -> np.ndarray:
+        """
+        Igual que encoder.encode: un texto → vector, lista → matriz.
+        Solo se embeben los textos que no están en caché, en un único lote.
+        """
+        if isinstance(texts, str):
+            return self.encode(encoder, [texts], batch_size=batch_size)[0]
+
+        claves = [self._key(t) for t in texts]
+        encontrados = self._lookup(claves)
+
+        # Textos pendientes sin duplicados
+        pendientes = {}
+        for clave, texto in zip(claves, texts):
+            if clave not in encontrados and clave not in pendientes:
+                pendientes[clave] = texto
+
+        with self._lock:
+            self.hits += len(texts) - len(pendientes)
+            self.misses += len(pendientes)
+        count('cache_embeddings_hit', len(texts) - len(pendientes))
+        count('cache_embeddings_miss', len(pendientes))
+
+        if pendientes:
+            vectores = encoder.encode(
+                list(pendientes.values()),
+                batch_size=batch_size,
+                show_progress_bar=False
+            )
+            nuevos = {
+                clave: np.asarray(vector, dtype=np.float32)
+                for clave, vector in zip(pendientes, vectores)
+            }
+            self._store(nuevos)
+            encontrados.update(nuevos)
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([encontrados[clave] for clave in claves])
+
+    def clear(self):
+        """Vaciar la memoria (el almacén en disco se conserva)"""
+        with self._lock:
+            self._memoria.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Aciertos, fallos y memoria ocupada"""
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / consultas if consultas else 0.0,
+                'entradas_memoria': len(self._memoria),
+                'bytes_memoria': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disco': self._conn is not None
+            }
@@ -0,0 +1,283 @@
+"""
+Backends del encoder de embeddings
+- torch: SentenceTransformer en fp32 (por defecto)
+- onnx-int8: el mismo modelo exportado a ONNX y cuantizado a int8, con
+  onnxruntime y tokenizers (sin importar torch)
+
+Exportar el modelo ONNX (una vez, requiere torch y transformers):
+    python -m src.encoders --output data/models/minilm-onnx-int8
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+ENCODER_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+BACKENDS = ('torch', 'onnx-int8')
+DEFAULT_BACKEND = 'torch'
+
+ONNX_MODEL_DIR = "data/models/minilm-onnx-int8"
+MAX_SEQ_LENGTH = 128
+
+# Micro-lotes de consultas concurrentes (BatchingEncoder)
+QUERY_BATCH_SIZE = 64
+QUERY_BATCH_WAIT_MS = 5.0
+
+
+def encoder_id(backend: str = DEFAULT_BACKEND, model_name: str = ENCODER_NAME) -> str:
+    """
+    Identificador del encoder para manifest y caché de embeddings: los
+    vectores de backends distintos no se mezclan.
+    """
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
+
+
+def load_encoder(backend: str = DEFAULT_BACKEND, model_name: str = ENCODER_NAME,
+                 model_dir: str = ONNX_MODEL_DIR):
+    """Encoder con la interfaz de SentenceTransformer.encode"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de encoder desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
+
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(model_name)
+    return OnnxEncoder(model_dir)
+
+
+class OnnxEncoder:
+    """
+    Modelo ONNX int8 + mean pooling, como el SentenceTransformer original
+    (sin normalizar: la similitud coseno es la misma).
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(
+                f"El backend onnx-int8 necesita onnxruntime y tokenizers ({e.name} no está instalado)"
+            ) from e
+
+        model_dir = Path(model_dir)
+        if not (model_dir / "model.onnx").exists():
+            raise FileNotFoundError(
+                f"No hay modelo ONNX en {model_dir}; expórtalo con: "
+                f"python -m src.encoders --output {model_dir}"
+            )
+
+        config = json.loads((model_dir / "encoder.json").read_text(encoding='utf-8'))
+        self.model_name = config['modelo']
+        self.max_seq_length = config['max_seq_length']
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(
+            pad_id=self.tokenizer.token_to_id(config['pad_token']),
+            pad_token=config['pad_token']
+        )
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opciones.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_dir / "model.onnx"), opciones, providers=['CPUExecutionProvider']
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.encode(["dimensión"])[0].shape[0])
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        codificados = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([c.ids for c in codificados], dtype=np.int64)
+        mascara = np.array([c.attention_mask for c in codificados], dtype=np.int64)
+
+        entradas = {'input_ids': input_ids, 'attention_mask': mascara}
+        if 'token_type_ids' in self._input_names:
+            entradas['token_type_ids'] = np.zeros_like(input_ids)
+
+        ocultos = self.session.run(None, entradas)[0]
+
+        # Mean pooling sobre los tokens reales
+        peso = mascara[..., None].astype(np.float32)
+        return (ocultos * peso).sum(axis=1) / np.clip(peso.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Igual que SentenceTransformer.encode: un texto → vector, lista → matriz"""
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size=batch_size)[0]
+        if not sentences:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # Lotes de longitud parecida: menos relleno
+        orden = np.argsort([-len(t) for t in sentences], kind='stable')
+        vectores = np.empty((len(sentences), 0), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            indices = orden[start:start + batch_size]
+            lote = self._encode_batch([sentences[i] for i in indices])
+            if vectores.shape[1] == 0:
+                vectores = np.empty((len(sentences), lote.shape[1]), dtype=np.float32)
+            vectores[indices] = lote
+
+        return vectores
+
+
+class BatchingEncoder:
+    """
+    Micro-lotes de consultas concurrentes: las llamadas a encode que llegan
+    desde varios hilos en una ventana de max_wait_ms se embeben juntas en
+    un único encoder.encode (hasta max_batch textos). Las llamadas con más
+    de max_batch textos (indexación) van directas al encoder.
+
+    El resto de atributos son los del encoder envuelto.
+    """
+
+    def __init__(self, encoder, max_batch: int = QUERY_BATCH_SIZE,
+                 max_wait_ms: float = QUERY_BATCH_WAIT_MS):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000
+        self.lotes = 0
+        self.textos = 0
+        self._pendientes = queue.Queue()
+        threading.Thread(target=self._worker, daemon=True, name="encoder-batch").start()
+
+    def __getattr__(self, nombre):
+        return getattr(self.encoder, nombre)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Igual que SentenceTransformer.encode: un texto → vector, lista → matriz"""
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size=batch_size)[0]
+        if not sentences or len(sentences) > self.max_batch:
+            return self.encoder.encode(sentences, batch_size=batch_size,
+                                       show_progress_bar=show_progress_bar, **kwargs)
+
+        futuro = Future()
+        self._pendientes.put((list(sentences), futuro))
+        return futuro.result()
+
+    def _worker(self):
+        aplazada = None
+        while True:
+            lote = [aplazada or self._pendientes.get()]
+            aplazada = None
+            n = len(lote[0][0])
+            limite = time.perf_counter() + self.max_wait_s
+
+            # Esperar a más consultas hasta llenar el lote o agotar la ventana
+            while n < self.max_batch:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    siguiente = self._pendientes.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if n + len(siguiente[0]) > self.max_batch:
+                    # No cabe: abre el siguiente lote
+                    aplazada = siguiente
+                    break
+                lote.append(siguiente)
+                n += len(siguiente[0])
+
+            self._encode_lote(lote, n)
+
+    def _encode_lote(self, lote, n: int):
+        """Un encode para todo el lote y a cada llamada sus filas"""
+        try:
+            vectores = np.asarray(self.encoder.encode(
+                [texto for textos, _ in lote for texto in textos],
+                batch_size=n, show_progress_bar=False
+            ), dtype=np.float32)
+        except Exception as e:
+            for _, futuro in lote:
+                futuro.set_exception(e)
+            return
+
+        self.lotes += 1
+        self.textos += n
+        inicio = 0
+        for textos, futuro in lote:
+            futuro.set_result(vectores[inicio:inicio + len(textos)])
+            inicio += len(textos)
+
+
+def export_onnx(output_dir: str = ONNX_MODEL_DIR, model_name: str = ENCODER_NAME,
+                max_seq_length: int = MAX_SEQ_LENGTH, keep_fp32: bool = False) -> Dict:
+    """Exportar el modelo de Hugging Face a ONNX y cuantizar los pesos a int8"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    repo = model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+    destino = Path(output_dir)
+    destino.mkdir(parents=True, exist_ok=True)
+
+    print(f"📦 Exportando {repo} a ONNX...")
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    model = AutoModel.from_pretrained(repo).eval()
+
+    muestra = tokenizer(["texto de ejemplo"], return_tensors='pt')
+    fp32 = destino / "model.fp32.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (muestra['input_ids'], muestra['attention_mask']),
+            str(fp32),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['last_hidden_state'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'secuencia'},
+                'attention_mask': {0: 'batch', 1: 'secuencia'},
+                'last_hidden_state': {0: 'batch', 1: 'secuencia'}
+            },
+            opset_version=14
+        )
+
+    print("🗜️ Cuantizando pesos a int8...")
+    quantize_dynamic(str(fp32), str(destino / "model.onnx"), weight_type=QuantType.QInt8)
+    if not keep_fp32:
+        fp32.unlink()
+
+    tokenizer.save_pretrained(str(destino))
+    config = {
+        'modelo': model_name,
+        'max_seq_length': max_seq_length,
+        'pad_token': tokenizer.pad_token,
+        'dim': model.config.hidden_size,
+        'cuantizacion': 'int8 dinámica (pesos)'
+    }
+    (destino / "encoder.json").write_text(json.dumps(config, indent=2), encoding='utf-8')
+
+    tamano = (destino / "model.onnx").stat().st_size / 1e6
+    print(f"✅ Modelo ONNX int8 en {destino} ({tamano:.0f} MB)")
+    return config
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Exportar el encoder a ONNX int8")
+    parser.add_argument('--output', default=ONNX_MODEL_DIR)
+    parser.add_argument('--model', default=ENCODER_NAME)
+    parser.add_argument('--max-seq-length', type=int, default=MAX_SEQ_LENGTH)
+    parser.add_argument('--keep-fp32', action='store_true', help="Conservar también el ONNX fp32")
+    args = parser.parse_args(argv)
+
+    export_onnx(args.output, args.model, args.max_seq_length, args.keep_fp32)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Artefacto de ejemplos de la Guía
+Paso offline: extrae del PDF los pares "Versión no recomendada" /
+"Versión alternativa" y los guarda en un JSON versionado que el sistema
+solo tiene que cargar al arrancar
+
+Uso:
+    python -m src.guia_artifact data/Guia_de_redaccion_judicial_clara.pdf
+"""
+
+import argparse
+import bisect
+import json
+import os
+import re
+import time
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.pdf_extraction import PdfTextCache, iter_pages
+from src.utils import file_sha256
+
+# Subir al cambiar el parseo o el formato de los ejemplos
+ARTIFACT_VERSION = 1
+
+# Caracteres guardados de cada versión del ejemplo
+MAX_CHARS = 500
+
+NO_RECOMENDADA_RE = re.compile(r'Versión no recomendada:?', re.IGNORECASE)
+ALTERNATIVA_RE = re.compile(r'Versión alternativa:?', re.IGNORECASE)
+VERSION_RE = re.compile(r'Versión', re.IGNORECASE)
+
+
+def default_artifact_path(guia_path: str) -> Path:
+    """El artefacto va junto al PDF: Guia.pdf → Guia.ejemplos.json"""
+    return Path(guia_path).with_suffix('.ejemplos.json')
+
+
+def inferir_regla(orig: str, simp: str) -> str:
+    """Inferir regla aplicada"""
+    if orig.isupper() and not simp.isupper():
+        return 'mayusculas'
+    elif 'conformidad' in orig.lower():
+        return 'terminologia'
+    elif len(orig.split()) > len(simp.split()) * 1.3:
+        return 'oraciones_cortas'
+    return 'general'
+
+
+def parse_ejemplos(paginas: List[str]) -> List[Dict]:
+    """
+    Pares de ejemplo en un solo recorrido hacia delante: cada búsqueda
+    empieza donde acabó la anterior, sin expresiones con retroceso sobre
+    el texto completo. El original va hasta la siguiente "Versión
+    alternativa" y el simplificado hasta la siguiente "Versión".
+    """
+    texto = "".join(paginas)
+    finales = list(accumulate(len(p) for p in paginas))
+
+    ejemplos = []
+    pos = 0
+    while True:
+        inicio = NO_RECOMENDADA_RE.search(texto, pos)
+        if not inicio:
+            break
+        alternativa = ALTERNATIVA_RE.search(texto, inicio.end())
+        if not alternativa:
+            break
+        siguiente = VERSION_RE.search(texto, alternativa.end())
+        fin = siguiente.start() if siguiente else len(texto)
+
+        orig = texto[inicio.end():alternativa.start()]
+        simp = texto[alternativa.end():fin]
+        ejemplos.append({
+            'id': f'guia_{len(ejemplos)}',
+            'original': orig.strip()[:MAX_CHARS],
+            'simplificado': simp.strip()[:MAX_CHARS],
+            'regla': inferir_regla(orig, simp),
+            'pagina': bisect.bisect_right(finales, inicio.start()) + 1
+        })
+        pos = fin
+
+    return ejemplos
+
+
+def build_artifact(guia_path: str, output: Optional[str] = None,
+                   cache: Optional[PdfTextCache] = None) -> Dict:
+    """Extraer los ejemplos de la Guía y guardar el artefacto"""
+    destino = Path(output) if output else default_artifact_path(guia_path)
+
+    inicio = time.perf_counter()
+    paginas = list(iter_pages(guia_path, cache=cache))
+    extraccion_s = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    ejemplos = parse_ejemplos(paginas)
+    parse_s = time.perf_counter() - inicio
+
+    artefacto = {
+        'version': ARTIFACT_VERSION,
+        'guia_sha256': file_sha256(guia_path),
+        'paginas': len(paginas),
+        'ejemplos': ejemplos
+    }
+
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_suffix('.tmp')
+    tmp.write_text(json.dumps(artefacto, ensure_ascii=False, indent=1), encoding='utf-8')
+    os.replace(tmp, destino)
+
+    print(f"✅ {len(ejemplos)} ejemplos de {len(paginas)} páginas → {destino}")
+    print(f"   ⏱️ extracción {extraccion_s:.2f}s, parseo {parse_s * 1000:.1f} ms")
+
+    return {
+        'path': str(destino),
+        'ejemplos': len(ejemplos),
+        'paginas': len(paginas),
+        'extraccion_s': extraccion_s,
+        'parse_s': parse_s
+    }
+
+
+def artifact_vigente(path: Path, guia_path: str) -> bool:
+    """El artefacto existe, tiene la versión actual y corresponde a la Guía"""
+    try:
+        datos = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return False
+
+    if datos.get('version') != ARTIFACT_VERSION:
+        return False
+    # Sin el PDF no se puede comprobar: vale el artefacto distribuido
+    if not Path(guia_path).exists():
+        return True
+    return datos.get('guia_sha256') == file_sha256(guia_path)
+
+
+def load_artifact(path: Path) -> List[Dict]:
+    """Ejemplos del artefacto"""
+    datos = json.loads(Path(path).read_text(encoding='utf-8'))
+    if datos.get('version') != ARTIFACT_VERSION:
+        raise ValueError(
+            f"Artefacto de ejemplos con versión {datos.get('version')} "
+            f"(se esperaba {ARTIFACT_VERSION}): {path}"
+        )
+    return datos['ejemplos']
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compilar el artefacto de ejemplos de la Guía")
+    parser.add_argument('guia', nargs='?', default="data/Guia_de_redaccion_judicial_clara.pdf")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Fichero de salida (por defecto, junto al PDF con extensión .ejemplos.json)")
+    args = parser.parse_args(argv)
+
+    build_artifact(args.guia, args.output)
+
+
+if __name__ == '__main__':
+    main()
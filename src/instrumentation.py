@@ -0,0 +1,234 @@
+"""
+Instrumentación del pipeline
+Tiempos por etapa (extracción, encoder, consultas, prompt, prefill y
+decode del LLM, indexado) y contadores (tokens, aciertos de caché):
+- por petición, en la traza que simplificar() devuelve en resultado['traza']
+- acumulados en el proceso, exportables en texto de Prometheus o JSON
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Límites (segundos) de los histogramas de cada etapa
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Tramos que guarda una traza; a partir de aquí solo se suman en 'etapas'
+MAX_SPANS = 500
+
+_traza_actual: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    'traza_actual', default=None
+)
+
+
+class Trace:
+    """Tramos y contadores de una petición"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.tramos: List[Dict] = []
+        self.etapas: Dict[str, Dict] = {}
+        self.contadores: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, nombre: str, inicio: float, segundos: float, atributos: Dict):
+        with self._lock:
+            if len(self.tramos) < MAX_SPANS:
+                self.tramos.append({'etapa': nombre, 'inicio_s': inicio - self.inicio,
+                                    'segundos': segundos, **atributos})
+            etapa = self.etapas.setdefault(nombre, {'n': 0, 'segundos': 0.0})
+            etapa['n'] += 1
+            etapa['segundos'] += segundos
+
+    def count(self, nombre: str, n: float):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def to_dict(self) -> Dict:
+        """Traza serializable: tramos en orden de inicio, totales por etapa y contadores"""
+        with self._lock:
+            return {
+                'total_s': time.perf_counter() - self.inicio,
+                'tramos': sorted((dict(t) for t in self.tramos), key=lambda t: t['inicio_s']),
+                'etapas': {nombre: dict(etapa) for nombre, etapa in self.etapas.items()},
+                'contadores': dict(self.contadores)
+            }
+
+
+class MetricsRegistry:
+    """Histogramas por etapa y contadores de todo el proceso"""
+
+    def __init__(self):
+        self.etapas: Dict[str, Dict] = {}
+        self.contadores: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, nombre: str, segundos: float):
+        with self._lock:
+            etapa = self.etapas.get(nombre)
+            if etapa is None:
+                etapa = self.etapas[nombre] = {'n': 0, 'segundos': 0.0,
+                                               'cubos': [0] * len(STAGE_BUCKETS)}
+            etapa['n'] += 1
+            etapa['segundos'] += segundos
+            for i, limite in enumerate(STAGE_BUCKETS):
+                if segundos <= limite:
+                    etapa['cubos'][i] += 1
+
+    def count(self, nombre: str, n: float):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.etapas.clear()
+            self.contadores.clear()
+
+    def to_json(self) -> Dict:
+        with self._lock:
+            return {
+                'etapas': {
+                    nombre: {
+                        'n': etapa['n'],
+                        'segundos': etapa['segundos'],
+                        'media_s': etapa['segundos'] / etapa['n'],
+                        'cubos': dict(zip(map(str, STAGE_BUCKETS), etapa['cubos']))
+                    }
+                    for nombre, etapa in sorted(self.etapas.items())
+                },
+                'contadores': dict(sorted(self.contadores.items()))
+            }
+
+    def to_prometheus(self, prefix: str = "justicia") -> str:
+        with self._lock:
+            lineas = [f"# TYPE {prefix}_stage_seconds histogram"]
+            for nombre, etapa in sorted(self.etapas.items()):
+                for limite, n in zip(STAGE_BUCKETS, etapa['cubos']):
+                    lineas.append(f'{prefix}_stage_seconds_bucket{{stage="{nombre}",le="{limite}"}} {n}')
+                lineas += [
+                    f'{prefix}_stage_seconds_bucket{{stage="{nombre}",le="+Inf"}} {etapa["n"]}',
+                    f'{prefix}_stage_seconds_sum{{stage="{nombre}"}} {etapa["segundos"]:.6f}',
+                    f'{prefix}_stage_seconds_count{{stage="{nombre}"}} {etapa["n"]}'
+                ]
+            lineas.append(f"# TYPE {prefix}_events_total counter")
+            lineas += [f'{prefix}_events_total{{name="{nombre}"}} {n:g}'
+                       for nombre, n in sorted(self.contadores.items())]
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def current_trace() -> Optional[Trace]:
+    return _traza_actual.get()
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """
+    Traza de la petición en curso. Si ya hay una abierta (simplificar()
+    dentro de un trabajo que también extrae el PDF), se reutiliza.
+    """
+    actual = _traza_actual.get()
+    if actual is not None:
+        yield actual
+        return
+
+    traza = Trace()
+    token = _traza_actual.set(traza)
+    try:
+        yield traza
+    finally:
+        _traza_actual.reset(token)
+
+
+def record(nombre: str, segundos: float, inicio: Optional[float] = None, **atributos):
+    """Añadir un tramo ya medido (p. ej. el prefill que informa Ollama)"""
+    REGISTRY.observe(nombre, segundos)
+    traza = _traza_actual.get()
+    if traza is not None:
+        if inicio is None:
+            inicio = time.perf_counter() - segundos
+        traza.add(nombre, inicio, segundos, atributos)
+
+
+@contextmanager
+def span(nombre: str, **atributos) -> Iterator[Dict]:
+    """Medir un bloque; los atributos que se añadan al dict cedido van al tramo"""
+    inicio = time.perf_counter()
+    try:
+        yield atributos
+    finally:
+        record(nombre, time.perf_counter() - inicio, inicio, **atributos)
+
+
+def count(nombre: str, n: float = 1):
+    """Sumar n a un contador de la petición y del proceso"""
+    if not n:
+        return
+    REGISTRY.count(nombre, n)
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.count(nombre, n)
+
+
+def timed(nombre: str) -> Callable:
+    """Decorador: cada llamada (síncrona o asíncrona) es un tramo"""
+    def decorador(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def envuelta(*args, **kwargs):
+                with span(nombre):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def envuelta(*args, **kwargs):
+                with span(nombre):
+                    return fn(*args, **kwargs)
+        return envuelta
+    return decorador
+
+
+def traced(fn: Callable) -> Callable:
+    """
+    Decorador de las entradas del pipeline (simplificar*): abre la traza
+    de la petición y la devuelve en resultado['traza']
+    """
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def envuelta(*args, **kwargs):
+            with trace() as traza:
+                resultado = await fn(*args, **kwargs)
+            resultado['traza'] = traza.to_dict()
+            return resultado
+    else:
+        @functools.wraps(fn)
+        def envuelta(*args, **kwargs):
+            with trace() as traza:
+                resultado = fn(*args, **kwargs)
+            resultado['traza'] = traza.to_dict()
+            return resultado
+    return envuelta
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    fn con la traza actual, para ejecutarla en otro hilo (executor o pool):
+    los hilos no heredan el contexto de quien les pasa el trabajo.
+    """
+    contexto = contextvars.copy_context()
+    return functools.partial(contexto.run, fn)
+
+
+def export(formato: str = 'prometheus') -> str:
+    """Métricas del proceso en texto de Prometheus ('prometheus') o JSON ('json')"""
+    if formato == 'json':
+        return json.dumps(REGISTRY.to_json(), ensure_ascii=False)
+    if formato == 'prometheus':
+        return REGISTRY.to_prometheus()
+    raise ValueError(f"Formato desconocido: {formato} (opciones: prometheus, json)")
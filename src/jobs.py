@@ -0,0 +1,267 @@
+"""
+Cola de trabajos de simplificación
+Pool acotado de workers, progreso y salida parcial consultables, resultados
+guardados en disco y cancelación
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_JOBS_DIR = "data/jobs"
+
+# Trabajos en cola como máximo por worker antes de rechazar nuevos
+MAX_QUEUED_PER_WORKER = 8
+
+# Cada cuánto se guarda en disco la salida parcial de un trabajo en curso
+SAVE_INTERVAL_S = 2.0
+
+# Los trabajos terminados se borran (memoria y disco) pasado este tiempo o
+# cuando hay más de este número, empezando por los más antiguos
+JOB_TTL_S = 24 * 3600
+MAX_FINISHED_JOBS = 200
+
+EN_COLA = 'en_cola'
+EN_CURSO = 'en_curso'
+TERMINADO = 'terminado'
+ERROR = 'error'
+CANCELADO = 'cancelado'
+INTERRUMPIDO = 'interrumpido'
+
+FINALES = (TERMINADO, ERROR, CANCELADO, INTERRUMPIDO)
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras se ejecutaba"""
+
+
+class JobQueueFull(RuntimeError):
+    """No se admiten más trabajos hasta que se vacíe la cola"""
+
+
+class JobManager:
+    """
+    Trabajos de simplificación fuera del hilo de la interfaz.
+
+    submit() encola una tarea (una llamada a simplificar*, que recibe
+    on_token y on_rules) y devuelve su id. Como mucho max_workers tareas
+    se ejecutan a la vez, lo que limita las peticiones al LLM del nodo.
+    get() devuelve el estado, la salida parcial y, al terminar, el
+    resultado; cada trabajo se guarda en jobs_dir/<id>.json, así que
+    sobrevive a las recargas de la página y a un reinicio (los que estaban
+    en curso quedan como interrumpidos).
+
+    cancel() quita de la cola un trabajo pendiente o marca uno en curso;
+    este se detiene en el siguiente fragmento que genere.
+
+    Los trabajos terminados se conservan ttl_s segundos y como mucho
+    max_finished; los más antiguos se borran de memoria y de jobs_dir.
+    """
+
+    def __init__(self, max_workers: int = 2, jobs_dir: str = DEFAULT_JOBS_DIR,
+                 max_queued: Optional[int] = None, ttl_s: float = JOB_TTL_S,
+                 max_finished: int = MAX_FINISHED_JOBS):
+        self.max_workers = max_workers
+        self.max_queued = max_queued if max_queued is not None else max_workers * MAX_QUEUED_PER_WORKER
+        self.ttl_s = ttl_s
+        self.max_finished = max_finished
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Dict] = {}
+        self._futuros = {}
+        self._cancelados = set()
+        # Trabajos terminados (de esta ejecución o de disco) → fin, del más antiguo al más reciente
+        self._terminados: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._recover()
+
+    def _path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _save(self, job: Dict):
+        destino = self._path(job['id'])
+        tmp = destino.with_suffix('.tmp')
+        tmp.write_text(json.dumps(job, ensure_ascii=False, default=str), encoding='utf-8')
+        os.replace(tmp, destino)
+
+    def _recover(self):
+        """
+        Los trabajos que no terminaron en la ejecución anterior quedan
+        interrumpidos; los caducados se borran.
+        """
+        terminados = []
+        for path in self.jobs_dir.glob("*.json"):
+            try:
+                job = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            if job.get('estado') not in FINALES:
+                job['estado'] = INTERRUMPIDO
+                self._save(job)
+            # Los interrumpidos no tienen fin: cuenta desde ahora (el guardado)
+            terminados.append((job.get('fin') or path.stat().st_mtime, path.stem))
+
+        for fin, job_id in sorted(terminados):
+            self._terminados[job_id] = fin
+        self._evict()
+
+    def _finish(self, job: Dict):
+        """Guardar un trabajo que acaba de terminar y borrar los caducados (con el lock)"""
+        self._save(job)
+        self._terminados[job['id']] = job['fin']
+        self._evict()
+
+    def _evict(self):
+        """Borrar de memoria y de disco los trabajos terminados caducados o que sobran"""
+        limite = time.time() - self.ttl_s
+        while self._terminados:
+            job_id, fin = next(iter(self._terminados.items()))
+            if fin >= limite and len(self._terminados) <= self.max_finished:
+                break
+            del self._terminados[job_id]
+            self._jobs.pop(job_id, None)
+            self._path(job_id).unlink(missing_ok=True)
+
+    def submit(self, tarea: Callable[..., Dict], nombre: str = "", **metadata) -> str:
+        """
+        Encolar tarea(on_token=..., on_rules=...) y devolver el id del
+        trabajo. Lanza JobQueueFull si hay max_queued trabajos esperando.
+        """
+        with self._lock:
+            self._evict()
+            en_cola = sum(1 for job in self._jobs.values() if job['estado'] == EN_COLA)
+            if en_cola >= self.max_queued:
+                raise JobQueueFull(f"{en_cola} trabajos en cola; inténtalo más tarde")
+
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                'id': job_id,
+                'nombre': nombre,
+                'metadata': metadata,
+                'estado': EN_COLA,
+                'creado': time.time(),
+                'inicio': None,
+                'fin': None,
+                'parcial': "",
+                'reglas': None,
+                'resultado': None,
+                'error': None
+            }
+            self._jobs[job_id] = job
+            self._save(job)
+            self._futuros[job_id] = self._pool.submit(self._run, job_id, tarea)
+
+        return job_id
+
+    def _run(self, job_id: str, tarea: Callable[..., Dict]):
+        job = self._jobs[job_id]
+        partes: List[str] = []
+        ultimo_guardado = time.perf_counter()
+
+        def comprobar():
+            if job_id in self._cancelados:
+                raise JobCancelled(job_id)
+
+        def on_rules(texto: str):
+            comprobar()
+            job['reglas'] = texto
+
+        def on_token(token: str):
+            nonlocal ultimo_guardado
+            comprobar()
+            partes.append(token)
+            job['parcial'] = "".join(partes)
+            if time.perf_counter() - ultimo_guardado > SAVE_INTERVAL_S:
+                ultimo_guardado = time.perf_counter()
+                self._save(job)
+
+        with self._lock:
+            if job_id in self._cancelados:
+                job['estado'] = CANCELADO
+                job['fin'] = time.time()
+                self._futuros.pop(job_id, None)
+                self._cancelados.discard(job_id)
+                self._finish(job)
+                return
+            job['estado'] = EN_CURSO
+            job['inicio'] = time.time()
+            self._save(job)
+
+        try:
+            job['resultado'] = tarea(on_token=on_token, on_rules=on_rules)
+            job['estado'] = TERMINADO
+        except JobCancelled:
+            job['estado'] = CANCELADO
+        except Exception as e:
+            job['estado'] = ERROR
+            job['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            job['fin'] = time.time()
+            with self._lock:
+                self._futuros.pop(job_id, None)
+                self._cancelados.discard(job_id)
+                self._finish(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Estado del trabajo (de memoria o, si es de otra ejecución, del
+        disco); None si no existe o ya se borró.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            try:
+                job = json.loads(self._path(job_id).read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                return None
+        return {**job, 'segundos': self._segundos(job)}
+
+    @staticmethod
+    def _segundos(job: Dict) -> float:
+        if not job['inicio']:
+            return 0.0
+        return (job['fin'] or time.time()) - job['inicio']
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancelar un trabajo en cola o en curso; False si ya había terminado"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['estado'] in FINALES:
+                return False
+
+            futuro = self._futuros.get(job_id)
+            if futuro is not None and futuro.cancel():
+                job['estado'] = CANCELADO
+                job['fin'] = time.time()
+                self._futuros.pop(job_id, None)
+                self._finish(job)
+            else:
+                self._cancelados.add(job_id)
+            return True
+
+    def stats(self) -> Dict:
+        """Trabajos por estado en esta ejecución"""
+        with self._lock:
+            estados = [job['estado'] for job in self._jobs.values()]
+        return {
+            'max_workers': self.max_workers,
+            'en_cola': estados.count(EN_COLA),
+            'en_curso': estados.count(EN_CURSO),
+            'terminados': estados.count(TERMINADO),
+            'cancelados': estados.count(CANCELADO),
+            'errores': estados.count(ERROR)
+        }
+
+    def shutdown(self):
+        """Cancelar lo pendiente y esperar a los trabajos en curso"""
+        with self._lock:
+            self._cancelados.update(self._futuros)
+        self._pool.shutdown(wait=True, cancel_futures=True)
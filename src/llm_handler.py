@@ -2,37 +2,498 @@
 Manejador de LLM (Ollama)
 """
 
+import asyncio
+import hashlib
+import queue
+import re
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from src.instrumentation import count, record
+
+# Tiempo que Ollama mantiene el modelo en RAM tras cada petición
+KEEP_ALIVE = "30m"
+
+class LLMDeadlineExceeded(TimeoutError):
+    """El LLM no terminó antes del plazo de la petición"""
+
+class CircuitBreaker:
+    """
+    Tras max_failures fallos seguidos deja de llamar al LLM durante reset_s
+    segundos; pasado ese tiempo deja pasar una única petición de prueba: con
+    su éxito se cierra y con su fallo vuelve a abrirse. Si la prueba no
+    informa en reset_s segundos se permite otra.
+    """
+    
+    def __init__(self, max_failures: int = 3, reset_s: float = 30.0):
+        self.max_failures = max_failures
+        self.reset_s = reset_s
+        self.failures = 0
+        self.opened_at = None
+        # Momento en que salió la petición de prueba en curso (None si no hay)
+        self.probing = None
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return 'cerrado'
+            if time.monotonic() - self.opened_at >= self.reset_s:
+                return 'semiabierto'
+            return 'abierto'
+    
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            ahora = time.monotonic()
+            if ahora - self.opened_at < self.reset_s:
+                return False
+            if self.probing is not None and ahora - self.probing < self.reset_s:
+                return False
+            self.probing = ahora
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probing = None
+            if self.failures >= self.max_failures:
+                self.opened_at = time.monotonic()
+    
+    def record_cancelled(self):
+        """La petición se abandonó sin saber si el LLM responde: otra puede probar"""
+        with self._lock:
+            self.probing = None
+
 class LLMHandler:
-    """Interfaz con Ollama"""
+    """
+    Interfaz con Ollama.
+    Pensado para crearse una vez y reutilizarse: mantiene un único cliente
+    HTTP (conexiones reutilizadas) y pide a Ollama que no descargue el modelo.
+    """
     
-    def __init__(self, model: str = "llama2"):
+    def __init__(self, model: str = "llama2", host: Optional[str] = None,
+                 keep_alive: str = KEEP_ALIVE, breaker: Optional[CircuitBreaker] = None):
         self.model = model
+        self.host = host
+        self.keep_alive = keep_alive
+        self.breaker = breaker or CircuitBreaker()
+        self._async_client = None
+        # (hash del prefijo, tokens de contexto) del último prefijo calculado
+        self._prefijo = None
+        self._prefijo_lock = threading.Lock()
+        self._prefijo_pendiente = False
+        self.tokens = {'peticiones': 0, 'prompt': 0, 'prefill_ahorrado': 0}
+        self._tokens_lock = threading.Lock()
         self._check_ollama()
     
     def _check_ollama(self):
         """Verificar que Ollama esté disponible"""
         try:
             import ollama
-            self.ollama = ollama
+            self.ollama = ollama.Client(host=self.host)
             print(f"✅ Ollama conectado (modelo: {self.model})")
         except ImportError:
             print("⚠️ Ollama no disponible, usando modo mock")
             self.ollama = None
     
-    def generate(self, prompt: str) -> str:
-        """Generar con LLM"""
-        if self.ollama:
+    def warmup(self, prefix: Optional[str] = None) -> bool:
+        """
+        Cargar el modelo en memoria con una generación vacía y, si se pasa
+        prefix, precalcular su contexto (ver prefix_context).
+        """
+        if not self.ollama:
+            return False
+        
+        try:
+            inicio = time.perf_counter()
+            self.ollama.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+            print(f"🔥 Modelo {self.model} cargado en {time.perf_counter() - inicio:.1f}s")
+        except Exception as e:
+            print(f"⚠️ Warm-up fallido: {e}")
+            return False
+        
+        if prefix is not None:
+            self.prefix_context(prefix)
+        return True
+    
+    def prefix_context(self, prefix: str, wait: bool = True) -> Optional[List[int]]:
+        """
+        Tokens de contexto de Ollama para el prefijo fijo del prompt. Se
+        calculan una vez (prefill del prefijo y un token de respuesta, que
+        se descarta) y se reutilizan mientras el prefijo no cambie: al
+        cambiar las reglas cambia su hash y se recalculan.
+        
+        Con wait=False, si aún no están calculados se lanzan en segundo
+        plano y se devuelve None (la petición usa el prompt completo).
+        """
+        if not self.ollama:
+            return None
+        
+        clave = hashlib.sha256(f"{self.model}\x1f{prefix}".encode('utf-8')).hexdigest()
+        prefijo = self._prefijo
+        if prefijo is not None and prefijo[0] == clave:
+            return prefijo[1]
+        
+        if not wait:
+            with self._prefijo_lock:
+                if not self._prefijo_pendiente:
+                    self._prefijo_pendiente = True
+                    threading.Thread(target=self.prefix_context, args=(prefix,), daemon=True).start()
+            return None
+        
+        with self._prefijo_lock:
+            if self._prefijo is not None and self._prefijo[0] == clave:
+                return self._prefijo[1]
+            
             try:
-                response = self.ollama.generate(
+                inicio = time.perf_counter()
+                respuesta = self.ollama.generate(
                     model=self.model,
-                    prompt=prompt
+                    prompt=prefix,
+                    keep_alive=self.keep_alive,
+                    options={'num_predict': 1}
                 )
-                return response['response']
+                contexto = list(respuesta['context'])
+                contexto = contexto[:len(contexto) - (respuesta.get('eval_count') or 0)]
+                self._prefijo = (clave, contexto)
+                print(f"🧠 Prefijo del prompt precalculado: {len(contexto)} tokens "
+                      f"en {time.perf_counter() - inicio:.1f}s")
+                return contexto
             except Exception as e:
-                print(f"⚠️ Error LLM: {e}, usando reglas básicas")
-                return self._fallback_simplification(prompt)
+                print(f"⚠️ No se pudo precalcular el prefijo: {e}")
+                return None
+            finally:
+                self._prefijo_pendiente = False
+    
+    def health(self) -> Dict:
+        """Estado de Ollama y si el modelo está residente en memoria"""
+        if not self.ollama:
+            return {'ok': False, 'modelo': self.model, 'cargado': False,
+                    'circuito': self.breaker.state, 'tokens': dict(self.tokens),
+                    'error': 'ollama no instalado'}
+        
+        try:
+            cargados = [m['model'] for m in self.ollama.ps()['models']]
+            cargado = any(m == self.model or m.split(':')[0] == self.model for m in cargados)
+            return {'ok': True, 'modelo': self.model, 'cargado': cargado,
+                    'circuito': self.breaker.state, 'tokens': dict(self.tokens), 'error': None}
+        except Exception as e:
+            return {'ok': False, 'modelo': self.model, 'cargado': False,
+                    'circuito': self.breaker.state, 'tokens': dict(self.tokens), 'error': str(e)}
+    
+    def generate(self, prompt: str, stats: Optional[Dict] = None,
+                 deadline: Optional[float] = None, fallback_output: Optional[str] = None,
+                 prefix: Optional[str] = None) -> str:
+        """Generar con LLM"""
+        return "".join(self.generate_stream(prompt, stats=stats, deadline=deadline,
+                                            fallback_output=fallback_output, prefix=prefix))
+    
+    def generate_stream(self, prompt: str, stats: Optional[Dict] = None,
+                        deadline: Optional[float] = None,
+                        fallback_output: Optional[str] = None,
+                        prefix: Optional[str] = None) -> Iterator[str]:
+        """
+        Generar con LLM devolviendo los fragmentos según llegan.
+        Si se pasa stats, se rellena con primer_token_s y total_s (y fallback,
+        incompleto y motivo cuando no hay respuesta completa del LLM).
+        
+        deadline (instante de time.perf_counter) cancela la generación al
+        vencer. fallback_output es la salida de reglas ya calculada; si no se
+        pasa, se recupera el texto del prompt y se aplican las reglas.
+        
+        prefix es la parte fija del prompt: se envía como contexto
+        precalculado (prefix_context) y Ollama no vuelve a hacer su prefill.
+        stats recibe prompt_tokens (evaluados) y prefill_ahorrado (tokens de
+        entrada que no hubo que evaluar).
+        """
+        stats = stats if stats is not None else {}
+        inicio = time.perf_counter()
+        emitido = False
+        final = {}
+        
+        def marcar_primer_token():
+            if 'primer_token_s' not in stats:
+                stats['primer_token_s'] = time.perf_counter() - inicio
+        
+        def fallback(motivo: str) -> str:
+            marcar_primer_token()
+            stats['fallback'] = True
+            stats['motivo'] = motivo
+            if fallback_output is not None:
+                return fallback_output
+            return self._fallback_simplification(prompt)
+        
+        if not self.ollama:
+            yield fallback('sin_ollama')
+        elif not self.breaker.allow():
+            yield fallback('circuito_abierto')
         else:
+            try:
+                contexto = None
+                if prefix is not None:
+                    # Con plazo no se espera a calcular el prefijo por primera vez
+                    contexto = self.prefix_context(prefix, wait=deadline is None)
+                    if contexto is None:
+                        prompt = prefix + prompt
+                
+                for token in self._stream_tokens(prompt, deadline, contexto, final):
+                    if token:
+                        marcar_primer_token()
+                        emitido = True
+                        yield token
+                self.breaker.record_success()
+                self._record_tokens(final, stats)
+            except LLMDeadlineExceeded:
+                # El plazo lo pone quien llama: no es un fallo del LLM
+                self.breaker.record_cancelled()
+                print("⏱️ LLM cancelado al vencer el plazo")
+                if emitido:
+                    stats['incompleto'] = True
+                    stats['motivo'] = 'deadline'
+                else:
+                    yield fallback('deadline')
+            except Exception as e:
+                self.breaker.record_failure()
+                if emitido:
+                    # No mezclar la salida parcial con el fallback
+                    print(f"⚠️ Error LLM a mitad de generación: {e}")
+                    stats['incompleto'] = True
+                    stats['motivo'] = 'error'
+                else:
+                    print(f"⚠️ Error LLM: {e}, usando reglas básicas")
+                    yield fallback('error')
+        
+        stats['total_s'] = time.perf_counter() - inicio
+        self._record_trace(stats, inicio)
+    
+    def _record_tokens(self, final: Dict, stats: Dict):
+        """
+        Tokens evaluados, prefill ahorrado, tokens generados y duración del
+        prefill y del decode según el último fragmento de Ollama
+        """
+        if not final:
+            return
+        
+        evaluados = final.get('prompt_eval_count') or 0
+        generados = final.get('eval_count') or 0
+        entrada = final['contexto'] - generados
+        stats['prompt_tokens'] = evaluados
+        stats['prefill_ahorrado'] = max(entrada - evaluados, 0)
+        stats['completion_tokens'] = generados
+        if final.get('prompt_eval_duration') is not None:
+            stats['prefill_s'] = final['prompt_eval_duration'] / 1e9
+        if final.get('eval_duration'):
+            stats['decode_s'] = final['eval_duration'] / 1e9
+            stats['tokens_s'] = generados / stats['decode_s']
+        
+        with self._tokens_lock:
+            self.tokens['peticiones'] += 1
+            self.tokens['prompt'] += evaluados
+            self.tokens['prefill_ahorrado'] += stats['prefill_ahorrado']
+        count('llm_tokens_prompt', evaluados)
+        count('llm_tokens_prefill_ahorrado', stats['prefill_ahorrado'])
+        count('llm_tokens_completion', generados)
+    
+    def _record_trace(self, stats: Dict, inicio: float):
+        """Tramos de la generación: total y, si Ollama los informa, prefill y decode"""
+        record('llm', stats['total_s'], inicio, modelo=self.model,
+               primer_token_s=stats.get('primer_token_s'), motivo=stats.get('motivo'))
+        if 'prefill_s' in stats:
+            record('llm_prefill', stats['prefill_s'], inicio, tokens=stats['prompt_tokens'])
+        if 'decode_s' in stats:
+            record('llm_decode', stats['decode_s'], inicio + stats.get('primer_token_s', 0.0),
+                   tokens=stats['completion_tokens'], tokens_s=stats['tokens_s'])
+        if stats.get('fallback'):
+            count(f"llm_fallback_{stats.get('motivo')}")
+    
+    @staticmethod
+    def _final_chunk(chunk, final: Optional[Dict]):
+        if final is not None and chunk.get('done'):
+            final.update({
+                'prompt_eval_count': chunk.get('prompt_eval_count'),
+                'eval_count': chunk.get('eval_count'),
+                'prompt_eval_duration': chunk.get('prompt_eval_duration'),
+                'eval_duration': chunk.get('eval_duration'),
+                'contexto': len(chunk.get('context') or [])
+            })
+    
+    def _stream_tokens(self, prompt: str, deadline: Optional[float],
+                       context: Optional[List[int]] = None,
+                       final: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Fragmentos de Ollama. Con deadline, la lectura va en un hilo aparte y
+        aquí se espera como mucho hasta el plazo; al vencer, el hilo corta el
+        stream (lo que cierra la conexión y detiene la generación en Ollama).
+        El último fragmento (contadores de tokens) se copia en final.
+        """
+        def iniciar():
+            kwargs = {'context': context} if context else {}
+            return self.ollama.generate(
+                model=self.model,
+                prompt=prompt,
+                stream=True,
+                keep_alive=self.keep_alive,
+                **kwargs
+            )
+        
+        if deadline is None:
+            for chunk in iniciar():
+                self._final_chunk(chunk, final)
+                yield chunk['response']
+            return
+        
+        cola = queue.Queue()
+        cancelado = threading.Event()
+        
+        def producir():
+            try:
+                stream = iniciar()
+                for chunk in stream:
+                    if cancelado.is_set():
+                        stream.close()
+                        return
+                    self._final_chunk(chunk, final)
+                    cola.put(('token', chunk['response']))
+                cola.put(('fin', None))
+            except Exception as e:
+                cola.put(('error', e))
+        
+        threading.Thread(target=producir, daemon=True).start()
+        
+        try:
+            while True:
+                restante = deadline - time.perf_counter()
+                if restante <= 0:
+                    raise LLMDeadlineExceeded()
+                try:
+                    tipo, valor = cola.get(timeout=restante)
+                except queue.Empty:
+                    raise LLMDeadlineExceeded()
+                
+                if tipo == 'token':
+                    yield valor
+                elif tipo == 'error':
+                    raise valor
+                else:
+                    return
+        finally:
+            cancelado.set()
+    
+    async def agenerate(self, prompt: str, stats: Optional[Dict] = None,
+                        deadline: Optional[float] = None, fallback_output: Optional[str] = None,
+                        prefix: Optional[str] = None) -> str:
+        """Generar con LLM (asíncrono)"""
+        return "".join([
+            token async for token in self.agenerate_stream(prompt, stats=stats, deadline=deadline,
+                                                           fallback_output=fallback_output,
+                                                           prefix=prefix)
+        ])
+    
+    async def agenerate_stream(self, prompt: str, stats: Optional[Dict] = None,
+                               deadline: Optional[float] = None,
+                               fallback_output: Optional[str] = None,
+                               prefix: Optional[str] = None) -> AsyncIterator[str]:
+        """Igual que generate_stream, con el cliente asíncrono de Ollama"""
+        stats = stats if stats is not None else {}
+        inicio = time.perf_counter()
+        emitido = False
+        final = {}
+        
+        def marcar_primer_token():
+            if 'primer_token_s' not in stats:
+                stats['primer_token_s'] = time.perf_counter() - inicio
+        
+        def fallback(motivo: str) -> str:
+            marcar_primer_token()
+            stats['fallback'] = True
+            stats['motivo'] = motivo
+            if fallback_output is not None:
+                return fallback_output
             return self._fallback_simplification(prompt)
+        
+        def restante() -> Optional[float]:
+            if deadline is None:
+                return None
+            return max(deadline - time.perf_counter(), 0.0)
+        
+        if not self.ollama:
+            yield fallback('sin_ollama')
+        elif not self.breaker.allow():
+            yield fallback('circuito_abierto')
+        else:
+            stream = None
+            try:
+                if self._async_client is None:
+                    import ollama
+                    self._async_client = ollama.AsyncClient(host=self.host)
+                
+                contexto = None
+                if prefix is not None:
+                    if deadline is None:
+                        contexto = await asyncio.to_thread(self.prefix_context, prefix)
+                    else:
+                        contexto = self.prefix_context(prefix, wait=False)
+                    if contexto is None:
+                        prompt = prefix + prompt
+                
+                kwargs = {'context': contexto} if contexto else {}
+                stream = await asyncio.wait_for(
+                    self._async_client.generate(
+                        model=self.model,
+                        prompt=prompt,
+                        stream=True,
+                        keep_alive=self.keep_alive,
+                        **kwargs
+                    ),
+                    restante()
+                )
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), restante())
+                    except StopAsyncIteration:
+                        break
+                    self._final_chunk(chunk, final)
+                    token = chunk['response']
+                    if token:
+                        marcar_primer_token()
+                        emitido = True
+                        yield token
+                self.breaker.record_success()
+                self._record_tokens(final, stats)
+            except asyncio.TimeoutError:
+                # El plazo lo pone quien llama: no es un fallo del LLM
+                self.breaker.record_cancelled()
+                print("⏱️ LLM cancelado al vencer el plazo")
+                if emitido:
+                    stats['incompleto'] = True
+                    stats['motivo'] = 'deadline'
+                else:
+                    yield fallback('deadline')
+            except Exception as e:
+                self.breaker.record_failure()
+                if emitido:
+                    print(f"⚠️ Error LLM a mitad de generación: {e}")
+                    stats['incompleto'] = True
+                    stats['motivo'] = 'error'
+                else:
+                    print(f"⚠️ Error LLM: {e}, usando reglas básicas")
+                    yield fallback('error')
+            finally:
+                if stream is not None and hasattr(stream, 'aclose'):
+                    await stream.aclose()
+        
+        stats['total_s'] = time.perf_counter() - inicio
+        self._record_trace(stats, inicio)
     
     def _fallback_simplification(self, prompt: str) -> str:
         """Simplificación básica sin LLM"""
@@ -47,7 +508,7 @@ class LLMHandler:
             if 'TEXTO A SIMPLIFICAR' in line:
                 capturando = True
                 continue
-            if capturando and 'INSTRUCCIONES' in line:
+            if capturando and ('INSTRUCCIONES' in line or 'VERSIÓN SIMPLIFICADA' in line):
                 break
             if capturando:
                 texto += line + "\n"
@@ -55,3 +516,96 @@ class LLMHandler:
         # Aplicar reglas
         rules = SimplificationRules()
         return rules.apply_all_rules(texto.strip())
+
+class FakeOllama:
+    """
+    Cliente de Ollama local y determinista para pruebas y benchmarks sin
+    modelo: responde con las reglas aplicadas al texto del prompt, palabra
+    a palabra, tras first_token_s y con token_s entre fragmentos. Devuelve
+    context y contadores de tokens como Ollama.
+    """
+    
+    def __init__(self, model: str, responder, first_token_s: float = 0.05,
+                 token_s: float = 0.005):
+        self.model = model
+        self.responder = responder
+        self.first_token_s = first_token_s
+        self.token_s = token_s
+    
+    def _respuesta(self, prompt: str, context: Optional[List[int]], options: Optional[Dict]):
+        """Fragmentos de salida, contexto de entrada y tokens evaluados"""
+        fragmentos = re.findall(r'\S+\s*', self.responder(prompt)) or [""]
+        if options and options.get('num_predict'):
+            fragmentos = fragmentos[:options['num_predict']]
+        entrada = list(context or []) + list(range(len(prompt.split())))
+        return fragmentos, entrada, len(prompt.split())
+    
+    def _final(self, entrada: List[int], evaluados: int, fragmentos: List[str]) -> Dict:
+        return {'response': "", 'done': True, 'prompt_eval_count': evaluados,
+                'eval_count': len(fragmentos),
+                'prompt_eval_duration': int(self.first_token_s * 1e9),
+                'eval_duration': int(max(len(fragmentos) - 1, 0) * self.token_s * 1e9),
+                'context': entrada + list(range(len(fragmentos)))}
+    
+    def ps(self) -> Dict:
+        return {'models': [{'model': self.model}]}
+    
+    def generate(self, model: str, prompt: str, stream: bool = False,
+                 keep_alive: Optional[str] = None, context: Optional[List[int]] = None,
+                 options: Optional[Dict] = None):
+        fragmentos, entrada, evaluados = self._respuesta(prompt, context, options)
+        if not stream:
+            return {**self._final(entrada, evaluados, fragmentos), 'response': "".join(fragmentos)}
+        return self._stream(fragmentos, entrada, evaluados)
+    
+    def _stream(self, fragmentos: List[str], entrada: List[int], evaluados: int) -> Iterator[Dict]:
+        time.sleep(self.first_token_s)
+        for i, fragmento in enumerate(fragmentos):
+            if i:
+                time.sleep(self.token_s)
+            yield {'response': fragmento, 'done': False}
+        yield self._final(entrada, evaluados, fragmentos)
+
+class FakeAsyncOllama:
+    """Versión asíncrona de FakeOllama (como ollama.AsyncClient)"""
+    
+    def __init__(self, cliente: FakeOllama):
+        self.cliente = cliente
+    
+    async def generate(self, model: str, prompt: str, stream: bool = False,
+                       keep_alive: Optional[str] = None, context: Optional[List[int]] = None,
+                       options: Optional[Dict] = None):
+        fragmentos, entrada, evaluados = self.cliente._respuesta(prompt, context, options)
+        if not stream:
+            return {**self.cliente._final(entrada, evaluados, fragmentos),
+                    'response': "".join(fragmentos)}
+        return self._stream(fragmentos, entrada, evaluados)
+    
+    async def _stream(self, fragmentos: List[str], entrada: List[int],
+                      evaluados: int) -> AsyncIterator[Dict]:
+        await asyncio.sleep(self.cliente.first_token_s)
+        for i, fragmento in enumerate(fragmentos):
+            if i:
+                await asyncio.sleep(self.cliente.token_s)
+            yield {'response': fragmento, 'done': False}
+        yield self.cliente._final(entrada, evaluados, fragmentos)
+
+class FakeLLM(LLMHandler):
+    """
+    LLMHandler con FakeOllama en lugar de Ollama: todo el camino del
+    handler (plazos, circuito, prefijo precalculado, contadores de tokens)
+    funciona sin red ni modelo. Para el servicio HTTP en local, pruebas y
+    benchmarks.
+    """
+    
+    def __init__(self, model: str = "fake", first_token_s: float = 0.05,
+                 token_s: float = 0.005, **kwargs):
+        self.first_token_s = first_token_s
+        self.token_s = token_s
+        super().__init__(model=model, **kwargs)
+    
+    def _check_ollama(self):
+        self.ollama = FakeOllama(self.model, self._fallback_simplification,
+                                 first_token_s=self.first_token_s, token_s=self.token_s)
+        self._async_client = FakeAsyncOllama(self.ollama)
+        print(f"🧪 LLM simulado (modelo: {self.model})")
@@ -0,0 +1,207 @@
+"""
+División de sentencias largas en secciones
+Permite simplificar cada sección por separado (map) y unir el resultado (reduce)
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List
+
+# Por encima de este tamaño una sección se subdivide
+MAX_SECTION_CHARS = 4000
+
+# Pasajes de consulta: lo que el encoder ve antes de truncar (~128 tokens)
+PASSAGE_CHARS = 500
+MAX_PASSAGES = 32
+
+ENCABEZADOS_RE = re.compile(
+    r'^[ \t]*(ANTECEDENTES\s+DE\s+HECHO|HECHOS\s+PROBADOS|FUNDAMENTOS\s+DE\s+DERECHO'
+    r'|F\s?A\s?L\s?L\s?O|PARTE\s+DISPOSITIVA)[ \t.:]*$',
+    re.MULTILINE
+)
+
+ORDINALES_RE = re.compile(
+    r'^[ \t]*(PRIMERO|SEGUNDO|TERCERO|CUARTO|QUINTO|SEXTO|S[ÉE]PTIMO|OCTAVO|NOVENO'
+    r'|D[ÉE]CIMO|UND[ÉE]CIMO|DUOD[ÉE]CIMO)\b[ \t]*[-–.:)]*',
+    re.MULTILINE
+)
+
+PARRAFO_RE = re.compile(r'\n\s*\n')
+LINEA_RE = re.compile(r'\n')
+FRASE_RE = re.compile(r'(?<=[.;:!?])\s+')
+
+
+def _split_on(pattern: re.Pattern, text: str) -> List[Dict]:
+    """Cortar el texto en cada encabezado; el preámbulo queda con título vacío"""
+    partes = []
+    matches = list(pattern.finditer(text))
+
+    preambulo = text[:matches[0].start()] if matches else text
+    if preambulo.strip():
+        partes.append({'titulo': '', 'texto': preambulo.strip()})
+
+    for i, m in enumerate(matches):
+        fin = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        partes.append({
+            'titulo': m.group(0).strip(),
+            'texto': text[m.end():fin].strip()
+        })
+
+    return partes
+
+
+def _hard_cut(texto: str, max_chars: int) -> List[str]:
+    """Cortar en trozos de como mucho max_chars, por el último espacio si lo hay"""
+    trozos = []
+    while len(texto) > max_chars:
+        corte = texto.rfind(' ', max_chars // 2, max_chars + 1)
+        if corte == -1:
+            corte = max_chars
+        trozos.append(texto[:corte].rstrip())
+        texto = texto[corte:].lstrip()
+    if texto:
+        trozos.append(texto)
+    return trozos
+
+
+def _split_long(parrafo: str, max_chars: int) -> List[str]:
+    """Partir un párrafo de más de max_chars por frases y, si no basta, con un corte duro"""
+    if len(parrafo) <= max_chars:
+        return [parrafo]
+
+    trozos, actual = [], ""
+    for frase in (t for f in FRASE_RE.split(parrafo) for t in _hard_cut(f, max_chars)):
+        if actual and len(actual) + len(frase) + 1 > max_chars:
+            trozos.append(actual)
+            actual = ""
+        actual = f"{actual} {frase}" if actual else frase
+
+    if actual:
+        trozos.append(actual)
+    return trozos
+
+
+def _split_paragraphs(texto: str, max_chars: int) -> List[str]:
+    """
+    Agrupar párrafos (o líneas) en bloques de como mucho max_chars; un
+    párrafo más largo se parte por frases o, en último caso, por caracteres.
+    """
+    parrafos = re.split(r'\n\s*\n', texto)
+    if len(parrafos) == 1:
+        parrafos = texto.split('\n')
+
+    bloques, actual = [], ""
+    for parrafo in (trozo for p in parrafos for trozo in _split_long(p, max_chars)):
+        if actual and len(actual) + len(parrafo) + 1 > max_chars:
+            bloques.append(actual)
+            actual = ""
+        actual = f"{actual}\n{parrafo}" if actual else parrafo
+
+    if actual.strip():
+        bloques.append(actual)
+
+    return bloques
+
+
+def split_sections(text: str, max_chars: int = MAX_SECTION_CHARS) -> List[Dict]:
+    """
+    Dividir una sentencia por su estructura: encabezados principales
+    (ANTECEDENTES DE HECHO, FUNDAMENTOS DE DERECHO, FALLO...), después
+    ordinales (PRIMERO, SEGUNDO...) y, si aún es largo, por párrafos.
+    Devuelve [{'titulo', 'texto'}] en el orden del documento.
+    """
+    secciones = []
+
+    for seccion in _split_on(ENCABEZADOS_RE, text):
+        if len(seccion['texto']) <= max_chars:
+            secciones.append(seccion)
+            continue
+
+        subsecciones = _split_on(ORDINALES_RE, seccion['texto'])
+        for n, sub in enumerate(subsecciones):
+            # El título de la sección va delante de su primer trozo
+            titulo = "\n".join(t for t in (seccion['titulo'] if n == 0 else '', sub['titulo']) if t)
+
+            bloques = _split_paragraphs(sub['texto'], max_chars) if len(sub['texto']) > max_chars else [sub['texto']]
+            for m, bloque in enumerate(bloques):
+                secciones.append({'titulo': titulo if m == 0 else '', 'texto': bloque})
+
+    return [s for s in secciones if s['texto'].strip() or s['titulo']]
+
+
+def _ultimo_corte(text: str) -> int:
+    """
+    Último punto por el que se puede cortar el texto sin partir una
+    sección: encabezado u ordinal y, si no hay, salto de párrafo o de línea.
+    0 si no hay ninguno.
+    """
+    for patrones in ((ENCABEZADOS_RE, ORDINALES_RE), (PARRAFO_RE,), (LINEA_RE,)):
+        cortes = [m.start() for patron in patrones for m in patron.finditer(text) if m.start() > 0]
+        if cortes:
+            return max(cortes)
+    return 0
+
+
+def iter_sections(chunks: Iterable[str], max_chars: int = MAX_SECTION_CHARS) -> Iterator[Dict]:
+    """
+    split_sections incremental sobre texto que llega por partes (páginas).
+    Cuando hay texto suficiente se corta por el último encabezado, ordinal
+    o párrafo y se emiten las secciones anteriores; el resto queda
+    pendiente porque aún puede crecer con las páginas siguientes.
+    """
+    pendiente = ""
+
+    for chunk in chunks:
+        pendiente += chunk
+        if len(pendiente) < 2 * max_chars:
+            continue
+
+        corte = _ultimo_corte(pendiente)
+        if corte:
+            yield from split_sections(pendiente[:corte], max_chars)
+            pendiente = pendiente[corte:]
+
+    if pendiente.strip():
+        yield from split_sections(pendiente, max_chars)
+
+
+def _windows(texto: str, max_chars: int) -> List[str]:
+    """Trozos de como mucho max_chars sin partir palabras"""
+    trozos, actual = [], ""
+    for palabra in texto.split():
+        if actual and len(actual) + len(palabra) + 1 > max_chars:
+            trozos.append(actual)
+            actual = ""
+        actual = f"{actual} {palabra}" if actual else palabra
+    if actual:
+        trozos.append(actual)
+    return trozos
+
+
+def query_passages(text: str, max_chars: int = PASSAGE_CHARS,
+                   max_passages: int = MAX_PASSAGES) -> List[str]:
+    """
+    Pasajes para consultar el índice con todo el documento y no solo con
+    su cabecera: secciones y párrafos de como mucho max_chars. Si salen
+    más de max_passages se toman repartidos por el documento.
+    """
+    pasajes = []
+    for seccion in split_sections(text, max_chars):
+        bloque = "\n".join(t for t in (seccion['titulo'], seccion['texto']) if t)
+        pasajes.extend(_windows(bloque, max_chars) if len(bloque) > max_chars else [bloque])
+
+    pasajes = [p for p in pasajes if p.strip()]
+    if len(pasajes) > max_passages:
+        paso = len(pasajes) / max_passages
+        pasajes = [pasajes[int(i * paso)] for i in range(max_passages)]
+    return pasajes
+
+
+def join_sections(secciones: List[Dict]) -> str:
+    """Unir las secciones simplificadas manteniendo sus títulos"""
+    partes = []
+    for seccion in secciones:
+        bloque = seccion['texto'].strip()
+        if seccion['titulo']:
+            bloque = f"{seccion['titulo']}\n{bloque}" if bloque else seccion['titulo']
+        partes.append(bloque)
+    return "\n\n".join(partes)
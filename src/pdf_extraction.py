@@ -0,0 +1,165 @@
+"""
+Extracción de texto de PDFs
+Páginas en streaming, rangos de páginas en paralelo y caché en disco por hash
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+from src.instrumentation import count, record
+
+# Subir al cambiar cómo se extrae el texto de una página
+EXTRACTION_VERSION = 1
+
+DEFAULT_CACHE_DIR = "data/cache/pdf"
+
+# Por debajo de este número de páginas no compensa arrancar procesos
+PARALLEL_MIN_PAGES = 32
+PAGES_PER_TASK = 16
+
+Fuente = Union[str, Path, bytes, "io.IOBase"]
+
+
+def _pdf_reader():
+    """PdfReader de pypdf o, si no está instalado, de PyPDF2"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        from PyPDF2 import PdfReader
+    return PdfReader
+
+
+def _as_input(source: Fuente) -> Union[str, bytes]:
+    """Ruta (se abre en cada proceso) o bytes del PDF"""
+    if isinstance(source, (str, Path)):
+        return str(source)
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+
+    # Ficheros abiertos y subidas de Streamlit
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+def _open(data: Union[str, bytes]):
+    return _pdf_reader()(data if isinstance(data, str) else io.BytesIO(data))
+
+
+def _extract_range(data: Union[str, bytes], start: int, end: int) -> List[str]:
+    """Texto de las páginas [start, end) (se ejecuta en el pool de procesos)"""
+    pdf = _open(data)
+    return [pdf.pages[n].extract_text() or "" for n in range(start, end)]
+
+
+class PdfTextCache:
+    """Texto por página de cada PDF, indexado por el hash de su contenido"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(data: Union[str, bytes]) -> str:
+        """Hash del contenido, de la librería de PDF y de la versión de extracción"""
+        h = hashlib.sha256()
+        if isinstance(data, str):
+            with open(data, 'rb') as f:
+                for bloque in iter(lambda: f.read(1 << 20), b''):
+                    h.update(bloque)
+        else:
+            h.update(data)
+        h.update(f"\x1e{_pdf_reader().__module__}\x1e{EXTRACTION_VERSION}".encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, clave: str) -> Path:
+        return self.cache_dir / f"{clave}.json"
+
+    def get(self, clave: str) -> Optional[List[str]]:
+        try:
+            return json.loads(self._path(clave).read_text(encoding='utf-8'))['paginas']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, clave: str, paginas: List[str]):
+        destino = self._path(clave)
+        tmp = destino.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'paginas': paginas}, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, destino)
+
+
+def iter_pages(source: Fuente, workers: Optional[int] = None,
+               cache: Optional[PdfTextCache] = None,
+               pages_per_task: int = PAGES_PER_TASK) -> Iterator[str]:
+    """
+    Texto de cada página en orden, según se va decodificando.
+
+    Con workers > 1 y un PDF de al menos PARALLEL_MIN_PAGES páginas, los
+    rangos de pages_per_task páginas se reparten en un pool de procesos y
+    cada rango se emite en cuanto están listos él y los anteriores. Con
+    cache, un PDF ya leído no se vuelve a decodificar; solo se guarda si
+    se llegó a leer entero.
+    """
+    data = _as_input(source)
+    inicio = time.perf_counter()
+
+    clave = None
+    if cache is not None:
+        clave = cache.make_key(data)
+        guardado = cache.get(clave)
+        if guardado is not None:
+            count('cache_pdf_hit')
+            record('extraccion_pdf', time.perf_counter() - inicio, inicio,
+                   paginas=len(guardado), cache=True)
+            yield from guardado
+            return
+        count('cache_pdf_miss')
+
+    pdf = _open(data)
+    total = len(pdf.pages)
+    paginas = []
+    # Solo el tiempo de decodificación, no el que el consumidor tarda en pedir la siguiente
+    decodificando = time.perf_counter() - inicio
+
+    try:
+        if workers and workers > 1 and total >= PARALLEL_MIN_PAGES:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            try:
+                futuros = [
+                    pool.submit(_extract_range, data, start, min(start + pages_per_task, total))
+                    for start in range(0, total, pages_per_task)
+                ]
+                for futuro in futuros:
+                    t0 = time.perf_counter()
+                    textos = futuro.result()
+                    decodificando += time.perf_counter() - t0
+                    for texto in textos:
+                        paginas.append(texto)
+                        yield texto
+            finally:
+                # Si el consumidor deja de leer, no esperar a los rangos pendientes
+                pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            for page in pdf.pages:
+                t0 = time.perf_counter()
+                texto = page.extract_text() or ""
+                decodificando += time.perf_counter() - t0
+                paginas.append(texto)
+                yield texto
+    finally:
+        record('extraccion_pdf', decodificando, inicio, paginas=len(paginas), cache=False)
+
+    if clave is not None:
+        cache.put(clave, paginas)
+
+def extract_text(source: Fuente, workers: Optional[int] = None,
+                 cache: Optional[PdfTextCache] = None) -> str:
+    """Texto completo del PDF"""
+    return "".join(iter_pages(source, workers=workers, cache=cache))
@@ -0,0 +1,146 @@
+"""
+Caché persistente de resultados de simplificación
+SQLite en disco con expulsión LRU por tamaño
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.instrumentation import count
+
+# Tamaño máximo por defecto de la caché en disco
+MAX_BYTES = 256 * 1024 * 1024
+
+
+def normalize_text(texto: str) -> str:
+    """Normalizar espacios para que el mismo documento dé la misma clave"""
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+class ResultCache:
+    """
+    Caché clave → resultado. La clave combina el texto normalizado, el modelo,
+    la versión del prompt (plantilla + reglas) y los IDs de ejemplos recuperados.
+    Con ttl_s, las entradas que llevan más de ttl_s segundos sin usarse caducan.
+    """
+
+    def __init__(self, path: str = "data/cache/resultados.sqlite3", max_bytes: int = MAX_BYTES,
+                 ttl_s: Optional[float] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # timeout: varios procesos (workers de la CLI) pueden compartir el fichero
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            "clave TEXT PRIMARY KEY, valor TEXT NOT NULL, "
+            "bytes INTEGER NOT NULL, ultimo_acceso REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ultimo_acceso ON resultados (ultimo_acceso)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(texto: str, model: str, prompt_version: str, example_ids: List[str]) -> str:
+        """Clave de caché"""
+        h = hashlib.sha256()
+        for parte in (normalize_text(texto), model, prompt_version, "\x1f".join(example_ids)):
+            h.update(parte.encode('utf-8'))
+            h.update(b"\x1e")
+        return h.hexdigest()
+
+    def get(self, clave: str) -> Optional[Dict]:
+        """Resultado guardado o None; actualiza el orden LRU"""
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT valor, ultimo_acceso FROM resultados WHERE clave = ?", (clave,)
+            ).fetchone()
+
+            ahora = time.time()
+            if fila is not None and self.ttl_s is not None and ahora - fila[1] > self.ttl_s:
+                self._conn.execute("DELETE FROM resultados WHERE clave = ?", (clave,))
+                self._conn.commit()
+                fila = None
+
+            if fila is None:
+                self.misses += 1
+                count('cache_resultados_miss')
+                return None
+
+            self.hits += 1
+            count('cache_resultados_hit')
+            self._conn.execute(
+                "UPDATE resultados SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave)
+            )
+            self._conn.commit()
+            return json.loads(fila[0])
+
+    def put(self, clave: str, valor: Dict):
+        """Guardar un resultado y expulsar los menos usados si se supera max_bytes"""
+        datos = json.dumps(valor, ensure_ascii=False)
+        tamano = len(datos.encode('utf-8'))
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resultados (clave, valor, bytes, ultimo_acceso) "
+                "VALUES (?, ?, ?, ?)",
+                (clave, datos, tamano, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl_s is not None:
+            self._conn.execute(
+                "DELETE FROM resultados WHERE ultimo_acceso < ?", (time.time() - self.ttl_s,)
+            )
+
+        total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM resultados").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for clave, tamano in self._conn.execute(
+            "SELECT clave, bytes FROM resultados ORDER BY ultimo_acceso"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM resultados WHERE clave = ?", (clave,))
+            total -= tamano
+
+    def invalidate(self, clave: Optional[str] = None):
+        """Borrar una entrada, o toda la caché si no se indica clave"""
+        with self._lock:
+            if clave is None:
+                self._conn.execute("DELETE FROM resultados")
+            else:
+                self._conn.execute("DELETE FROM resultados WHERE clave = ?", (clave,))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Aciertos, fallos y ocupación"""
+        with self._lock:
+            entradas, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM resultados"
+            ).fetchone()
+
+        consultas = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / consultas if consultas else 0.0,
+            'entradas': entradas,
+            'bytes': total,
+            'max_bytes': self.max_bytes
+        }
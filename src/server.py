@@ -0,0 +1,542 @@
+"""
+Servicio HTTP de Justicia Clara (ASGI, sin framework)
+Expone DualRAGSystem a otras aplicaciones: un motor compartido por proceso
+worker, generaciones del LLM limitadas por semáforo, consultas embebidas en
+micro-lotes y plazo por petición
+
+    POST /simplify   {"texto": ..., "top_k": 3, "use_cendoj": true, "deadline_s": 30}
+    POST /retrieve   {"texto": ..., "top_k": 3, "use_cendoj": true, "mode": "auto"}
+    GET  /health
+    GET  /metrics    (formato de texto de Prometheus; ?format=json para JSON)
+
+Uso:
+    python -m src.server --port 8000 --workers 2
+    python -m src.server --fake-llm        # sin Ollama (FakeLLM), para pruebas
+    uvicorn src.server:app                 # configuración en variables JUSTICIA_*
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from src.encoders import BACKENDS, DEFAULT_BACKEND, QUERY_BATCH_WAIT_MS, BatchingEncoder
+from src.instrumentation import REGISTRY, record
+
+DEFAULT_PORT = 8000
+
+# Generaciones simultáneas del LLM por worker
+LLM_CONCURRENCY = 2
+
+# Peticiones en curso por worker antes de responder 503
+MAX_PENDING = 64
+
+# Plazo de cada petición; el del LLM es menor para poder devolver las reglas
+REQUEST_TIMEOUT_S = 120.0
+LLM_DEADLINE_S = 90.0
+
+MAX_BODY_BYTES = 5 * 1024 * 1024
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Configuración del servicio y variable de entorno de cada opción
+CONFIG_ENV = {
+    'guia': ('JUSTICIA_GUIA', "data/Guia_de_redaccion_judicial_clara.pdf"),
+    'index_dir': ('JUSTICIA_INDEX_DIR', "data/index/cendoj"),
+    'use_cendoj': ('JUSTICIA_USE_CENDOJ', True),
+    'model': ('JUSTICIA_MODEL', "llama2"),
+    'fake_llm': ('JUSTICIA_FAKE_LLM', False),
+    'cache': ('JUSTICIA_CACHE', "data/cache/resultados.sqlite3"),
+    'encoder_backend': ('JUSTICIA_ENCODER_BACKEND', DEFAULT_BACKEND),
+    'llm_concurrency': ('JUSTICIA_LLM_CONCURRENCY', LLM_CONCURRENCY),
+    'query_batch_ms': ('JUSTICIA_QUERY_BATCH_MS', QUERY_BATCH_WAIT_MS),
+    'max_pending': ('JUSTICIA_MAX_PENDING', MAX_PENDING),
+    'request_timeout_s': ('JUSTICIA_REQUEST_TIMEOUT_S', REQUEST_TIMEOUT_S),
+    'deadline_s': ('JUSTICIA_DEADLINE_S', LLM_DEADLINE_S)
+}
+
+
+def config_from_env(**overrides) -> Dict:
+    """Configuración por defecto, variables JUSTICIA_* y overrides, en ese orden"""
+    config = {}
+    for clave, (variable, defecto) in CONFIG_ENV.items():
+        valor = os.environ.get(variable)
+        if valor is None:
+            config[clave] = defecto
+        elif isinstance(defecto, bool):
+            config[clave] = valor.lower() in ('1', 'true', 'yes', 'si', 'sí')
+        elif isinstance(defecto, (int, float)):
+            config[clave] = type(defecto)(valor)
+        else:
+            config[clave] = valor or None
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    return config
+
+
+class HTTPError(Exception):
+    """Error que se devuelve al cliente con su código HTTP"""
+
+    def __init__(self, status: int, mensaje: str):
+        super().__init__(mensaje)
+        self.status = status
+        self.mensaje = mensaje
+
+
+class BoundedLLM:
+    """
+    Cliente LLM con como mucho max_concurrency generaciones a la vez; el
+    resto espera turno. Si el plazo de la petición vence en la cola, se
+    responde con la salida de reglas sin llamar al LLM (motivo 'cola_llm').
+
+    Solo se limita la ruta asíncrona, que es la que usa el servicio; el
+    resto de atributos son los del cliente envuelto.
+    """
+
+    def __init__(self, llm, max_concurrency: int = LLM_CONCURRENCY):
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.activos = 0
+        self.esperando = 0
+        self.sin_turno = 0
+        self._semaforo = None
+
+    def __getattr__(self, nombre):
+        return getattr(self.llm, nombre)
+
+    async def agenerate(self, prompt: str, stats: Optional[Dict] = None,
+                        deadline: Optional[float] = None, fallback_output: Optional[str] = None,
+                        prefix: Optional[str] = None) -> str:
+        return "".join([
+            token async for token in self.agenerate_stream(prompt, stats=stats, deadline=deadline,
+                                                           fallback_output=fallback_output,
+                                                           prefix=prefix)
+        ])
+
+    async def agenerate_stream(self, prompt: str, stats: Optional[Dict] = None,
+                               deadline: Optional[float] = None,
+                               fallback_output: Optional[str] = None,
+                               prefix: Optional[str] = None) -> AsyncIterator[str]:
+        """agenerate_stream del cliente, tras esperar turno hasta el plazo"""
+        stats = stats if stats is not None else {}
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_concurrency)
+
+        inicio = time.perf_counter()
+        restante = None if deadline is None else max(deadline - inicio, 0.0)
+        self.esperando += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), restante)
+        except asyncio.TimeoutError:
+            self.sin_turno += 1
+            espera = time.perf_counter() - inicio
+            stats.update({'fallback': True, 'motivo': 'cola_llm',
+                          'primer_token_s': espera, 'total_s': espera})
+            yield (fallback_output if fallback_output is not None
+                   else self.llm._fallback_simplification(prompt))
+            return
+        finally:
+            self.esperando -= 1
+            record('llm_espera', time.perf_counter() - inicio, inicio)
+
+        self.activos += 1
+        try:
+            async for token in self.llm.agenerate_stream(prompt, stats=stats, deadline=deadline,
+                                                         fallback_output=fallback_output,
+                                                         prefix=prefix):
+                yield token
+        finally:
+            self.activos -= 1
+            self._semaforo.release()
+
+
+class ServiceMetrics:
+    """Contadores y latencias por ruta, en formato de Prometheus"""
+
+    def __init__(self):
+        self.peticiones: Dict[Tuple[str, int], int] = {}
+        self.latencias: Dict[str, List[float]] = {}
+        self.sumas: Dict[str, float] = {}
+        self.niveles: Dict[str, int] = {}
+        self.en_curso = 0
+        self._lock = threading.Lock()
+
+    def observe(self, ruta: str, status: int, segundos: float):
+        with self._lock:
+            self.peticiones[(ruta, status)] = self.peticiones.get((ruta, status), 0) + 1
+            cubos = self.latencias.setdefault(ruta, [0] * (len(LATENCY_BUCKETS) + 1))
+            for i, limite in enumerate(LATENCY_BUCKETS):
+                if segundos <= limite:
+                    cubos[i] += 1
+            cubos[-1] += 1
+            self.sumas[ruta] = self.sumas.get(ruta, 0.0) + segundos
+
+    def nivel(self, nivel: Optional[str]):
+        """Qué produjo cada respuesta de /simplify: cache, llm o reglas"""
+        with self._lock:
+            self.niveles[nivel or 'secciones'] = self.niveles.get(nivel or 'secciones', 0) + 1
+
+    def render(self, extra: Dict[str, float]) -> str:
+        """Texto de /metrics: métricas propias y los valores de extra (gauges)"""
+        lineas = [
+            "# TYPE justicia_requests_total counter",
+            *(f'justicia_requests_total{{route="{ruta}",status="{status}"}} {n}'
+              for (ruta, status), n in sorted(self.peticiones.items())),
+            "# TYPE justicia_request_seconds histogram"
+        ]
+        for ruta, cubos in sorted(self.latencias.items()):
+            for limite, n in zip(LATENCY_BUCKETS, cubos):
+                lineas.append(f'justicia_request_seconds_bucket{{route="{ruta}",le="{limite}"}} {n}')
+            lineas += [
+                f'justicia_request_seconds_bucket{{route="{ruta}",le="+Inf"}} {cubos[-1]}',
+                f'justicia_request_seconds_sum{{route="{ruta}"}} {self.sumas[ruta]:.6f}',
+                f'justicia_request_seconds_count{{route="{ruta}"}} {cubos[-1]}'
+            ]
+        lineas.append("# TYPE justicia_simplify_level_total counter")
+        lineas += [f'justicia_simplify_level_total{{level="{nivel}"}} {n}'
+                   for nivel, n in sorted(self.niveles.items())]
+        lineas.append(f"justicia_requests_in_flight {self.en_curso}")
+        lineas += [f"justicia_{nombre} {valor}" for nombre, valor in extra.items()]
+        return "\n".join(lineas) + "\n"
+
+
+class SimplifierService:
+    """
+    Aplicación ASGI. El DualRAGSystem se crea al arrancar cada worker
+    (lifespan, o la primera petición) y se comparte entre todas sus
+    peticiones; el índice, el encoder y el modelo se cargan en segundo
+    plano y /health responde 503 hasta que están listos.
+
+    Cada petición tiene como mucho request_timeout_s (504 al vencer) y el
+    LLM deadline_s, tras el cual se devuelve la salida de reglas. Con más
+    de max_pending peticiones en curso se responde 503.
+    """
+
+    def __init__(self, config: Optional[Dict] = None, system=None):
+        self.config = config
+        self.system = system
+        self.metrics = ServiceMetrics()
+        self._warmup = None
+        self._error_arranque = None
+        self._lock = threading.Lock()
+
+    def _build_system(self):
+        from src.dual_rag_system import DualRAGSystem
+        from src.result_cache import ResultCache
+
+        config = self.config
+        if config['fake_llm']:
+            from src.llm_handler import FakeLLM
+
+            llm = FakeLLM()
+        else:
+            from src.llm_handler import LLMHandler
+
+            llm = LLMHandler(model=config['model'])
+
+        return DualRAGSystem(
+            guia_path=config['guia'],
+            use_cendoj=config['use_cendoj'],
+            index_dir=config['index_dir'],
+            llm=BoundedLLM(llm, config['llm_concurrency']),
+            result_cache=ResultCache(config['cache']) if config['cache'] else None,
+            latency_budget_s=config['deadline_s'],
+            encoder_backend=config['encoder_backend'],
+            query_batch_ms=config['query_batch_ms']
+        )
+
+    def start(self):
+        """Crear el motor del worker y cargarlo en segundo plano"""
+        with self._lock:
+            if self._warmup is not None:
+                return
+            if self.config is None:
+                self.config = config_from_env()
+            if self.system is None:
+                self.system = self._build_system()
+
+            def cargar():
+                try:
+                    self.system.warmup()
+                except Exception as e:
+                    self._error_arranque = f"{type(e).__name__}: {e}"
+                    print(f"⚠️ Error al cargar el sistema: {self._error_arranque}")
+
+            self._warmup = threading.Thread(target=cargar, daemon=True, name="warmup")
+            self._warmup.start()
+            print(f"🌐 Servicio listo para peticiones (pid {os.getpid()})")
+
+    @property
+    def listo(self) -> bool:
+        return (self._warmup is not None and not self._warmup.is_alive()
+                and self._error_arranque is None)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        self.start()
+        ruta = scope['path'].rstrip('/') or '/'
+        rutas = {
+            ('POST', '/simplify'): self._simplify,
+            ('POST', '/retrieve'): self._retrieve,
+            ('GET', '/health'): self._health,
+            ('GET', '/metrics'): self._metrics
+        }
+        handler = rutas.get((scope['method'], ruta))
+
+        inicio = time.perf_counter()
+        self.metrics.en_curso += 1
+        try:
+            if handler is None:
+                if any(r == ruta for _, r in rutas):
+                    raise HTTPError(405, f"Método {scope['method']} no permitido en {ruta}")
+                raise HTTPError(404, f"Ruta desconocida: {ruta}")
+            if scope['method'] == 'POST' and self.metrics.en_curso > self.config['max_pending']:
+                raise HTTPError(503, "Servicio saturado; inténtalo más tarde")
+
+            if scope['method'] == 'POST':
+                cuerpo = await self._read_json(receive)
+            else:
+                cuerpo = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+            status, respuesta = await asyncio.wait_for(handler(cuerpo),
+                                                       self.config['request_timeout_s'])
+        except HTTPError as e:
+            status, respuesta = e.status, {'error': e.mensaje}
+        except asyncio.TimeoutError:
+            status, respuesta = 504, {'error': f"Sin respuesta en {self.config['request_timeout_s']}s"}
+        except ValueError as e:
+            status, respuesta = 400, {'error': str(e)}
+        except Exception as e:
+            print(f"⚠️ Error en {ruta}: {e}")
+            status, respuesta = 500, {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            self.metrics.en_curso -= 1
+
+        await self._send(send, status, respuesta)
+        if handler is not None:
+            self.metrics.observe(ruta, status, time.perf_counter() - inicio)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                try:
+                    self.start()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_json(receive) -> Dict:
+        partes, tamano = [], 0
+        while True:
+            mensaje = await receive()
+            cuerpo = mensaje.get('body', b'')
+            tamano += len(cuerpo)
+            if tamano > MAX_BODY_BYTES:
+                raise HTTPError(413, f"Cuerpo mayor de {MAX_BODY_BYTES} bytes")
+            partes.append(cuerpo)
+            if not mensaje.get('more_body'):
+                break
+        try:
+            datos = json.loads(b"".join(partes) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "El cuerpo no es JSON válido")
+        if not isinstance(datos, dict):
+            raise HTTPError(400, "El cuerpo debe ser un objeto JSON")
+        return datos
+
+    @staticmethod
+    async def _send(send, status: int, respuesta):
+        if isinstance(respuesta, str):
+            cuerpo, tipo = respuesta.encode('utf-8'), b"text/plain; version=0.0.4; charset=utf-8"
+        else:
+            cuerpo = json.dumps(respuesta, ensure_ascii=False,
+                                default=lambda o: o.item() if hasattr(o, 'item') else str(o)).encode('utf-8')
+            tipo = b"application/json"
+        cabeceras = [(b"content-type", tipo), (b"content-length", str(len(cuerpo)).encode())]
+        if status == 503:
+            cabeceras.append((b"retry-after", b"5"))
+        await send({'type': 'http.response.start', 'status': status, 'headers': cabeceras})
+        await send({'type': 'http.response.body', 'body': cuerpo})
+
+    @staticmethod
+    def _opcion(cuerpo: Dict, nombre: str, tipo, defecto=None):
+        """Campo opcional del cuerpo con su tipo comprobado"""
+        valor = cuerpo.get(nombre, defecto)
+        if valor is None or valor is defecto:
+            return valor
+        if tipo is float and isinstance(valor, int) and not isinstance(valor, bool):
+            valor = float(valor)
+        if not isinstance(valor, tipo) or (tipo is int and isinstance(valor, bool)):
+            raise HTTPError(400, f"'{nombre}' debe ser {tipo.__name__}")
+        return valor
+
+    def _texto(self, cuerpo: Dict) -> str:
+        texto = self._opcion(cuerpo, 'texto', str)
+        if not texto or not texto.strip():
+            raise HTTPError(400, "Falta 'texto'")
+        return texto
+
+    def _busqueda(self, cuerpo: Dict) -> Dict:
+        top_k = self._opcion(cuerpo, 'top_k', int)
+        if top_k is not None and top_k < 1:
+            raise HTTPError(400, "'top_k' debe ser mayor que 0")
+        return {'top_k': top_k, 'use_cendoj': self._opcion(cuerpo, 'use_cendoj', bool)}
+
+    async def _esperar_listo(self):
+        """Las peticiones que llegan durante la carga esperan a que termine"""
+        if not self.listo:
+            await asyncio.to_thread(self._warmup.join)
+            if self._error_arranque:
+                raise HTTPError(503, f"El sistema no pudo cargarse: {self._error_arranque}")
+
+    async def _simplify(self, cuerpo: Dict) -> Tuple[int, Dict]:
+        texto = self._texto(cuerpo)
+        if self._opcion(cuerpo, 'solo_reglas', bool):
+            return 200, self.system.simplificar_reglas(texto)
+
+        deadline_s = self._opcion(cuerpo, 'deadline_s', float, self.config['deadline_s'])
+        if deadline_s is not None:
+            deadline_s = min(deadline_s, self.config['request_timeout_s'])
+
+        await self._esperar_listo()
+        resultado = await self.system.asimplificar(
+            texto,
+            long_mode=self._opcion(cuerpo, 'long_mode', bool),
+            use_cache=self._opcion(cuerpo, 'use_cache', bool, True),
+            deadline_s=deadline_s,
+            **self._busqueda(cuerpo)
+        )
+        self.metrics.nivel(resultado.get('nivel'))
+        return 200, resultado
+
+    async def _retrieve(self, cuerpo: Dict) -> Tuple[int, Dict]:
+        texto = self._texto(cuerpo)
+        await self._esperar_listo()
+
+        busqueda = self._busqueda(cuerpo)
+        cendoj_k = self._opcion(cuerpo, 'cendoj_k', int)
+        if cendoj_k is not None:
+            busqueda['cendoj_k'] = cendoj_k
+
+        inicio = time.perf_counter()
+        resultados = await self.system.aretrieve_hybrid(
+            texto,
+            mode=self._opcion(cuerpo, 'mode', str),
+            fusion=self._opcion(cuerpo, 'fusion', str),
+            **busqueda
+        )
+        return 200, {**resultados, 'segundos': time.perf_counter() - inicio}
+
+    async def _health(self, cuerpo: Dict) -> Tuple[int, Dict]:
+        llm = await asyncio.to_thread(self.system.llm.health)
+        estado = {
+            'ok': self.listo,
+            'estado': 'listo' if self.listo else ('error' if self._error_arranque else 'cargando'),
+            'error': self._error_arranque,
+            'pid': os.getpid(),
+            'llm': llm
+        }
+        return (200 if self.listo else 503), estado
+
+    async def _metrics(self, cuerpo: Dict) -> Tuple[int, str]:
+        """Métricas del servicio y de las etapas del pipeline (src.instrumentation)"""
+        formato = cuerpo.get('format', 'prometheus')
+        if formato not in ('prometheus', 'json'):
+            raise HTTPError(400, "format debe ser prometheus o json")
+        system = self.system
+        llm = system.llm
+        extra = {
+            'embedding_cache_hits_total': system.embedding_cache.hits,
+            'embedding_cache_misses_total': system.embedding_cache.misses
+        }
+        if isinstance(llm, BoundedLLM):
+            extra.update({'llm_active': llm.activos, 'llm_waiting': llm.esperando,
+                          'llm_queue_timeouts_total': llm.sin_turno})
+        tokens = getattr(llm, 'tokens', None)
+        if tokens:
+            extra.update({'llm_requests_total': tokens['peticiones'],
+                          'llm_prompt_tokens_total': tokens['prompt'],
+                          'llm_prefill_saved_tokens_total': tokens['prefill_ahorrado']})
+        if system.result_cache is not None:
+            extra['result_cache_hits_total'] = system.result_cache.hits
+            extra['result_cache_misses_total'] = system.result_cache.misses
+        if self.listo and isinstance(system.encoder, BatchingEncoder):
+            extra['encoder_batches_total'] = system.encoder.lotes
+            extra['encoder_batched_texts_total'] = system.encoder.textos
+        if formato == 'json':
+            return 200, {'servicio': extra, **REGISTRY.to_json()}
+        return 200, self.metrics.render(extra) + REGISTRY.to_prometheus()
+
+
+# Una instancia por proceso: con uvicorn --workers N, un motor por worker
+app = SimplifierService()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de Justicia Clara")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="Procesos worker (cada uno carga su propio motor)")
+    parser.add_argument('--guia', default=None)
+    parser.add_argument('--index-dir', default=None)
+    parser.add_argument('--no-cendoj', action='store_true',
+                        help="No consultar CENDOJ por defecto (cada petición puede pedirlo)")
+    parser.add_argument('--model', default=None, help="Modelo de Ollama")
+    parser.add_argument('--fake-llm', action='store_true',
+                        help="LLM simulado (FakeLLM): sin Ollama, para pruebas")
+    parser.add_argument('--no-cache', action='store_true', help="No usar la caché de resultados")
+    parser.add_argument('--encoder-backend', choices=BACKENDS, default=None)
+    parser.add_argument('--llm-concurrency', type=int, default=None,
+                        help=f"Generaciones simultáneas por worker (por defecto {LLM_CONCURRENCY})")
+    parser.add_argument('--query-batch-ms', type=float, default=None,
+                        help="Ventana de micro-lotes de consultas al encoder")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help=f"Segundos máximos por petición (por defecto {REQUEST_TIMEOUT_S:.0f})")
+    parser.add_argument('--deadline', type=float, default=None,
+                        help=f"Plazo del LLM; al vencer se usan las reglas (por defecto {LLM_DEADLINE_S:.0f})")
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("⚠️ uvicorn no está instalado (pip install uvicorn)")
+        return 1
+
+    # Los workers importan src.server:app y leen la configuración del entorno
+    opciones = {
+        'guia': args.guia,
+        'index_dir': args.index_dir,
+        'use_cendoj': False if args.no_cendoj else None,
+        'model': args.model,
+        'fake_llm': True if args.fake_llm else None,
+        'cache': "" if args.no_cache else None,
+        'encoder_backend': args.encoder_backend,
+        'llm_concurrency': args.llm_concurrency,
+        'query_batch_ms': args.query_batch_ms,
+        'request_timeout_s': args.timeout,
+        'deadline_s': args.deadline
+    }
+    for clave, valor in opciones.items():
+        if valor is not None:
+            os.environ[CONFIG_ENV[clave][0]] = str(valor)
+
+    uvicorn.run("src.server:app", host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
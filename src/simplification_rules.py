@@ -2,13 +2,454 @@
 9 Reglas de Simplificación
 """
 
+import itertools
 import re
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+MESES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+         'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+LISTAS_RE = re.compile(r'(\d+\).*?),\s*(\d+\))')
+FECHA_RE = r'(\d{1,2})/(\d{1,2})/(\d{4})'
+FECHA_COMPILADA = re.compile(FECHA_RE)
+
+# Clave del trie para los espacios que admiten \s+ (saludos)
+_ESPACIOS = ' +'
+
+
+def _clave(texto: str, flexibles: bool) -> str:
+    """Término en minúsculas (y con los espacios normalizados si admiten \\s+)"""
+    return ' '.join(texto.split()).lower() if flexibles else texto.lower()
+
+
+def _trie_insert(trie: Dict, clave: str, valor):
+    nodo = trie
+    for caracter in clave:
+        nodo = nodo.setdefault(caracter, {})
+    nodo.setdefault('', []).append(valor)
+
+
+def _trie_prefixes(trie: Dict, texto: str, inicio: int = 0) -> Iterator:
+    """Valores de las claves del trie que son prefijo de texto[inicio:]"""
+    nodo = trie
+    for caracter in texto[inicio:]:
+        nodo = nodo.get(caracter)
+        if nodo is None:
+            return
+        yield from nodo.get('', ())
+
+
+def _limite(text: str, i: int) -> bool:
+    """Equivalente a \\b en la posición i"""
+    antes = i > 0 and (text[i - 1].isalnum() or text[i - 1] == '_')
+    despues = i < len(text) and (text[i].isalnum() or text[i] == '_')
+    return antes != despues
+
 
 class SimplificationRules:
-    """Implementación de las 9 reglas oficiales"""
+    """
+    Implementación de las 9 reglas oficiales.
+    
+    apply_all_rules reescribe el texto recorriéndolo una vez por pasada
+    (normalmente una): las sustituciones literales (fechas, saludos,
+    terminología y verbos, más el glosario cargado) se localizan con una
+    expresión compilada. Solo se abre otra pasada cuando el reemplazo de
+    una regla puede formar un término de una regla posterior. Las
+    coincidencias que se solapan se resuelven como en
+    apply_all_rules_sequential, que conserva la implementación regla a
+    regla como referencia: gana la regla anterior y, dentro de una regla,
+    el término que va antes.
+    """
+    
+    MAYUSCULAS = ['VISTO', 'CONSIDERANDO', 'FALLO', 'ANTECEDENTES']
+    
+    SALUDOS = {
+        'Excelentísimo Señor': 'Señor',
+        'Ilustrísimo Señor': 'Señor',
+    }
+    
+    TERMINOS = {
+        'de conformidad con': 'según',
+        'a tenor de': 'según',
+        'en virtud de': 'por',
+    }
+    
+    VERBOS = {
+        'hubiere': 'haya',
+        'fuere': 'sea',
+    }
+    
+    # Matcher de las reglas por defecto, compartido entre instancias
+    _matcher_por_defecto = None
+    
+    def __init__(self, glossary_path: Optional[str] = None):
+        """
+        glossary_path: glosario adicional con líneas "término => reemplazo"
+        bajo secciones [terminologia] o [verbos].
+        """
+        self.glosario_terminos: Dict[str, str] = {}
+        self.glosario_verbos: Dict[str, str] = {}
+        
+        if glossary_path:
+            self.glosario_terminos, self.glosario_verbos = self.load_glossary(glossary_path)
+            self._matcher = self._compile()
+        else:
+            if SimplificationRules._matcher_por_defecto is None:
+                SimplificationRules._matcher_por_defecto = self._compile()
+            self._matcher = SimplificationRules._matcher_por_defecto
+    
+    @staticmethod
+    def load_glossary(path: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Leer un glosario "término => reemplazo" por secciones"""
+        secciones = {'terminologia': {}, 'verbos': {}}
+        actual = secciones['terminologia']
+        
+        for linea in Path(path).read_text(encoding='utf-8').splitlines():
+            linea = linea.strip()
+            if not linea or linea.startswith('#'):
+                continue
+            if linea.startswith('[') and linea.endswith(']'):
+                actual = secciones.setdefault(linea[1:-1].strip().lower(), {})
+                continue
+            if '=>' in linea:
+                termino, reemplazo = (p.strip() for p in linea.split('=>', 1))
+                if termino:
+                    actual[termino] = reemplazo
+        
+        return secciones['terminologia'], secciones['verbos']
+    
+    # ------------------------------------------------------------------
+    # Matcher de una sola pasada
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _alternation(literales: List[str], espacios_flexibles: bool = False,
+                     agrupar: bool = True) -> str:
+        """
+        Alternativa de literales factorizada como trie (prefijos comunes
+        compartidos), de modo que el coste por posición no crece con el
+        número de términos. Con espacios_flexibles los espacios admiten \\s+.
+        Sin agrupar, el primer nivel queda suelto (a...|b...): re solo salta
+        directamente a las posiciones candidatas si cada alternativa empieza
+        por un carácter literal.
+        """
+        trie = {}
+        for literal in literales:
+            nodo = trie
+            for caracter in (' '.join(literal.split()) if espacios_flexibles else literal):
+                nodo = nodo.setdefault(caracter, {})
+            nodo[''] = {}
+        
+        def construir(nodo: Dict, raiz: bool = False) -> str:
+            final = '' in nodo
+            ramas = [
+                (r'\s+' if caracter == ' ' and espacios_flexibles else re.escape(caracter)) + construir(hijo)
+                for caracter, hijo in sorted(nodo.items()) if caracter
+            ]
+            if not ramas:
+                return ''
+            if raiz and not agrupar:
+                return '|'.join(ramas)
+            if len(ramas) == 1 and not final:
+                return ramas[0]
+            return '(?:' + '|'.join(ramas) + ')' + ('?' if final else '')
+        
+        return construir(trie, raiz=True)
+    
+    def _compile(self) -> Tuple:
+        """
+        Compilar las reglas: la expresión de las mayúsculas (solo cambian de
+        caja, así que van primero sin afectar al resto) y las pasadas de las
+        demás reglas literales, normalmente una.
+        """
+        terminos_palabra = {k: v for k, v in self.glosario_terminos.items() if k not in self.TERMINOS}
+        verbos = {**self.VERBOS, **self.glosario_verbos}
+        
+        # (literal, reemplazo, \b en los extremos, espacios \s+) en orden de
+        # prioridad; None es la regla de fechas
+        literales = [None]
+        literales += [(k, v, False, True) for k, v in self.SALUDOS.items()]
+        literales += [(k, v, True, False) for k, v in self.TERMINOS.items()]
+        literales += [(k, v, True, False) for k, v in terminos_palabra.items()]
+        literales += [(k, v, True, False) for k, v in verbos.items()]
+        
+        pasadas, inicio = [], 0
+        for corte in self._cascades(literales) + [len(literales) - 1]:
+            if corte >= inicio:
+                pasadas.append(self._compile_pass(literales, inicio, corte + 1))
+                inicio = corte + 1
+        
+        mayusculas = re.compile(r'\b(?:' + self._alternation(self.MAYUSCULAS) + r')\b')
+        return mayusculas, pasadas
+    
+    def _compile_pass(self, literales: List, desde: int, hasta: int) -> Dict:
+        """
+        Pasada de las reglas literales[desde:hasta]: un prefiltro sin grupos
+        ni \\b que localiza las posiciones candidatas en el texto en
+        minúsculas, la expresión que identifica la regla en cada una, una
+        tabla de reemplazos por tipo de término y, para las coincidencias
+        que pueden solaparse con otra candidata, un trie con la prioridad
+        de cada término.
+        """
+        trie, prioridad_fecha = {}, None
+        por_tipo: Dict[Tuple, Dict[str, str]] = {}
+        terminos = []
+        
+        for prioridad in range(desde, hasta):
+            if literales[prioridad] is None:
+                prioridad_fecha = prioridad
+                continue
+            literal, reemplazo, limites, flexibles = literales[prioridad]
+            clave = _clave(literal, flexibles)
+            por_tipo.setdefault((limites, flexibles), {}).setdefault(clave, reemplazo)
+            terminos.append((clave, limites))
+            
+            nodo = trie
+            for caracter in clave:
+                nodo = nodo.setdefault(_ESPACIOS if flexibles and caracter == ' ' else caracter, {})
+            nodo.setdefault('', []).append((prioridad, reemplazo, limites))
+        
+        partes, tablas, prefiltro = [], {}, []
+        if prioridad_fecha is not None:
+            partes.append('(?P<fecha>' + FECHA_RE.replace('(', '(?:') + ')')
+            prefiltro.append(FECHA_RE.replace('(', '').replace(')', ''))
+        for flexibles in (False, True):
+            claves = [c for (_, f), tabla in por_tipo.items() if f == flexibles for c in tabla]
+            if claves:
+                prefiltro.append(self._alternation(claves, espacios_flexibles=flexibles, agrupar=False))
+        for i, ((limites, flexibles), tabla) in enumerate(por_tipo.items()):
+            patron = self._alternation(list(tabla), espacios_flexibles=flexibles)
+            if limites:
+                patron = r'\b(?:' + patron + r')\b'
+            partes.append(f'(?P<t{i}>{patron})')
+            tablas[f't{i}'] = (flexibles, tabla)
+        
+        riesgo, fecha_riesgo = self._overlaps(terminos, prioridad_fecha is not None)
+        return {
+            'prefiltro': re.compile('|'.join(prefiltro)),
+            'patron': re.compile('|'.join(partes)),
+            'tablas': tablas,
+            'trie': trie,
+            'fecha': prioridad_fecha,
+            'riesgo': riesgo,
+            'fecha_riesgo': fecha_riesgo
+        }
+    
+    @staticmethod
+    def _overlaps(terminos: List[Tuple[str, bool]], con_fecha: bool) -> Tuple[set, bool]:
+        """
+        Términos (clave, \\b en los extremos) cuya coincidencia puede
+        solaparse con otra candidata: otro término que empieza en la misma
+        posición o dentro de ella, o una fecha. Solo esas coincidencias se
+        resuelven con todas sus candidatas. Devuelve también si las fechas
+        tienen ese riesgo.
+        """
+        por_prefijo: Dict[str, List[int]] = {}
+        trie = {}
+        for k, (clave, _) in enumerate(terminos):
+            _trie_insert(trie, clave, k)
+            for j in range(1, len(clave) + 1):
+                por_prefijo.setdefault(clave[:j], []).append(k)
+        
+        def limite(a: str, b: str) -> bool:
+            return (a.isalnum() or a == '_') != (b.isalnum() or b == '_')
+        
+        def compatibles(c: str, limites: bool, j: int, otro: int) -> bool:
+            """¿Pueden coincidir a la vez c y el término otro, que empieza en c[j]?"""
+            m, limites_m = terminos[otro]
+            if limites_m and j > 0 and not limite(c[j - 1], c[j]):
+                return False
+            fin = j + len(m)
+            if fin > len(c):
+                return not (limites and not limite(c[-1], m[len(c) - j]))
+            if fin < len(c):
+                return not (limites_m and not limite(c[fin - 1], c[fin]))
+            return True
+        
+        riesgo = set()
+        for k, (c, limites) in enumerate(terminos):
+            if con_fecha and any(caracter.isdigit() or caracter == '/' for caracter in c):
+                riesgo.add(c)
+                continue
+            for j in range(len(c)):
+                # Términos que empiezan en c[j] y acaban fuera de c o dentro
+                otros = itertools.chain(por_prefijo.get(c[j:], ()), _trie_prefixes(trie, c, j))
+                if any(o != k and compatibles(c, limites, j, o) for o in otros):
+                    riesgo.add(c)
+                    break
+        
+        fecha_riesgo = con_fecha and any(caracter.isdigit() or caracter == '/'
+                                         for clave, _ in terminos for caracter in clave)
+        return riesgo, fecha_riesgo
+    
+    @staticmethod
+    def _cascades(literales: List) -> List[int]:
+        """
+        Reglas cuyo reemplazo puede formar, junto al texto de alrededor, una
+        coincidencia de una regla posterior. En "Ilustrísimo Excelentísimo
+        Señor" el primer saludo deja "Ilustrísimo Señor", que la versión regla
+        a regla también reemplaza; las reglas posteriores a una de estas van
+        en otra pasada sobre el texto ya reescrito. La comprobación es
+        conservadora: puede cortar de más, nunca de menos.
+        """
+        def es_palabra(caracter: str) -> bool:
+            return caracter.isalnum() or caracter == '_'
+        
+        todos = '\x00'.join(_clave(entrada[0], True) for entrada in literales if entrada)
+        prefijos, sufijos, completos, posteriores = set(), set(), {}, []
+        con_digitos = False
+        cortes = []
+        
+        def contiene_termino(texto: str) -> bool:
+            return any(any(True for _ in _trie_prefixes(completos, texto, a)) for a in range(len(texto)))
+        
+        for i in reversed(range(len(literales))):
+            entrada = literales[i]
+            if entrada is None:
+                # La fecha reescrita empieza y acaba en dígitos
+                if con_digitos or any(contiene_termino(f" de {mes} de ") for mes in MESES):
+                    cortes.append(i)
+                continue
+            
+            literal, reemplazo = entrada[0], entrada[1]
+            r = _clave(reemplazo, True)
+            if posteriores and (
+                not r
+                or es_palabra(r[0]) != es_palabra(literal[0])
+                or es_palabra(r[-1]) != es_palabra(literal[-1])
+                or any(r[j:] in prefijos for j in range(len(r)))
+                or any(r[:j] in sufijos for j in range(1, len(r) + 1))
+                or contiene_termino(r)
+                or (r in todos and any(r in otro for otro in posteriores))
+            ):
+                cortes.append(i)
+            
+            c = _clave(literal, True)
+            prefijos.update(c[:j] for j in range(1, len(c) + 1))
+            sufijos.update(c[j:] for j in range(len(c)))
+            _trie_insert(completos, c, i)
+            posteriores.append(c)
+            con_digitos = con_digitos or any(caracter.isdigit() for caracter in c)
+        
+        return sorted(cortes)
+    
+    def _candidates(self, bajo: str, inicio: int, pasada: Dict) -> Iterator[Tuple[int, int, Optional[str]]]:
+        """(fin, prioridad, reemplazo) de cada regla de la pasada que coincide en inicio del texto en minúsculas"""
+        if pasada['fecha'] is not None and bajo[inicio].isdigit():
+            fecha = FECHA_COMPILADA.match(bajo, inicio)
+            if fecha:
+                yield fecha.end(), pasada['fecha'], None
+        
+        pendientes = [(pasada['trie'], inicio)]
+        while pendientes:
+            nodo, i = pendientes.pop()
+            for prioridad, reemplazo, limites in nodo.get('', ()):
+                if not limites or (_limite(bajo, inicio) and _limite(bajo, i)):
+                    yield i, prioridad, reemplazo
+            
+            if i == len(bajo):
+                continue
+            siguiente = nodo.get(bajo[i])
+            if siguiente is not None:
+                pendientes.append((siguiente, i + 1))
+            if _ESPACIOS in nodo and bajo[i].isspace():
+                j = i + 1
+                while j < len(bajo) and bajo[j].isspace():
+                    j += 1
+                pendientes.append((nodo[_ESPACIOS], j))
     
     def apply_all_rules(self, text: str) -> str:
         """Aplicar todas las reglas"""
+        mayusculas, pasadas = self._matcher
+        
+        result = self.rule_1_lists(text)
+        result = mayusculas.sub(lambda match: match.group(0).capitalize(), result)
+        for pasada in pasadas:
+            result = self._apply_pass(result, pasada)
+        return result
+    
+    def _apply_pass(self, text: str, pasada: Dict) -> str:
+        prefiltro, patron = pasada['prefiltro'], pasada['patron']
+        partes, anterior = [], 0
+        
+        # Sin (?i): la búsqueda sobre el texto en minúsculas es bastante más rápida
+        bajo = text.lower()
+        if len(bajo) != len(text):
+            bajo = ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        
+        pista = prefiltro.search(bajo)
+        while pista:
+            inicio = pista.start()
+            match = patron.match(bajo, inicio)
+            if match is None:
+                # El prefiltro no comprueba \b
+                pista = prefiltro.search(bajo, inicio + 1)
+                continue
+            
+            fin, reemplazo = match.end(), None
+            if match.lastgroup == 'fecha':
+                segura = not pasada['fecha_riesgo']
+            else:
+                flexibles, tabla = pasada['tablas'][match.lastgroup]
+                clave = ' '.join(match.group(0).split()) if flexibles else match.group(0)
+                reemplazo = tabla.get(clave)
+                segura = reemplazo is not None and clave not in pasada['riesgo']
+            
+            if segura:
+                elegidos = [(inicio, fin, 0, reemplazo)]
+                pista = prefiltro.search(bajo, fin)
+            else:
+                # Todas las candidatas que se solapan con esta, resueltas por prioridad
+                grupo = [(inicio, f, p, r) for f, p, r in self._candidates(bajo, inicio, pasada)]
+                fin = max((c[1] for c in grupo), default=inicio + 1)
+                pista = prefiltro.search(bajo, inicio + 1)
+                while pista and pista.start() < fin:
+                    q = pista.start()
+                    for f, p, r in self._candidates(bajo, q, pasada):
+                        grupo.append((q, f, p, r))
+                        fin = max(fin, f)
+                    pista = prefiltro.search(bajo, q + 1)
+                elegidos = sorted(self._resolve(grupo))
+            
+            for i, f, _, r in elegidos:
+                partes.append(text[anterior:i])
+                partes.append(self._replace_date(text[i:f]) if r is None else r)
+                anterior = f
+        
+        partes.append(text[anterior:])
+        return "".join(partes)
+    
+    @staticmethod
+    def _resolve(grupo: List[Tuple]) -> List[Tuple]:
+        """
+        Coincidencias que se aplican de un grupo de solapadas, como en la
+        versión regla a regla: por orden de regla y de término, y cada
+        término de izquierda a derecha.
+        """
+        if len(grupo) <= 1:
+            return grupo
+        elegidos = []
+        for candidato in sorted(grupo, key=lambda c: (c[2], c[0])):
+            inicio, fin = candidato[0], candidato[1]
+            if all(fin <= e[0] or e[1] <= inicio for e in elegidos):
+                elegidos.append(candidato)
+        return elegidos
+    
+    @staticmethod
+    def _replace_date(fecha: str) -> str:
+        day, month, year = fecha.split('/')
+        month_idx = int(month) - 1
+        if 0 <= month_idx < 12:
+            return f"{int(day)} de {MESES[month_idx]} de {year}"
+        return fecha
+    
+    # ------------------------------------------------------------------
+    # Implementación regla a regla (referencia)
+    # ------------------------------------------------------------------
+    
+    def apply_all_rules_sequential(self, text: str) -> str:
+        """Aplicar todas las reglas, una pasada por regla"""
         result = text
         result = self.rule_1_lists(result)
         result = self.rule_2_capitals(result)
@@ -23,13 +464,12 @@ class SimplificationRules:
     
     def rule_1_lists(self, text: str) -> str:
         """Listas verticales"""
-        text = re.sub(r'(\d+\).*?),\s*(\d+\))', r'\1\n\2', text)
+        text = LISTAS_RE.sub(r'\1\n\2', text)
         return text
     
     def rule_2_capitals(self, text: str) -> str:
         """Mayúsculas innecesarias"""
-        words = ['VISTO', 'CONSIDERANDO', 'FALLO', 'ANTECEDENTES']
-        for word in words:
+        for word in self.MAYUSCULAS:
             pattern = r'\b' + word + r'\b'
             replacement = word.capitalize()
             text = re.sub(pattern, replacement, text)
@@ -37,17 +477,10 @@ class SimplificationRules:
     
     def rule_3_dates(self, text: str) -> str:
         """Fechas legibles"""
-        months = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
-                 'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
-        
         def replace_date(match):
-            day, month, year = match.groups()
-            month_idx = int(month) - 1
-            if 0 <= month_idx < 12:
-                return f"{int(day)} de {months[month_idx]} de {year}"
-            return match.group(0)
+            return self._replace_date(match.group(0))
         
-        text = re.sub(r'(\d{1,2})/(\d{1,2})/(\d{4})', replace_date, text)
+        text = re.sub(FECHA_RE, replace_date, text)
         return text
     
     def rule_4_legal_refs(self, text: str) -> str:
@@ -57,24 +490,19 @@ class SimplificationRules:
     
     def rule_5_greetings(self, text: str) -> str:
         """Saludos modernos"""
-        replacements = {
-            r'Excelentísimo\s+Señor': 'Señor',
-            r'Ilustrísimo\s+Señor': 'Señor',
-        }
-        for pattern, replacement in replacements.items():
+        for literal, replacement in self.SALUDOS.items():
+            pattern = r'\s+'.join(re.escape(p) for p in literal.split())
             text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
         return text
     
     def rule_6_terminology(self, text: str) -> str:
         """Terminología clara"""
-        terms = {
-            r'de conformidad con': 'según',
-            r'a tenor de': 'según',
-            r'en virtud de': 'por',
-        }
+        # Solo palabras completas: "de conformidad CONSIDERANDO" no contiene "de conformidad con"
+        for literal, replacement in self.TERMINOS.items():
+            text = re.sub(r'\b' + re.escape(literal) + r'\b', replacement, text, flags=re.IGNORECASE)
         
-        for pattern, replacement in terms.items():
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+        for literal, replacement in self.glosario_terminos.items():
+            text = re.sub(r'\b' + re.escape(literal) + r'\b', replacement, text, flags=re.IGNORECASE)
         
         return text
     
@@ -90,12 +518,7 @@ class SimplificationRules:
     
     def rule_9_verbs(self, text: str) -> str:
         """Verbos modernos"""
-        verbs = {
-            r'\bhubiere\b': 'haya',
-            r'\bfuere\b': 'sea',
-        }
-        
-        for pattern, replacement in verbs.items():
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+        for literal, replacement in {**self.VERBOS, **self.glosario_verbos}.items():
+            text = re.sub(r'\b' + re.escape(literal) + r'\b', replacement, text, flags=re.IGNORECASE)
         
         return text
@@ -2,17 +2,17 @@
 Utilidades
 """
 
-import PyPDF2
+import hashlib
 from pathlib import Path
+from typing import Optional
 
-def extract_text_from_pdf(file) -> str:
+from src.pdf_extraction import PdfTextCache, extract_text
+
+def extract_text_from_pdf(file, workers: Optional[int] = None,
+                          cache: Optional[PdfTextCache] = None) -> str:
     """Extraer texto de PDF"""
     try:
-        pdf = PyPDF2.PdfReader(file)
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text()
-        return text
+        return extract_text(file, workers=workers, cache=cache)
     except Exception as e:
         raise Exception(f"Error extrayendo PDF: {e}")
 
@@ -21,3 +21,11 @@ def save_output(text: str, output_path: Path):
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(text)
+
+def file_sha256(path, chunk_size: int = 1 << 20) -> str:
+    """Hash SHA-256 del contenido de un fichero"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(chunk_size), b''):
+            h.update(bloque)
+    return h.hexdigest()
@@ -0,0 +1,260 @@
+"""
+Almacén de vectores exacto con NumPy
+Alternativa a una colección de Chroma para colecciones pequeñas (la Guía):
+matriz normalizada en memoria o mapeada desde disco, top-k con un producto
+matriz-vector y argpartition
+"""
+
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.json"
+
+STORES = ('chroma', 'numpy')
+
+
+class NumpyVectorStore:
+    """
+    Colección con la parte de la API de Chroma que usa DualRAGSystem
+    (upsert, query, get, count) y distancia coseno como "hnsw:space":
+    "cosine".
+
+    Con path, los vectores se guardan en path/vectors.npy y se abren con
+    mmap, de modo que varios procesos comparten las mismas páginas. upsert
+    y delete solo cambian la memoria: flush reescribe los ficheros de forma
+    atómica (quien indexa lo llama al acabar o en cada checkpoint).
+
+    Las escrituras no modifican nada que una consulta pueda estar leyendo:
+    construyen listas nuevas y las publican juntas bajo el lock, y las filas
+    nuevas se escriben en la parte de la matriz que aún no es visible (con
+    capacidad que crece al doble, sin copiarla entera en cada upsert).
+    dtype float16 reduce
+    a la mitad el disco y las páginas compartidas; los productos se hacen
+    en float32, sobre una copia que se convierte una sola vez por matriz
+    (no en cada consulta).
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, dtype: str = 'float32',
+                 mmap: bool = True):
+        self.name = name
+        self.path = Path(path) if path else None
+        self.dtype = np.dtype(dtype)
+        # _lock protege la publicación del estado; _escritura ordena a los escritores
+        self._lock = threading.Lock()
+        self._escritura = threading.Lock()
+        self._pendiente = False
+
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._posicion: Dict[str, int] = {}
+        self._vectores = np.zeros((0, 0), dtype=self.dtype)
+        # Matriz con capacidad de sobra; _vectores es la vista de sus filas en uso
+        self._buffer = None
+        # (matriz, su copia float32): se rehace cuando cambia la matriz
+        self._float32 = None
+
+        if self.path and (self.path / VECTORS_FILE).exists():
+            self._load(mmap)
+
+    def _load(self, mmap: bool):
+        datos = json.loads((self.path / DOCS_FILE).read_text(encoding='utf-8'))
+        self._ids = datos['ids']
+        self._documents = datos['documents']
+        self._metadatas = datos['metadatas']
+        self._posicion = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._vectores = np.load(self.path / VECTORS_FILE, mmap_mode='r' if mmap else None)
+        self.dtype = self._vectores.dtype
+
+    def _snapshot(self):
+        """(vectores, ids, documentos, metadatas) de un mismo estado"""
+        with self._lock:
+            return self._vectores, self._ids, self._documents, self._metadatas
+
+    def _publish(self, vectores: np.ndarray, ids: List[str], documents: List[str],
+                 metadatas: List[Dict], posicion: Dict[str, int]):
+        with self._lock:
+            self._vectores = vectores
+            self._ids = ids
+            self._documents = documents
+            self._metadatas = metadatas
+            self._posicion = posicion
+            self._pendiente = True
+
+    def flush(self):
+        """Escribir vectores y documentos si han cambiado (los procesos con mmap siguen leyendo los anteriores)"""
+        with self._escritura:
+            if not self.path or not self._pendiente:
+                return
+            vectores, ids, documents, metadatas = self._snapshot()
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            tmp = self.path / (VECTORS_FILE + ".tmp")
+            with open(tmp, 'wb') as f:
+                np.save(f, vectores)
+            os.replace(tmp, self.path / VECTORS_FILE)
+
+            tmp = self.path / (DOCS_FILE + ".tmp")
+            tmp.write_text(json.dumps({
+                'ids': ids,
+                'documents': documents,
+                'metadatas': metadatas
+            }, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp, self.path / DOCS_FILE)
+            self._pendiente = False
+
+    @staticmethod
+    def _normalize(vectores) -> np.ndarray:
+        vectores = np.asarray(vectores, dtype=np.float32)
+        if vectores.ndim == 1:
+            vectores = vectores[None, :]
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        return vectores / np.clip(normas, 1e-12, None)
+
+    def _as_float32(self, vectores: np.ndarray) -> np.ndarray:
+        """Vista float32 de vectores (la misma matriz si ya lo es)"""
+        if vectores.dtype == np.float32:
+            return vectores
+        cache = self._float32
+        if cache is None or cache[0] is not vectores:
+            cache = (vectores, vectores.astype(np.float32))
+            self._float32 = cache
+        return cache[1]
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def _with_rows(self, nuevos: np.ndarray) -> np.ndarray:
+        """
+        Vista de la matriz actual con las filas nuevas al final. Se escriben
+        tras las filas visibles del buffer; si no caben (o la matriz viene
+        del mmap, de solo lectura) se pasa a un buffer del doble de tamaño.
+        """
+        actual = self._vectores
+        total = len(actual) + len(nuevos)
+        buffer = self._buffer
+        if buffer is None or len(buffer) < total or buffer.shape[1] != nuevos.shape[1]:
+            buffer = np.empty((max(total, 2 * len(actual), 16), nuevos.shape[1]), dtype=self.dtype)
+            if len(actual):
+                buffer[:len(actual)] = actual
+            self._buffer = buffer
+        buffer[len(actual):total] = nuevos
+        return buffer[:total]
+
+    def upsert(self, embeddings, documents: List[str], metadatas: List[Dict], ids: List[str]):
+        """Insertar o sustituir filas por id"""
+        nuevos = self._normalize(embeddings).astype(self.dtype)
+
+        with self._escritura:
+            ids_actuales = self._ids
+            documentos = list(self._documents)
+            metadatas_nuevas = list(self._metadatas)
+            posicion = dict(self._posicion)
+            sustituidos = {}
+            anadidos = []
+
+            for vector, documento, metadata, doc_id in zip(nuevos, documents, metadatas, ids):
+                fila = posicion.get(doc_id)
+                if fila is not None and fila < len(ids_actuales):
+                    sustituidos[fila] = vector
+                    documentos[fila] = documento
+                    metadatas_nuevas[fila] = metadata
+                    continue
+                if fila is not None:
+                    # Repetido dentro del mismo upsert: gana el último
+                    anadidos[fila - len(ids_actuales)] = (doc_id, vector)
+                    documentos[fila] = documento
+                    metadatas_nuevas[fila] = metadata
+                    continue
+
+                posicion[doc_id] = len(documentos)
+                documentos.append(documento)
+                metadatas_nuevas.append(metadata)
+                anadidos.append((doc_id, vector))
+
+            vectores = self._vectores
+            if sustituidos:
+                # Cambiar filas visibles obliga a copiar la matriz
+                vectores = np.array(vectores)
+                for fila, vector in sustituidos.items():
+                    vectores[fila] = vector
+                self._buffer = None
+            if anadidos:
+                if not sustituidos:
+                    vectores = self._with_rows(np.stack([vector for _, vector in anadidos]))
+                else:
+                    vectores = np.concatenate([vectores, np.stack([vector for _, vector in anadidos])])
+
+            self._publish(vectores, ids_actuales + [doc_id for doc_id, _ in anadidos],
+                          documentos, metadatas_nuevas, posicion)
+
+    add = upsert
+
+    def delete(self, ids: List[str]):
+        """Quitar filas por id (los que no están se ignoran)"""
+        with self._escritura:
+            borrar = {self._posicion[i] for i in ids if i in self._posicion}
+            if not borrar:
+                return
+
+            quedan = [fila for fila in range(len(self._ids)) if fila not in borrar]
+            nuevos_ids = [self._ids[fila] for fila in quedan]
+            self._buffer = None
+            self._publish(np.asarray(self._vectores[quedan]), nuevos_ids,
+                          [self._documents[fila] for fila in quedan],
+                          [self._metadatas[fila] for fila in quedan],
+                          {doc_id: i for i, doc_id in enumerate(nuevos_ids)})
+
+    def query(self, query_embeddings, n_results: int = 10) -> Dict:
+        """Los n_results más cercanos a cada consulta, con el formato de Chroma"""
+        consultas = self._normalize(query_embeddings)
+        vectores, ids, documents, metadatas = self._snapshot()
+        resultado = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+
+        total = len(vectores)
+        n = min(n_results, total)
+        similitudes = (self._as_float32(vectores) @ consultas.T).T if n else None
+
+        for fila in range(len(consultas)):
+            if not n:
+                indices = np.zeros(0, dtype=np.int64)
+            else:
+                puntuaciones = similitudes[fila]
+                indices = np.argpartition(-puntuaciones, n - 1)[:n] if n < total else np.arange(total)
+                indices = indices[np.argsort(-puntuaciones[indices], kind='stable')]
+
+            resultado['ids'].append([ids[i] for i in indices])
+            resultado['documents'].append([documents[i] for i in indices])
+            resultado['metadatas'].append([metadatas[i] for i in indices])
+            resultado['distances'].append([1.0 - float(similitudes[fila][i]) for i in indices])
+
+        return resultado
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict:
+        """Filas por id (o todas), con el formato de Chroma"""
+        include = ['documents', 'metadatas'] if include is None else include
+        with self._lock:
+            vectores, todos, documents, metadatas = self._vectores, self._ids, self._documents, self._metadatas
+            posicion = self._posicion
+        filas = range(len(todos)) if ids is None else [posicion[i] for i in ids if i in posicion]
+
+        resultado = {'ids': [todos[i] for i in filas]}
+        if 'documents' in include:
+            resultado['documents'] = [documents[i] for i in filas]
+        if 'metadatas' in include:
+            resultado['metadatas'] = [metadatas[i] for i in filas]
+        if 'embeddings' in include:
+            resultado['embeddings'] = np.asarray(vectores[list(filas)], dtype=np.float32)
+        return resultado
+
+    @staticmethod
+    def drop(path: str):
+        """Borrar una colección guardada"""
+        shutil.rmtree(path, ignore_errors=True)
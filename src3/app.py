@@ -1,7 +1,7 @@
 import streamlit as st
 import os
-from pypdf import PdfReader
-from io import BytesIO
+import sys
+from pathlib import Path
 
 # Importamos las funciones de nuestro proyecto
 from conf import PDF_PATH 
@@ -9,6 +9,9 @@ from chunking import prepare_and_split_pdf
 from vectorstore import create_or_load_vectorstore
 from rag import run_justicia_clara_agent
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.pdf_extraction import PdfTextCache, extract_text
+
 # --- Configuración de la Interfaz ---
 st.set_page_config(page_title="Justicia Clara - Simplificador Legal", layout="wide")
 
@@ -22,11 +25,8 @@ def extract_text_from_uploaded_pdf(uploaded_file):
     """
     if uploaded_file is not None:
         try:
-            # Creamos un objeto BytesIO a partir del archivo subido
-            pdf_file = BytesIO(uploaded_file.read())
-            
-            reader = PdfReader(pdf_file)
-            raw_text = ''.join(page.extract_text() or '' for page in reader.pages)
+            # Páginas en paralelo; un PDF ya subido antes no se vuelve a leer
+            raw_text = extract_text(uploaded_file.read(), workers=os.cpu_count(), cache=PdfTextCache())
             
             if not raw_text:
                 st.error("No se pudo extraer texto del PDF. Asegúrate de que no es solo una imagen.")
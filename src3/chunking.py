@@ -1,9 +1,14 @@
 import os
-from pypdf import PdfReader
+import sys
+from pathlib import Path
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from conf import CHUNK_SIZE, CHUNK_OVERLAP
 from langchain_core.documents import Document
 
+# Extracción de PDF compartida con src/ (páginas en paralelo y caché por hash)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.pdf_extraction import PdfTextCache, extract_text
+
 
 
 def prepare_and_split_pdf(pdf_path: str):
@@ -12,8 +17,7 @@ def prepare_and_split_pdf(pdf_path: str):
     """
     print("--- ETAPA 1: Extracción de PDF y Chunking ---")
     try:
-        reader = PdfReader(pdf_path)
-        raw_text = ''.join(page.extract_text() or '' for page in reader.pages)
+        raw_text = extract_text(pdf_path, workers=os.cpu_count(), cache=PdfTextCache())
     except FileNotFoundError:
         print(f"ERROR: Archivo no encontrado en: {pdf_path}")
         return []
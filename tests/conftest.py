@@ -0,0 +1,91 @@
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from src.guia_artifact import ARTIFACT_VERSION
+from src.utils import file_sha256
+
+DIM = 32
+
+EJEMPLOS_GUIA = [
+    ("De conformidad con lo dispuesto en el artículo 24", "Según el artículo 24"),
+    ("VISTOS los autos del procedimiento ordinario", "Vistos los autos del procedimiento"),
+    ("Se desestima el recurso de apelación interpuesto", "Se rechaza el recurso de apelación"),
+]
+
+
+class EncoderFalso:
+    """Bolsa de palabras con hash: determinista, sin modelo y con similitud útil"""
+
+    def __init__(self):
+        self.llamadas = 0
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, **kwargs):
+        self.llamadas += 1
+        vectores = np.zeros((len(texts), DIM), dtype=np.float32)
+        for fila, texto in enumerate(texts):
+            for palabra in texto.lower().split():
+                vectores[fila, int(hashlib.md5(palabra.encode()).hexdigest(), 16) % DIM] += 1.0
+        vectores[:, 0] += 1e-3
+        return vectores
+
+
+def pdf_con_paginas(textos):
+    """PDF mínimo con una línea de texto por página"""
+    n = len(textos)
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(n))
+        + b"] /Count %d >>" % n,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, texto in enumerate(textos):
+        contenido = b"BT /F1 12 Tf 72 720 Td (" + texto.encode('latin-1') + b") Tj ET"
+        objetos.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i))
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream")
+
+    salida = bytearray(b"%PDF-1.4\n")
+    posiciones = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += b"%d 0 obj\n" % numero + objeto + b"\nendobj\n"
+    xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    salida += b"".join(b"%010d 00000 n \n" % posicion for posicion in posiciones)
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref)
+    return bytes(salida)
+
+
+@pytest.fixture
+def guia(tmp_path):
+    """PDF de la Guía (contenido ficticio) con su artefacto de ejemplos ya compilado"""
+    pdf = tmp_path / "guia.pdf"
+    pdf.write_bytes(b"%PDF-1.4 guia de prueba")
+    ejemplos = [{'id': f'guia_{i}', 'original': original, 'simplificado': simplificado,
+                 'regla': 'general', 'pagina': 1}
+                for i, (original, simplificado) in enumerate(EJEMPLOS_GUIA)]
+    pdf.with_suffix('.ejemplos.json').write_text(json.dumps({
+        'version': ARTIFACT_VERSION, 'guia_sha256': file_sha256(str(pdf)),
+        'paginas': 1, 'ejemplos': ejemplos
+    }), encoding='utf-8')
+    return pdf
+
+
+@pytest.fixture
+def crear_sistema(guia, tmp_path):
+    """DualRAGSystem con almacenes NumPy, encoder falso y FakeLLM"""
+    from src.dual_rag_system import DualRAGSystem
+    from src.llm_handler import FakeLLM
+
+    def crear(**opciones):
+        opciones = {'index_dir': str(tmp_path / "index"), 'guia_store': 'numpy',
+                    'cendoj_store': 'numpy',
+                    'llm': FakeLLM(first_token_s=0.0, token_s=0.0), **opciones}
+        system = DualRAGSystem(guia_path=str(guia), **opciones)
+        system._encoder = EncoderFalso()
+        return system
+
+    return crear
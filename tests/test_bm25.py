@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from src.bm25 import BM25Index, normalize
+from src.dual_rag_system import RRF_K
+from src.vector_store import NumpyVectorStore
+
+DOCUMENTOS = {
+    'apelacion': "Se desestima el recurso de apelación interpuesto por la parte demandada",
+    'costas': "Se imponen las costas del procedimiento a la parte demandante",
+    'constitucion': "Vulneración del artículo 24 de la Constitución Española",
+}
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add(DOCUMENTOS.keys(), DOCUMENTOS.values())
+    return index
+
+
+def test_normaliza_tildes_mayusculas_y_plurales():
+    assert normalize("CONSTITUCIÓN Española") == normalize("constitucion española")
+    assert normalize("las leyes y la ley") == ["ley", "ley"]
+    assert normalize("de la con por") == []
+
+
+def test_busqueda_ignora_tildes_y_mayusculas(index):
+    assert index.search("CONSTITUCION", 3)[0][0] == 'constitucion'
+    assert index.search("apelacion", 3)[0][0] == 'apelacion'
+    assert [doc_id for doc_id, _ in index.search("parte demandada", 3)][:1] == ['apelacion']
+
+
+def test_consultas_vacias_o_sin_terminos(index):
+    assert index.search("", 3) == []
+    assert index.search("de la por", 3) == []
+    assert index.search("inexistente", 3) == []
+    assert BM25Index().search("recurso", 3) == []
+
+
+def test_borrar_y_volver_a_anadir(index):
+    index.delete(['apelacion', 'no_existe'])
+    assert len(index) == 2
+    assert index.search("recurso apelación", 3) == []
+
+    index.add(['apelacion'], ["Se estima el recurso de casación"])
+    assert len(index) == 3
+    assert index.search("apelación", 3) == []
+    assert index.search("casación", 3)[0][0] == 'apelacion'
+
+    # Sustituir un documento por id no deja el texto anterior
+    index.add(['costas'], ["Sin imposición de costas"])
+    assert index.search("demandante", 3) == []
+    assert [doc_id for doc_id, _ in index.search("costas", 3)] == ['costas']
+
+
+def test_guardar_y_cargar(index, tmp_path):
+    index.delete(['costas'])
+    index.add(['nuevo'], ["Recurso de amparo ante el Tribunal Constitucional"])
+    path = tmp_path / "bm25.npz"
+    index.save(str(path))
+
+    cargado = BM25Index.load(str(path))
+    assert len(cargado) == len(index) == 3
+    for consulta in ("recurso", "constitución", "costas", "parte demandada"):
+        assert cargado.search(consulta, 3) == index.search(consulta, 3)
+
+    cargado.add(['costas'], [DOCUMENTOS['costas']])
+    assert cargado.search("costas", 3)[0][0] == 'costas'
+
+
+def test_cargar_otra_version_o_fichero_roto(index, tmp_path, monkeypatch):
+    assert BM25Index.load(str(tmp_path / "no_existe.npz")) is None
+
+    roto = tmp_path / "roto.npz"
+    roto.write_bytes(b"no es un npz")
+    assert BM25Index.load(str(roto)) is None
+
+    path = tmp_path / "bm25.npz"
+    index.save(str(path))
+    monkeypatch.setattr('src.bm25.BM25_VERSION', 2)
+    assert BM25Index.load(str(path)) is None
+
+
+@pytest.fixture
+def coleccion():
+    coleccion = NumpyVectorStore('fusion')
+    coleccion.upsert(np.eye(4)[:3], ["doc a", "doc b", "doc c"],
+                     [{'n': 0}, {'n': 1}, {'n': 2}], ['a', 'b', 'c'])
+    return coleccion
+
+
+def densos(*ids):
+    return [{'id': doc_id, 'documento': f"doc {doc_id}", 'metadata': {}, 'similarity': 0.5}
+            for doc_id in ids]
+
+
+def test_fusion_premia_lo_que_encuentran_las_dos_busquedas(crear_sistema, coleccion):
+    system = crear_sistema()
+    resultado = system._hybrid_fusion(coleccion, densos('a', 'b'), [('b', 3.0), ('c', 1.0)],
+                                      np.eye(4)[2:3], 3)
+
+    assert [r['id'] for r in resultado] == ['b', 'a', 'c']
+    assert resultado[0]['score'] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+
+    # 'c' solo lo encontró BM25: se lee de la colección con su similitud real
+    assert resultado[2]['documento'] == "doc c"
+    assert resultado[2]['metadata'] == {'n': 2}
+    assert resultado[2]['similarity'] == pytest.approx(1.0)
+
+
+def test_fusion_sigue_los_pesos(crear_sistema, coleccion):
+    lexico = crear_sistema(lexical_weight=2.0)
+    resultado = lexico._hybrid_fusion(coleccion, densos('a'), [('c', 1.0)], np.eye(4)[:1], 2)
+    assert [r['id'] for r in resultado] == ['c', 'a']
+    assert resultado[0]['score'] == pytest.approx(2 / (RRF_K + 1))
+
+    denso = crear_sistema(dense_weight=2.0)
+    resultado = denso._hybrid_fusion(coleccion, densos('a'), [('c', 1.0)], np.eye(4)[:1], 1)
+    assert [r['id'] for r in resultado] == ['a']
@@ -0,0 +1,135 @@
+import json
+
+from src.bm25 import BM25Index
+from src.cendoj_ingest import ingest_cendoj
+from src.dual_rag_system import (CENDOJ_CHECKPOINT_FILE, CENDOJ_MANIFEST_FILE, COLECCION_CENDOJ,
+                               MANIFEST_FILE)
+from src.utils import file_sha256
+
+
+def escribir(fuente, n: int = 3):
+    fuente.mkdir(exist_ok=True)
+    for i in range(n):
+        (fuente / f"s{i}.txt").write_text(f"Sentencia {i}. " + "fundamento jurídico " * 80, encoding='utf-8')
+
+
+def test_reingesta_borra_los_chunks_que_sobran(crear_sistema, tmp_path):
+    fuente = tmp_path / "cendoj"
+    fuente.mkdir()
+    sentencia = fuente / "s.txt"
+    sentencia.write_text("palabra " * 2000, encoding='utf-8')
+    system = crear_sistema()
+
+    ingest_cendoj(system, str(fuente), workers=1)
+    antes = system.rag_cendoj.count()
+    assert antes > 2
+
+    sentencia.write_text("breve recurso de apelación", encoding='utf-8')
+    stats = ingest_cendoj(system, str(fuente), workers=1)
+
+    assert stats['obsoletos'] == antes - 1
+    assert system.rag_cendoj.count() == 1
+    assert len(system._lexico[COLECCION_CENDOJ]) == 1
+    assert [i for i, _ in system._lexico[COLECCION_CENDOJ].search("palabra")] == []
+
+
+def test_bm25_se_guarda_por_checkpoint_y_no_por_lote(crear_sistema, tmp_path, monkeypatch):
+    fuente = tmp_path / "cendoj"
+    fuente.mkdir()
+    for i in range(5):
+        (fuente / f"s{i}.txt").write_text(f"sentencia número {i}", encoding='utf-8')
+    system = crear_sistema()
+    system._drop_cendoj_mock()
+
+    guardados = []
+    monkeypatch.setattr(BM25Index, 'save', lambda self, path: guardados.append(path))
+    stats = ingest_cendoj(system, str(fuente), workers=1, files_per_batch=1, batches_per_checkpoint=2)
+
+    assert stats['lotes'] == 5
+    # Tras los lotes 2 y 4, y al terminar
+    assert len(guardados) == 3
+
+
+def test_la_ingesta_sobrevive_a_cambios_de_la_guia(crear_sistema, guia, tmp_path):
+    escribir(tmp_path / "cendoj")
+    system = crear_sistema()
+    ingest_cendoj(system, str(tmp_path / "cendoj"), workers=1)
+    ingeridos = system.rag_cendoj.count()
+
+    # El mock se quita con la primera ingesta real y no vuelve
+    assert not system.rag_cendoj.get(ids=["cendoj_mock_0", "cendoj_mock_1"])['ids']
+
+    guia.write_bytes(b"%PDF-1.4 otra guia")
+    artefacto = guia.with_suffix('.ejemplos.json')
+    datos = json.loads(artefacto.read_text(encoding='utf-8'))
+    artefacto.write_text(json.dumps({**datos, 'guia_sha256': file_sha256(str(guia))}), encoding='utf-8')
+
+    manifest = tmp_path / "index" / MANIFEST_FILE
+    sha_anterior = json.loads(manifest.read_text(encoding='utf-8'))['guia_sha256']
+    for opciones in ({'use_cendoj': False}, {'use_cendoj': True}, {}):
+        system = crear_sistema(**opciones)
+        assert system.rag_guia.count() == 3
+        assert system.rag_cendoj.count() == ingeridos
+        assert not system.rag_cendoj.get(ids=["cendoj_mock_0"])['ids']
+    # La Guía sí se reconstruyó con el PDF nuevo
+    assert json.loads(manifest.read_text(encoding='utf-8'))['guia_sha256'] != sha_anterior
+
+
+def test_otro_encoder_invalida_la_coleccion_y_el_checkpoint(crear_sistema, tmp_path):
+    escribir(tmp_path / "cendoj")
+    checkpoint = tmp_path / "fuera" / "checkpoint.json"
+    ingest_cendoj(crear_sistema(), str(tmp_path / "cendoj"), checkpoint_path=str(checkpoint), workers=1)
+
+    # Con otro dtype la colección se crea de nuevo (solo con el mock) y el
+    # checkpoint, aunque esté fuera de index_dir, ya no vale: se reingiere todo
+    system = crear_sistema(store_dtype='float16')
+    assert sorted(system.rag_cendoj.get()['ids']) == ["cendoj_mock_0", "cendoj_mock_1"]
+
+    stats = ingest_cendoj(system, str(tmp_path / "cendoj"), checkpoint_path=str(checkpoint), workers=1)
+    assert stats['omitidos'] == 0
+    assert stats['ficheros'] == 3
+
+
+def test_indice_anterior_con_un_solo_manifest_conserva_la_ingesta(crear_sistema, tmp_path):
+    escribir(tmp_path / "cendoj")
+    system = crear_sistema()
+    ingest_cendoj(system, str(tmp_path / "cendoj"), workers=1)
+    ingeridos = system.rag_cendoj.count()
+
+    # Formato anterior: un manifest para las dos colecciones y sin el de CENDOJ
+    index = tmp_path / "index"
+    (index / CENDOJ_MANIFEST_FILE).unlink()
+    manifest = json.loads((index / MANIFEST_FILE).read_text(encoding='utf-8'))
+    manifest['stores'] = {**system.stores, 'dtype': system.store_dtype}
+    manifest['cendoj'] = True
+    (index / MANIFEST_FILE).write_text(json.dumps(manifest), encoding='utf-8')
+    checkpoint = json.loads((index / CENDOJ_CHECKPOINT_FILE).read_text(encoding='utf-8'))
+    (index / CENDOJ_CHECKPOINT_FILE).write_text(json.dumps({'procesados': checkpoint['procesados']}),
+                                                encoding='utf-8')
+
+    system = crear_sistema()
+    assert system.rag_cendoj.count() == ingeridos
+    assert system.cendoj_generation is None
+    stats = ingest_cendoj(system, str(tmp_path / "cendoj"), workers=1)
+    assert stats['omitidos'] == 3
+
+
+def test_los_ficheros_que_fallan_se_reintentan(crear_sistema, tmp_path):
+    escribir(tmp_path / "cendoj", n=2)
+    roto = tmp_path / "cendoj" / "roto.pdf"
+    roto.write_bytes(b"no es un pdf")
+    vacio = tmp_path / "cendoj" / "vacio.txt"
+    vacio.write_text("   ", encoding='utf-8')
+    checkpoint = tmp_path / "checkpoint.json"
+    system = crear_sistema()
+
+    stats = ingest_cendoj(system, str(tmp_path / "cendoj"), checkpoint_path=str(checkpoint), workers=1)
+    assert (stats['ficheros'], stats['errores']) == (2, 2)
+    guardado = json.loads(checkpoint.read_text(encoding='utf-8'))
+    assert sorted(guardado['procesados']) == sorted(str(p) for p in (tmp_path / "cendoj").glob("s*.txt"))
+    assert sorted(guardado['fallidos']) == sorted([str(roto), str(vacio)])
+
+    vacio.write_text("Sentencia que ahora sí tiene texto.", encoding='utf-8')
+    stats = ingest_cendoj(system, str(tmp_path / "cendoj"), checkpoint_path=str(checkpoint), workers=1)
+    assert (stats['omitidos'], stats['ficheros'], stats['errores']) == (2, 1, 1)
+    assert list(json.loads(checkpoint.read_text(encoding='utf-8'))['fallidos']) == [str(roto)]
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from src.cli import main, output_names
+
+
+def test_output_names_no_colisionan(tmp_path):
+    entradas = [tmp_path / "in" / "a" / "s.txt", tmp_path / "in" / "b" / "s.txt",
+                tmp_path / "in" / "a" / "s.pdf"]
+    nombres = output_names(entradas)
+
+    assert len(set(nombres.values())) == 3
+    assert nombres[str(entradas[0])] == str(Path("a") / "s.txt.simplificado.txt")
+    assert nombres[str(entradas[2])] == str(Path("a") / "s.pdf.simplificado.txt")
+
+
+def test_documentos_con_el_mismo_nombre_en_distintos_directorios(tmp_path):
+    for carpeta in ("a", "b"):
+        (tmp_path / "in" / carpeta).mkdir(parents=True)
+        (tmp_path / "in" / carpeta / "s.txt").write_text(f"Documento {carpeta}", encoding='utf-8')
+
+    salida = tmp_path / "out"
+    assert main([str(tmp_path / "in"), "--output", str(salida), "--rules-only",
+                 "--no-cache", "--format", "files"]) == 0
+
+    a = (salida / "a" / "s.txt.simplificado.txt").read_text(encoding='utf-8')
+    b = (salida / "b" / "s.txt.simplificado.txt").read_text(encoding='utf-8')
+    assert "Documento a" in a
+    assert "Documento b" in b
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from src.dual_rag_system import DualRAGSystem
+from src.instrumentation import trace
+
+
+def test_prompt_version_no_registra_la_etapa_prompt():
+    # prompt_version no depende del estado de la instancia: no hace falta índice ni encoder
+    system = object.__new__(DualRAGSystem)
+
+    with trace() as traza:
+        version = system.prompt_version
+        system._compose_prompt("texto", {'guia': [], 'cendoj': []})
+
+    assert len(version) == 16
+    assert traza.etapas['prompt']['n'] == 1
+
+
+def test_aretrieve_hybrid_carga_el_indice_fuera_del_bucle():
+    system = object.__new__(DualRAGSystem)
+    system._index_listo = False
+    system._lock = threading.Lock()
+    system.use_cendoj = False
+    hilos = {}
+
+    def cargar():
+        hilos['indice'] = threading.current_thread()
+        system._rag_guia = 'guia'
+
+    system._load_index = cargar
+    system._query_embeddings = lambda query, mode, fusion: ([], 'max')
+    system._search = lambda coleccion, *args: [coleccion]
+
+    async def consultar():
+        hilos['bucle'] = threading.current_thread()
+        return await system.aretrieve_hybrid("texto")
+
+    assert asyncio.run(consultar()) == {'guia': ['guia'], 'cendoj': []}
+    assert hilos['indice'] is not hilos['bucle']
+
+
+def test_use_cendoj_no_forma_parte_del_indice(crear_sistema):
+    system = crear_sistema(use_cendoj=True)
+    system._bulk_index(system.rag_cendoj, ['cendoj_ingerida_0'], ["sentencia ingerida"], [{}])
+    cendoj = system.rag_cendoj.count()
+
+    # Cambiar el valor por defecto no reconstruye ni vacía el índice
+    system = crear_sistema(use_cendoj=False)
+    assert system.rag_cendoj.count() == cendoj
+    assert system.retrieve_hybrid("procedimiento ordinario")['cendoj'] == []
+    assert system.retrieve_hybrid("procedimiento ordinario", use_cendoj=True)['cendoj']
+
+    system = crear_sistema(use_cendoj=True)
+    assert system.rag_cendoj.count() == cendoj
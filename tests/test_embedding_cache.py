@@ -0,0 +1,57 @@
+import numpy as np
+
+from src.embedding_cache import EmbeddingCache
+
+from tests.conftest import DIM, EncoderFalso
+
+
+def test_clave_por_texto_y_encoder():
+    cache = EmbeddingCache("minilm")
+    assert cache._key("recurso") == EmbeddingCache("minilm")._key("recurso")
+    assert cache._key("recurso") != cache._key("recurso ")
+    assert cache._key("recurso") != EmbeddingCache("minilm-onnx")._key("recurso")
+
+
+def test_solo_embebe_los_textos_nuevos_en_un_lote():
+    encoder = EncoderFalso()
+    cache = EmbeddingCache("falso")
+
+    primero = cache.encode(encoder, ["recurso de apelación", "costas", "recurso de apelación"])
+    assert encoder.llamadas == 1
+    assert cache.stats()['misses'] == 2 and cache.stats()['hits'] == 1
+    np.testing.assert_array_equal(primero[0], primero[2])
+
+    segundo = cache.encode(encoder, ["costas", "sentencia"])
+    assert encoder.llamadas == 2
+    np.testing.assert_array_equal(segundo[0], primero[1])
+
+    cache.encode(encoder, ["sentencia", "costas"])
+    assert encoder.llamadas == 2
+    assert cache.encode(encoder, "costas").shape == (DIM,)
+
+
+def test_el_mismo_texto_con_otro_encoder_no_acierta(tmp_path):
+    disco = str(tmp_path / "embeddings.sqlite3")
+    encoder = EncoderFalso()
+    EmbeddingCache("falso", disk_path=disco).encode(encoder, ["recurso"])
+    EmbeddingCache("otro", disk_path=disco).encode(encoder, ["recurso"])
+    assert encoder.llamadas == 2
+
+
+def test_expulsa_por_memoria_y_recupera_del_disco(tmp_path):
+    encoder = EncoderFalso()
+    vector_bytes = DIM * 4
+    cache = EmbeddingCache("falso", max_bytes=2 * vector_bytes, disk_path=str(tmp_path / "e.sqlite3"))
+
+    cache.encode(encoder, ["uno", "dos"])
+    cache.encode(encoder, ["uno"])
+    cache.encode(encoder, ["tres"])
+    assert cache.stats()['entradas_memoria'] == 2
+    assert cache.stats()['bytes_memoria'] <= 2 * vector_bytes
+    assert set(cache._memoria) == {cache._key("uno"), cache._key("tres")}
+
+    # 'dos' salió de memoria pero sigue en disco, también para otra instancia
+    llamadas = encoder.llamadas
+    cache.encode(encoder, ["dos"])
+    EmbeddingCache("falso", disk_path=str(tmp_path / "e.sqlite3")).encode(encoder, ["uno", "dos", "tres"])
+    assert encoder.llamadas == llamadas
@@ -0,0 +1,78 @@
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from src.encoders import BatchingEncoder, encoder_id, load_encoder
+
+from tests.conftest import EncoderFalso
+
+
+def test_backend_desconocido():
+    with pytest.raises(ValueError, match="onnx-int8"):
+        load_encoder('tensorflow')
+
+
+def test_cada_backend_tiene_su_identificador():
+    assert encoder_id('torch') == 'paraphrase-multilingual-MiniLM-L12-v2'
+    assert encoder_id('onnx-int8') == 'paraphrase-multilingual-MiniLM-L12-v2@onnx-int8'
+
+
+def test_onnx_sin_modelo_exportado(tmp_path):
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('tokenizers')
+    with pytest.raises(FileNotFoundError, match="python -m src.encoders --output"):
+        load_encoder('onnx-int8', model_dir=str(tmp_path))
+
+
+def test_onnx_sin_onnxruntime(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'onnxruntime', None)
+    with pytest.raises(ImportError, match="onnxruntime"):
+        load_encoder('onnx-int8', model_dir=str(tmp_path))
+
+
+def test_onnx_no_importa_torch(tmp_path):
+    pytest.importorskip('onnxruntime')
+    codigo = (
+        "import sys\n"
+        "from src.encoders import load_encoder\n"
+        "try:\n"
+        f"    load_encoder('onnx-int8', model_dir={str(tmp_path)!r})\n"
+        "except FileNotFoundError:\n"
+        "    pass\n"
+        "print('torch' in sys.modules, 'sentence_transformers' in sys.modules)\n"
+    )
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True)
+    assert salida.stdout.split() == ["False", "False"]
+
+
+def test_micro_lotes_de_llamadas_concurrentes():
+    encoder = BatchingEncoder(EncoderFalso(), max_batch=8, max_wait_ms=100)
+    textos = [f"consulta {i}" for i in range(4)]
+    resultados = {}
+    hilos = [threading.Thread(target=lambda t=t: resultados.__setitem__(t, encoder.encode(t)))
+             for t in textos]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert encoder.lotes == 1 and encoder.textos == 4
+    esperado = EncoderFalso().encode(textos)
+    for fila, texto in enumerate(textos):
+        np.testing.assert_array_equal(resultados[texto], esperado[fila])
+
+    # Más de max_batch textos van directos al encoder
+    assert encoder.encode([f"t{i}" for i in range(9)]).shape[0] == 9
+    assert encoder.lotes == 1
+
+
+def test_micro_lotes_propagan_los_errores():
+    class Roto:
+        def encode(self, texts, **kwargs):
+            raise RuntimeError("encoder caído")
+
+    with pytest.raises(RuntimeError, match="encoder caído"):
+        BatchingEncoder(Roto(), max_wait_ms=1).encode("hola")
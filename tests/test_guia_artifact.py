@@ -0,0 +1,73 @@
+import json
+
+from src import guia_artifact
+from src.guia_artifact import (ARTIFACT_VERSION, artifact_vigente, build_artifact,
+                               load_artifact, parse_ejemplos)
+from src.utils import file_sha256
+
+from tests.conftest import pdf_con_paginas
+
+PAGINAS = [
+    "Versión no recomendada: VISTOS los autos del procedimiento ",
+    "Versión alternativa: Vistos los autos ",
+    "Versión no recomendada: De conformidad con lo dispuesto en el artículo 24 "
+    "Versión alternativa: Según el artículo 24",
+]
+
+
+def test_parsea_pares_con_su_pagina_y_regla():
+    ejemplos = parse_ejemplos(PAGINAS)
+
+    assert [(ej['id'], ej['pagina'], ej['regla']) for ej in ejemplos] == [
+        ('guia_0', 1, 'oraciones_cortas'), ('guia_1', 3, 'terminologia')]
+    assert ejemplos[0]['original'] == "VISTOS los autos del procedimiento"
+    assert ejemplos[0]['simplificado'] == "Vistos los autos"
+    assert ejemplos[1]['simplificado'] == "Según el artículo 24"
+    assert parse_ejemplos(["Versión no recomendada: sin alternativa"]) == []
+
+
+def test_compila_el_artefacto_desde_el_pdf(tmp_path):
+    pdf = tmp_path / "guia.pdf"
+    pdf.write_bytes(pdf_con_paginas(PAGINAS))
+
+    resumen = build_artifact(str(pdf))
+    artefacto = json.loads((tmp_path / "guia.ejemplos.json").read_text(encoding='utf-8'))
+
+    assert resumen['ejemplos'] == 2 and resumen['paginas'] == 3
+    assert artefacto['version'] == ARTIFACT_VERSION
+    assert artefacto['guia_sha256'] == file_sha256(str(pdf))
+    ejemplos = load_artifact(tmp_path / "guia.ejemplos.json")
+    assert [(ej['original'], ej['pagina']) for ej in ejemplos] == [
+        ("VISTOS los autos del procedimiento", 1),
+        ("De conformidad con lo dispuesto en el artículo 24", 3)]
+
+
+def test_otra_version_o_otra_guia_obligan_a_recompilar(tmp_path, monkeypatch):
+    pdf = tmp_path / "guia.pdf"
+    pdf.write_bytes(pdf_con_paginas(PAGINAS))
+    artefacto = tmp_path / "guia.ejemplos.json"
+    build_artifact(str(pdf))
+    assert artifact_vigente(artefacto, str(pdf))
+
+    monkeypatch.setattr(guia_artifact, 'ARTIFACT_VERSION', ARTIFACT_VERSION + 1)
+    assert not artifact_vigente(artefacto, str(pdf))
+    monkeypatch.undo()
+
+    pdf.write_bytes(pdf_con_paginas(PAGINAS[:2]))
+    assert not artifact_vigente(artefacto, str(pdf))
+    assert not artifact_vigente(tmp_path / "no_existe.json", str(pdf))
+
+
+def test_el_sistema_recompila_un_artefacto_de_otra_version(crear_sistema, guia):
+    guia.write_bytes(pdf_con_paginas(PAGINAS))
+    artefacto = guia.with_suffix('.ejemplos.json')
+    datos = json.loads(artefacto.read_text(encoding='utf-8'))
+    artefacto.write_text(json.dumps({**datos, 'version': ARTIFACT_VERSION - 1,
+                                     'guia_sha256': file_sha256(str(guia))}), encoding='utf-8')
+
+    system = crear_sistema()
+    ejemplos = system._load_ejemplos_guia(str(guia))
+
+    assert [ej['original'] for ej in ejemplos] == [
+        "VISTOS los autos del procedimiento", "De conformidad con lo dispuesto en el artículo 24"]
+    assert json.loads(artefacto.read_text(encoding='utf-8'))['version'] == ARTIFACT_VERSION
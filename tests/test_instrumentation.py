@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.instrumentation import (MetricsRegistry, bind, count, current_trace, export, span,
+                                 timed, trace, traced)
+
+
+def etapas(traza):
+    return {t['etapa'] for t in traza.to_dict()['tramos']}
+
+
+def test_cada_hilo_tiene_su_traza():
+    listos = threading.Barrier(2)
+    trazas = {}
+
+    def peticion(nombre):
+        with trace() as traza:
+            listos.wait()
+            with span(f"etapa_{nombre}"):
+                count(f"contador_{nombre}")
+            listos.wait()
+            trazas[nombre] = traza
+
+    hilos = [threading.Thread(target=peticion, args=(n,)) for n in ("a", "b")]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert etapas(trazas["a"]) == {"etapa_a"}
+    assert trazas["a"].contadores == {"contador_a": 1}
+    assert etapas(trazas["b"]) == {"etapa_b"}
+    assert current_trace() is None
+
+
+def test_bind_lleva_la_traza_a_otro_hilo():
+    def trabajo():
+        with span("en_el_pool"):
+            pass
+        return current_trace()
+
+    with trace() as traza, ThreadPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(trabajo).result() is None
+        assert pool.submit(bind(trabajo)).result() is traza
+
+    assert etapas(traza) == {"en_el_pool"}
+    assert traza.to_dict()['etapas']['en_el_pool']['n'] == 1
+
+
+def test_tareas_async_concurrentes_no_se_mezclan():
+    @timed("paso")
+    async def paso(nombre, espera):
+        await asyncio.sleep(espera)
+        count(nombre)
+
+    @traced
+    async def peticion(nombre, espera):
+        await paso(nombre, espera)
+        await paso(nombre, espera)
+        return {'nombre': nombre}
+
+    async def ambas():
+        return await asyncio.gather(peticion("lenta", 0.02), peticion("rapida", 0.005))
+
+    lenta, rapida = asyncio.run(ambas())
+
+    assert lenta['traza']['contadores'] == {"lenta": 2}
+    assert rapida['traza']['contadores'] == {"rapida": 2}
+    assert lenta['traza']['etapas']['paso']['n'] == 2
+    assert rapida['traza']['etapas']['paso']['n'] == 2
+    assert lenta['traza']['etapas']['paso']['segundos'] > rapida['traza']['etapas']['paso']['segundos']
+
+
+def test_traza_anidada_reutiliza_la_abierta():
+    @traced
+    def simplificar():
+        with span("llm"):
+            pass
+        return {}
+
+    with trace() as exterior:
+        with span("extraccion_pdf"):
+            pass
+        resultado = simplificar()
+
+    assert etapas(exterior) == {"extraccion_pdf", "llm"}
+    assert {t['etapa'] for t in resultado['traza']['tramos']} == {"extraccion_pdf", "llm"}
+
+
+def test_exportadores():
+    registro = MetricsRegistry()
+    registro.observe("encode", 0.003)
+    registro.observe("encode", 2.0)
+    registro.count("cache_embeddings_hit", 3)
+
+    texto = registro.to_prometheus()
+    assert 'justicia_stage_seconds_bucket{stage="encode",le="0.005"} 1' in texto
+    assert 'justicia_stage_seconds_bucket{stage="encode",le="+Inf"} 2' in texto
+    assert 'justicia_stage_seconds_count{stage="encode"} 2' in texto
+    assert 'justicia_events_total{name="cache_embeddings_hit"} 3' in texto
+
+    datos = registro.to_json()
+    assert datos['etapas']['encode']['media_s'] == pytest.approx(1.0015)
+    assert datos['contadores'] == {"cache_embeddings_hit": 3}
+
+    with pytest.raises(ValueError):
+        export('xml')
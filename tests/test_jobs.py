@@ -0,0 +1,48 @@
+import json
+import time
+
+from src.jobs import TERMINADO, JobManager
+
+
+def esperar(jobs: JobManager, job_id: str):
+    for _ in range(200):
+        if jobs.get(job_id)['estado'] == TERMINADO:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} no terminó")
+
+
+def tarea(on_token, on_rules):
+    on_token("texto simplificado")
+    return {'simplificado': "texto simplificado"}
+
+
+def test_se_conservan_como_mucho_max_finished_trabajos(tmp_path):
+    jobs = JobManager(max_workers=1, jobs_dir=str(tmp_path), max_finished=3)
+    ids = []
+    for _ in range(5):
+        ids.append(jobs.submit(tarea))
+        esperar(jobs, ids[-1])
+    jobs.shutdown()
+
+    assert [jobs.get(i) is not None for i in ids] == [False, False, True, True, True]
+    assert sorted(p.stem for p in tmp_path.glob("*.json")) == sorted(ids[2:])
+
+
+def test_los_trabajos_caducados_se_borran_al_arrancar(tmp_path):
+    jobs = JobManager(max_workers=1, jobs_dir=str(tmp_path))
+    antiguo, reciente = jobs.submit(tarea), jobs.submit(tarea)
+    esperar(jobs, antiguo)
+    esperar(jobs, reciente)
+    jobs.shutdown()
+
+    path = tmp_path / f"{antiguo}.json"
+    job = json.loads(path.read_text(encoding='utf-8'))
+    job['fin'] -= 7200
+    path.write_text(json.dumps(job), encoding='utf-8')
+
+    jobs = JobManager(max_workers=1, jobs_dir=str(tmp_path), ttl_s=3600)
+    assert jobs.get(antiguo) is None
+    assert not path.exists()
+    assert jobs.get(reciente)['resultado'] == {'simplificado': "texto simplificado"}
+    jobs.shutdown()
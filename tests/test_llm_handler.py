@@ -0,0 +1,93 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.llm_handler import CircuitBreaker, FakeLLM
+
+
+def _lento():
+    return FakeLLM(first_token_s=0.2, token_s=0.0, breaker=CircuitBreaker(max_failures=3))
+
+
+def test_plazo_vencido_no_abre_el_circuito():
+    llm = _lento()
+    for _ in range(5):
+        stats = {}
+        salida = "".join(llm.generate_stream("Texto: hola", stats, fallback_output="reglas",
+                                             deadline=time.perf_counter() + 0.01))
+        assert salida == "reglas"
+        assert stats['motivo'] == 'deadline'
+
+    assert llm.breaker.state == 'cerrado'
+    stats = {}
+    "".join(llm.generate_stream("Texto: hola", stats))
+    assert 'motivo' not in stats
+
+
+def test_plazo_vencido_no_abre_el_circuito_async():
+    llm = _lento()
+
+    async def generar(deadline):
+        stats = {}
+        async for _ in llm.agenerate_stream("Texto: hola", stats, deadline=deadline):
+            pass
+        return stats
+
+    for _ in range(5):
+        stats = asyncio.run(generar(time.perf_counter() + 0.01))
+        assert stats['motivo'] == 'deadline'
+
+    assert llm.breaker.state == 'cerrado'
+    assert 'motivo' not in asyncio.run(generar(None))
+
+
+def test_errores_del_backend_abren_el_circuito():
+    llm = _lento()
+
+    def caido(**kwargs):
+        raise ConnectionError("sin conexión")
+
+    llm.ollama.generate = caido
+    for _ in range(3):
+        stats = {}
+        "".join(llm.generate_stream("Texto: hola", stats))
+        assert stats['motivo'] == 'error'
+
+    assert llm.breaker.state == 'abierto'
+    stats = {}
+    "".join(llm.generate_stream("Texto: hola", stats))
+    assert stats['motivo'] == 'circuito_abierto'
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba():
+    breaker = CircuitBreaker(max_failures=2, reset_s=0.05)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == 'abierto'
+    assert not breaker.allow()
+
+    # Semiabierto: de varios hilos a la vez solo uno sale a probar
+    time.sleep(0.06)
+    assert breaker.state == 'semiabierto'
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        permitidos = list(pool.map(lambda _: breaker.allow(), range(8)))
+    assert permitidos.count(True) == 1
+
+    # La prueba falla: vuelve a abrirse durante reset_s
+    breaker.record_failure()
+    assert breaker.state == 'abierto'
+    assert not breaker.allow()
+
+    # Una prueba abandonada por plazo libera el turno sin cerrar el circuito
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_cancelled()
+    assert breaker.state == 'semiabierto'
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # La prueba sale bien: se cierra y deja pasar a todos
+    breaker.record_success()
+    assert breaker.state == 'cerrado'
+    assert all(breaker.allow() for _ in range(5))
@@ -0,0 +1,26 @@
+from src.long_document import split_sections
+
+FUNDAMENTOS = "FUNDAMENTOS DE DERECHO\n"
+
+
+def test_parrafo_mas_largo_que_max_chars_se_divide_por_frases():
+    frase = "La parte recurrente alega la infracción del artículo 24 de la Constitución. "
+    parrafo = (frase * 65).strip()
+    assert 4900 < len(parrafo) < 5000
+
+    secciones = split_sections(FUNDAMENTOS + parrafo, max_chars=4000)
+
+    assert len(secciones) == 2
+    assert all(len(s['texto']) <= 4000 for s in secciones)
+    assert all(s['texto'].endswith('.') for s in secciones)
+    assert " ".join(s['texto'] for s in secciones) == parrafo
+
+
+def test_frase_mas_larga_que_max_chars_se_corta_por_caracteres():
+    palabras = " ".join(f"palabra{i}" for i in range(600))
+    sin_espacios = "x" * 2500
+
+    for texto in (palabras, sin_espacios):
+        secciones = split_sections(FUNDAMENTOS + texto, max_chars=1000)
+        assert all(len(s['texto']) <= 1000 for s in secciones)
+        assert "".join(s['texto'] for s in secciones).replace(" ", "") == texto.replace(" ", "")
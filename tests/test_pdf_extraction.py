@@ -0,0 +1,56 @@
+import pytest
+
+from src import pdf_extraction
+from src.pdf_extraction import PdfTextCache, extract_text, iter_pages
+
+from tests.conftest import pdf_con_paginas
+
+TEXTOS = [f"Pagina {i} de la sentencia" for i in range(7)]
+
+
+def test_paginas_en_orden(tmp_path):
+    pdf = tmp_path / "sentencia.pdf"
+    pdf.write_bytes(pdf_con_paginas(TEXTOS))
+
+    assert [p.strip() for p in iter_pages(str(pdf))] == TEXTOS
+    assert extract_text(pdf.read_bytes()).replace("\n", "") == "".join(TEXTOS)
+
+
+def test_paginas_en_orden_con_procesos(monkeypatch):
+    monkeypatch.setattr(pdf_extraction, 'PARALLEL_MIN_PAGES', 2)
+    paginas = list(iter_pages(pdf_con_paginas(TEXTOS), workers=3, pages_per_task=2))
+    assert [p.strip() for p in paginas] == TEXTOS
+
+
+def test_cache_evita_decodificar_y_cambia_con_el_contenido(tmp_path, monkeypatch):
+    cache = PdfTextCache(str(tmp_path / "cache"))
+    pdf = pdf_con_paginas(TEXTOS)
+    primera = list(iter_pages(pdf, cache=cache))
+    assert len(list((tmp_path / "cache").glob("*.json"))) == 1
+
+    abrir = pdf_extraction._open
+
+    def sin_abrir(data):
+        raise AssertionError("no debería decodificar el PDF")
+
+    monkeypatch.setattr(pdf_extraction, '_open', sin_abrir)
+    assert list(iter_pages(pdf, cache=cache)) == primera
+
+    # Otro contenido u otra versión de la extracción: se decodifica de nuevo
+    otro = pdf_con_paginas(TEXTOS[:2])
+    with pytest.raises(AssertionError):
+        list(iter_pages(otro, cache=cache))
+    monkeypatch.setattr(pdf_extraction, 'EXTRACTION_VERSION', pdf_extraction.EXTRACTION_VERSION + 1)
+    with pytest.raises(AssertionError):
+        list(iter_pages(pdf, cache=cache))
+
+    monkeypatch.setattr(pdf_extraction, '_open', abrir)
+    assert [p.strip() for p in iter_pages(otro, cache=cache)] == TEXTOS[:2]
+
+
+def test_lectura_a_medias_no_se_guarda(tmp_path):
+    cache = PdfTextCache(str(tmp_path / "cache"))
+    paginas = iter_pages(pdf_con_paginas(TEXTOS), cache=cache)
+    assert next(paginas).strip() == TEXTOS[0]
+    paginas.close()
+    assert list((tmp_path / "cache").glob("*.json")) == []
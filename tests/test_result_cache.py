@@ -0,0 +1,63 @@
+import time
+
+from src.result_cache import ResultCache
+
+
+def test_clave_normaliza_espacios_y_separa_sus_partes():
+    clave = ResultCache.make_key("Se  desestima\nel recurso ", "llama2", "v1", ["guia_0", "guia_1"])
+    assert clave == ResultCache.make_key("Se desestima el recurso", "llama2", "v1", ["guia_0", "guia_1"])
+    assert clave != ResultCache.make_key("Se desestima el recurso", "mistral", "v1", ["guia_0", "guia_1"])
+    assert clave != ResultCache.make_key("Se desestima el recurso", "llama2", "v2", ["guia_0", "guia_1"])
+    assert clave != ResultCache.make_key("Se desestima el recurso", "llama2", "v1", ["guia_0guia_1"])
+
+
+def test_expulsa_los_menos_usados_al_pasar_de_max_bytes(tmp_path):
+    valor = {'simplificado': "x" * 80}
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), max_bytes=300)
+    for clave in ("a", "b", "c"):
+        cache.put(clave, valor)
+        time.sleep(0.01)
+
+    # Leer 'a' la hace la más reciente: al entrar 'd' sale 'b'
+    assert cache.get("a") == valor
+    time.sleep(0.01)
+    cache.put("d", valor)
+
+    assert cache.get("b") is None
+    assert all(cache.get(clave) == valor for clave in ("a", "c", "d"))
+    assert cache.stats()['entradas'] == 3
+    assert cache.stats()['bytes'] <= 300
+
+
+def test_entradas_sin_usar_caducan_con_ttl(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), ttl_s=0.2)
+    cache.put("vieja", {'n': 1})
+    time.sleep(0.3)
+    cache.put("nueva", {'n': 2})
+
+    assert cache.get("vieja") is None
+    assert cache.get("nueva") == {'n': 2}
+    assert cache.stats()['entradas'] == 1
+
+    # Sin ttl_s no caduca nada
+    sin_ttl = ResultCache(str(tmp_path / "otra.sqlite3"))
+    sin_ttl.put("vieja", {'n': 1})
+    time.sleep(0.3)
+    assert sin_ttl.get("vieja") == {'n': 1}
+
+
+def test_persiste_entre_instancias_y_se_invalida(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path)
+    cache.put("a", {'simplificado': "Según la Ley", 'nivel': 'llm'})
+    cache.put("b", {'n': 2})
+    assert cache.get("no_existe") is None
+
+    reabierta = ResultCache(path)
+    assert reabierta.get("a") == {'simplificado': "Según la Ley", 'nivel': 'llm'}
+    assert reabierta.stats()['hits'] == 1 and reabierta.stats()['misses'] == 0
+
+    reabierta.invalidate("a")
+    assert reabierta.get("a") is None and reabierta.get("b") == {'n': 2}
+    reabierta.invalidate()
+    assert ResultCache(path).stats()['entradas'] == 0
@@ -0,0 +1,167 @@
+import asyncio
+import json
+
+import pytest
+
+from src.encoders import BatchingEncoder
+from src.llm_handler import FakeLLM
+from src.server import BoundedLLM, SimplifierService, config_from_env
+
+from tests.conftest import EncoderFalso
+
+
+async def pedir(app, metodo: str, ruta: str, cuerpo=None, query: str = ""):
+    """Petición ASGI directa: (status, cabeceras, cuerpo decodificado)"""
+    if cuerpo is None:
+        datos = b""
+    elif isinstance(cuerpo, bytes):
+        datos = cuerpo
+    else:
+        datos = json.dumps(cuerpo).encode('utf-8')
+    mensajes = [{'type': 'http.request', 'body': datos, 'more_body': False}]
+    enviados = []
+
+    async def receive():
+        return mensajes.pop(0)
+
+    async def send(mensaje):
+        enviados.append(mensaje)
+
+    await app({'type': 'http', 'method': metodo, 'path': ruta,
+               'query_string': query.encode('latin-1'), 'headers': []}, receive, send)
+
+    inicio, cuerpo = enviados
+    cabeceras = dict(inicio['headers'])
+    texto = cuerpo['body'].decode('utf-8')
+    if cabeceras[b"content-type"] == b"application/json":
+        return inicio['status'], cabeceras, json.loads(texto)
+    return inicio['status'], cabeceras, texto
+
+
+@pytest.fixture
+def servicio(crear_sistema):
+    """SimplifierService con el sistema de pruebas ya cargado"""
+    def crear(llm=None, concurrencia: int = 2, **config):
+        llm = llm or FakeLLM(first_token_s=0.0, token_s=0.0)
+        system = crear_sistema(llm=BoundedLLM(llm, concurrencia))
+        system._encoder = BatchingEncoder(EncoderFalso(), max_wait_ms=100)
+        app = SimplifierService(config=config_from_env(**{'deadline_s': 5.0, **config}), system=system)
+        app.start()
+        app._warmup.join()
+        assert app.listo
+        return app
+
+    return crear
+
+
+def test_simplify_retrieve_health_y_metrics(servicio):
+    app = servicio()
+
+    async def peticiones():
+        simplify = await pedir(app, 'POST', '/simplify', {'texto': "De conformidad con la Ley.",
+                                                          'use_cendoj': False})
+        retrieve = await pedir(app, 'POST', '/retrieve', {'texto': "recurso de apelación", 'top_k': 2})
+        health = await pedir(app, 'GET', '/health')
+        metrics = await pedir(app, 'GET', '/metrics')
+        metrics_json = await pedir(app, 'GET', '/metrics', query="format=json")
+        return simplify, retrieve, health, metrics, metrics_json
+
+    simplify, retrieve, health, metrics, metrics_json = asyncio.run(peticiones())
+
+    assert simplify[0] == 200
+    assert simplify[2]['nivel'] == 'llm'
+    assert simplify[2]['simplificado']
+
+    assert retrieve[0] == 200
+    assert len(retrieve[2]['guia']) == 2
+    assert retrieve[2]['guia'][0]['id'] == 'guia_2'
+
+    assert health[0] == 200
+    assert health[2]['estado'] == 'listo'
+
+    assert metrics[0] == 200
+    assert 'justicia_requests_total{route="/simplify",status="200"} 1' in metrics[2]
+    assert 'justicia_simplify_level_total{level="llm"} 1' in metrics[2]
+    assert metrics_json[0] == 200
+    assert 'servicio' in metrics_json[2]
+
+
+@pytest.mark.parametrize("cuerpo, error", [
+    (b"{no es json", "JSON"),
+    (b"[1, 2]", "objeto"),
+    ({'top_k': 2}, "texto"),
+    ({'texto': "hola", 'top_k': "3"}, "top_k"),
+    ({'texto': "hola", 'top_k': 0}, "top_k"),
+    ({'texto': "hola", 'use_cendoj': "sí"}, "use_cendoj"),
+    ({'texto': "hola", 'deadline_s': "pronto"}, "deadline_s"),
+])
+def test_cuerpos_invalidos_devuelven_400(servicio, cuerpo, error):
+    app = servicio()
+    status, _, respuesta = asyncio.run(pedir(app, 'POST', '/simplify', cuerpo))
+    assert status == 400
+    assert error in respuesta['error']
+
+
+def test_plazo_vencido_devuelve_las_reglas(servicio):
+    app = servicio(llm=FakeLLM(first_token_s=2.0, token_s=0.0))
+    status, _, respuesta = asyncio.run(pedir(app, 'POST', '/simplify', {
+        'texto': "De conformidad con la Ley.", 'deadline_s': 0.2, 'use_cendoj': False}))
+
+    assert status == 200
+    assert respuesta['nivel'] == 'reglas'
+    assert respuesta['motivo'] == 'deadline'
+    assert respuesta['simplificado'] == "según la Ley."
+
+
+def test_sin_turno_en_el_llm_antes_del_plazo_devuelve_las_reglas(servicio):
+    # Una sola generación a la vez: la segunda petición no consigue turno antes de su plazo
+    app = servicio(llm=FakeLLM(first_token_s=1.0, token_s=0.0), concurrencia=1)
+
+    async def peticiones():
+        primera = asyncio.create_task(pedir(app, 'POST', '/simplify', {
+            'texto': "Primer documento.", 'deadline_s': 3.0, 'use_cendoj': False}))
+        await asyncio.sleep(0.1)
+        segunda = await pedir(app, 'POST', '/simplify', {
+            'texto': "De conformidad con la Ley.", 'deadline_s': 0.2, 'use_cendoj': False})
+        return await primera, segunda
+
+    primera, segunda = asyncio.run(peticiones())
+
+    assert primera[2]['nivel'] == 'llm'
+    assert segunda[0] == 200
+    assert segunda[2]['nivel'] == 'reglas'
+    assert segunda[2]['motivo'] == 'cola_llm'
+    assert app.system.llm.sin_turno == 1
+
+
+def test_servicio_saturado_devuelve_503(servicio):
+    app = servicio(llm=FakeLLM(first_token_s=0.5, token_s=0.0), max_pending=1)
+
+    async def peticiones():
+        cuerpo = {'texto': "Documento.", 'use_cendoj': False}
+        return await asyncio.gather(pedir(app, 'POST', '/simplify', cuerpo),
+                                    pedir(app, 'POST', '/simplify', cuerpo))
+
+    respuestas = asyncio.run(peticiones())
+
+    assert sorted(status for status, _, _ in respuestas) == [200, 503]
+    status, cabeceras, _ = next(r for r in respuestas if r[0] == 503)
+    assert cabeceras[b"retry-after"] == b"5"
+
+
+def test_retrieve_concurrentes_se_embeben_en_un_lote(servicio):
+    app = servicio()
+    encoder = app.system.encoder
+    lotes, textos = encoder.lotes, encoder.textos
+
+    async def peticiones():
+        return await asyncio.gather(*(
+            pedir(app, 'POST', '/retrieve', {'texto': f"consulta número {i}", 'mode': 'single'})
+            for i in range(4)
+        ))
+
+    respuestas = asyncio.run(peticiones())
+
+    assert [status for status, _, _ in respuestas] == [200] * 4
+    assert encoder.textos - textos == 4
+    assert encoder.lotes - lotes < 4
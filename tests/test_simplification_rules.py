@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from src.simplification_rules import SimplificationRules
+
+FRAGMENTOS = [
+    "en virtud de", "de conformidad con", "a tenor de", "conformidad con", "en virtud", "de", "con",
+    "a tenor", "VISTO", "visto", "FALLO", "FALLOS", "12/03/2024", "1/13/2020", "1) a,", "2) b",
+    "Excelentísimo Señor", "excelentísimo  señor", "Ilustrísimo", "Señor", "hubiere", "fuere",
+    "Fuere", "sufuere", "hubiereis", "de  conformidad con", "en", "virtud", "tenor", "según", "por",
+    "CONSIDERANDO", "debe", "contigo", ",", ".", "x", "\n",
+]
+
+GLOSARIO = """[terminologia]
+conformidad con lo dispuesto => según lo dispuesto
+lo dispuesto en => lo que dice
+recurso de apelación => recurso
+[verbos]
+dispuesto => fijado
+"""
+
+
+def texto_aleatorio(rnd: random.Random) -> str:
+    separadores = [" ", " ", " ", "", "  ", "\n"]
+    return "".join(rnd.choice(FRAGMENTOS) + rnd.choice(separadores) for _ in range(rnd.randint(1, 12)))
+
+
+@pytest.fixture(scope="module")
+def reglas():
+    return SimplificationRules()
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("en virtud de conformidad con", "en virtud según"),
+    ("a tenor de conformidad con", "a tenor según"),
+    ("Ilustrísimo Excelentísimo Señor", "Señor"),
+    ("de conformidad CONSIDERANDO", "de conformidad Considerando"),
+    ("en virtud debe", "en virtud debe"),
+    ("a tenor dela Ley", "a tenor dela Ley"),
+    ("(de conformidad con)", "(según)"),
+    ("de  conformidad con", "de  conformidad con"),
+])
+def test_solapamientos_siguen_el_orden_de_las_reglas(reglas, texto, esperado):
+    assert reglas.apply_all_rules_sequential(texto) == esperado
+    assert reglas.apply_all_rules(texto) == esperado
+
+
+def test_igual_que_regla_a_regla_con_textos_aleatorios(reglas):
+    rnd = random.Random(0)
+    for _ in range(3000):
+        texto = texto_aleatorio(rnd)
+        assert reglas.apply_all_rules(texto) == reglas.apply_all_rules_sequential(texto), texto
+
+
+def test_igual_que_regla_a_regla_con_glosario_solapado(tmp_path):
+    glosario = tmp_path / "glosario.txt"
+    glosario.write_text(GLOSARIO, encoding='utf-8')
+    reglas = SimplificationRules(str(glosario))
+
+    rnd = random.Random(1)
+    fragmentos = FRAGMENTOS + ["lo dispuesto", "dispuesto en", "recurso de", "apelación", "lo"]
+    for _ in range(2000):
+        separadores = [" ", " ", "  ", ""]
+        texto = "".join(rnd.choice(fragmentos) + rnd.choice(separadores) for _ in range(rnd.randint(1, 10)))
+        assert reglas.apply_all_rules(texto) == reglas.apply_all_rules_sequential(texto), texto
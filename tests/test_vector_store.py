@@ -0,0 +1,58 @@
+import numpy as np
+
+from src.vector_store import NumpyVectorStore
+
+
+def test_float16_convierte_la_matriz_una_vez(tmp_path):
+    rng = np.random.default_rng(0)
+    vectores = rng.standard_normal((50, 8))
+    ids = [str(i) for i in range(50)]
+    escritor = NumpyVectorStore('guia', path=str(tmp_path), dtype='float16')
+    escritor.upsert(vectores, ids, [{}] * 50, ids)
+    escritor.flush()
+
+    store = NumpyVectorStore('guia', path=str(tmp_path), dtype='float16')
+    assert store.query(vectores[3], 1)['ids'] == [['3']]
+    copia = store._float32[1]
+    store.query(vectores[7], 1)
+    assert store._float32[1] is copia
+
+    # Tras un upsert la copia se rehace con la matriz nueva
+    store.upsert(-vectores[:1], ['0'], [{}], ['0'])
+    assert store.query(-vectores[0], 1)['ids'] == [['0']]
+    assert store._float32[1] is not copia
+
+
+def test_upsert_no_escribe_hasta_flush(tmp_path):
+    rng = np.random.default_rng(1)
+    store = NumpyVectorStore('cendoj', path=str(tmp_path))
+    for inicio in range(0, 40, 10):
+        ids = [str(i) for i in range(inicio, inicio + 10)]
+        store.upsert(rng.standard_normal((10, 4)), ids, [{'n': i} for i in range(10)], ids)
+    assert not (tmp_path / "vectors.npy").exists()
+    assert store.count() == 40
+
+    store.flush()
+    reabierto = NumpyVectorStore('cendoj', path=str(tmp_path))
+    assert reabierto.get()['ids'] == [str(i) for i in range(40)]
+    np.testing.assert_allclose(reabierto.get(['7'], include=['embeddings'])['embeddings'],
+                               store.get(['7'], include=['embeddings'])['embeddings'])
+
+
+def test_consulta_no_ve_escrituras_posteriores():
+    store = NumpyVectorStore('guia')
+    store.upsert(np.eye(4)[:2], ["uno", "dos"], [{'n': 1}, {'n': 2}], ['1', '2'])
+    foto = store._snapshot()
+
+    # Sustituir, añadir y borrar no toca las listas ni la matriz ya publicadas
+    store.upsert(np.eye(4)[1:3], ["DOS", "tres"], [{'n': 20}, {'n': 3}], ['2', '3'])
+    store.delete(['1'])
+    vectores, ids, documents, metadatas = foto
+    assert ids == ['1', '2'] and documents == ["uno", "dos"]
+    assert metadatas == [{'n': 1}, {'n': 2}]
+    np.testing.assert_array_equal(vectores, np.eye(4)[:2])
+
+    resultado = store.query(np.eye(4)[1], 3)
+    assert resultado['ids'] == [['2', '3']]
+    assert resultado['documents'] == [["DOS", "tres"]]
+    assert resultado['metadatas'] == [[{'n': 20}, {'n': 3}]]